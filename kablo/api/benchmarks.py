@@ -0,0 +1,38 @@
+from django.test import RequestFactory
+
+from kablo.api.views import MAX_PRECISION, collection_items
+from kablo.core.benchmarks import register_benchmark
+from kablo.network.lod import LOD_TOLERANCES
+
+COLLECTIONS = ("network.track", "network.tube", "network.cable")
+
+
+def _items(collection_id: str, **params):
+    request = RequestFactory().get(
+        f"/oapif/collections/{collection_id}/items", {"limit": 1000, **params}
+    )
+    return lambda: b"".join(collection_items(request, collection_id).streaming_content)
+
+
+@register_benchmark("oapif_items")
+def oapif_items_benchmark():
+    # the full geometries, then the resolution of each level of detail
+    return {
+        f"{collection_id} resolution={resolution}": _items(
+            collection_id, resolution=resolution
+        )
+        for collection_id in COLLECTIONS
+        for resolution in (0, *LOD_TOLERANCES.values())
+    }
+
+
+@register_benchmark("geojson_precision")
+def geojson_precision_benchmark():
+    # full precision, then mm and cm
+    return {
+        f"{collection_id} precision={precision}": _items(
+            collection_id, precision=precision
+        )
+        for collection_id in COLLECTIONS
+        for precision in (MAX_PRECISION, 3, 2)
+    }
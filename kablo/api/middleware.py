@@ -0,0 +1,64 @@
+import hashlib
+import re
+
+from django.apps import apps
+from django.db.models import Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from kablo.network.models import Watermark
+
+ITEMS_PATH = re.compile(r"^/oapif/collections/(?P<collection_id>[\w.]+)/items(/|$)")
+
+
+def collection_watermark(collection_id: str):
+    """
+    Change count and last change of the table of the collection,
+    None for the collections without watermark
+    """
+    try:
+        model = apps.get_model(collection_id)
+    except (LookupError, ValueError):
+        return None
+    watermark = Watermark.objects.filter(table_name=model._meta.db_table).aggregate(
+        changes=Sum("changes"), updated_at=Max("updated_at")
+    )
+    if watermark["changes"] is None:
+        return None
+    return watermark
+
+
+class ConditionalCollectionMiddleware:
+    """
+    ETag of the OAPIF items and features, from the change count of the collection
+    table: a client refreshing an unchanged collection gets a 304 without
+    the features being read or serialized.
+    There is no Last-Modified: the latest change time of the shards does not
+    move when a long transaction commits after a later one.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        match = ITEMS_PATH.match(request.path_info)
+        if request.method not in ("GET", "HEAD") or match is None:
+            return self.get_response(request)
+        watermark = collection_watermark(match["collection_id"])
+        if watermark is None:
+            return self.get_response(request)
+
+        # the representation depends on the query and on the negotiated format
+        key = (
+            f"{watermark['changes']}:"
+            f"{request.get_full_path()}:{request.headers.get('Accept', '')}"
+        )
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+        # read before the features: the response is never older than its ETag
+        response = get_conditional_response(request, etag=etag) or self.get_response(
+            request
+        )
+        if response.status_code in (200, 304):
+            response.headers.setdefault("ETag", etag)
+        return response
@@ -1 +1,255 @@
-# Create your tests here.
+import json
+from datetime import timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.gis.geos import LineString, MultiLineString, Polygon
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from kablo.api.views import decode_cursor
+from kablo.network.changes import prune_changes
+from kablo.network.models import Change, Track, Watermark
+
+EPSG_2056 = "http://www.opengis.net/def/crs/EPSG/0/2056"
+
+
+def create_tracks():
+    x = 2508500
+    y = 1152000
+    return [
+        Track.objects.create(
+            geom=MultiLineString(
+                LineString((x + 10 * i, y, 0), (x + 10 * i, y + 10, 0), srid=2056),
+                srid=2056,
+            )
+        )
+        for i in range(5)
+    ]
+
+
+class CollectionItemsTestCase(TestCase):
+    def setUp(self):
+        self.tracks = create_tracks()
+
+    def get_items(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        self.assertEqual(response["Content-Crs"], f"<{EPSG_2056}>")
+        return json.loads(b"".join(response.streaming_content))
+
+    def get_all_pages(self, url):
+        ids = []
+        while url:
+            collection = self.get_items(url)
+            ids += [feature["id"] for feature in collection["features"]]
+            self.assertLessEqual(collection["numberReturned"], 2)
+            url = next(
+                (link["href"] for link in collection["links"] if link["rel"] == "next"),
+                None,
+            )
+        return ids
+
+    def test_keyset_pagination(self):
+        url = "/oapif/collections/network.track/items"
+        ids = self.get_all_pages(f"{url}?limit=2")
+        self.assertEqual(ids, sorted(str(track.id) for track in self.tracks))
+
+        collection = self.get_items(f"{url}?limit=2&sortby=updated_at")
+        feature = collection["features"][0]
+        self.assertEqual(feature["geometry"]["type"], "MultiLineString")
+        self.assertNotIn("geom", feature["properties"])
+        query = parse_qs(urlsplit(collection["links"][0]["href"]).query)
+        cursor = decode_cursor(query["cursor"][0])
+        self.assertEqual(cursor[1], collection["features"][1]["id"])
+
+        # the pages follow the updates made in between
+        self.tracks[0].save()
+        ids = self.get_all_pages(f"{url}?limit=2&sortby=updated_at")
+        self.assertEqual(ids[-1], str(self.tracks[0].id))
+        self.assertEqual(len(set(ids)), len(self.tracks))
+
+        bbox = (2508495, 1151995, 2508515, 1152015)
+        query = f"limit=2&bbox={','.join(map(str, bbox))}&bbox-crs={EPSG_2056}"
+        self.assertEqual(len(self.get_all_pages(f"{url}?{query}")), 2)
+        # the bbox is in CRS84 by default
+        bbox = Polygon.from_bbox(bbox)
+        bbox.srid = 2056
+        bbox.transform(4326)
+        query = f"limit=2&bbox={','.join(map(str, bbox.extent))}"
+        self.assertEqual(len(self.get_all_pages(f"{url}?{query}")), 2)
+        # the storage CRS is streamed
+        self.assertEqual(len(self.get_all_pages(f"{url}?limit=2&crs={EPSG_2056}")), 5)
+
+        self.assertEqual(self.client.get(f"{url}?limit=0").status_code, 400)
+        self.assertEqual(self.client.get(f"{url}?cursor=foo").status_code, 400)
+
+    def test_conditional_get(self):
+        url = "/oapif/collections/network.track/items?limit=2"
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        # only the watermark is read
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        # another query of the same collection
+        other = self.client.get(f"{url}&sortby=updated_at")["ETag"]
+        self.assertNotEqual(other, etag)
+
+        # updates and deletions change the watermark
+        self.tracks[0].save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        Track.objects.filter(pk=self.tracks[1].pk).delete()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # a change committed after a later change of another shard
+        Watermark.objects.create(
+            table_name="network_track",
+            shard=99,
+            updated_at=timezone.now() + timedelta(days=1),
+            changes=1,
+        )
+        etag = self.client.get(url)["ETag"]
+        self.tracks[2].save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+        # collections without watermark
+        self.assertNotIn("ETag", self.client.get("/oapif/collections/foo/items"))
+
+    def test_soft_deleted_track_sections(self):
+        Track.all_objects.filter(pk=self.tracks[0].pk).update(deleted_at=timezone.now())
+        url = "/oapif/collections/network.section/items?limit=2"
+        sections = self.tracks[0].section_set.values_list("id", flat=True)
+        ids = self.get_all_pages(url)
+        self.assertEqual(len(ids), 4)
+        self.assertNotIn(str(sections[0]), ids)
+
+    def test_properties(self):
+        # the same properties as the collection served by django-oapif
+        for collection_id in ("network.track", "network.section"):
+            url = f"/oapif/collections/{collection_id}/items?limit=1"
+            streamed = self.get_items(url)["features"][0]["properties"]
+            response = self.client.get(f"{url}&offset=0")
+            self.assertEqual(response.status_code, 200)
+            serialized = json.loads(response.content)["features"][0]["properties"]
+            self.assertEqual(set(streamed), set(serialized))
+        self.assertIn("track", streamed)
+        self.assertNotIn("track_id", streamed)
+        track = self.get_items("/oapif/collections/network.track/items?limit=1")
+        self.assertNotIn("source_hash", track["features"][0]["properties"])
+        self.assertNotIn("deleted_at", track["features"][0]["properties"])
+
+    def test_coordinate_precision(self):
+        Track.objects.all().delete()
+        Track.objects.create(
+            geom=MultiLineString(
+                LineString(
+                    (2508500.123456, 1152000.654321, 0.7),
+                    (2508510, 1152010, 0),
+                    srid=2056,
+                ),
+                srid=2056,
+            )
+        )
+        url = "/oapif/collections/network.track/items"
+
+        def first_coordinate(url):
+            feature = self.get_items(url)["features"][0]
+            return feature["geometry"]["coordinates"][0][0]
+
+        self.assertEqual(first_coordinate(url), [2508500.123, 1152000.654, 0.7])
+        self.assertEqual(
+            first_coordinate(f"{url}?precision=1"), [2508500.1, 1152000.7, 0.7]
+        )
+        with override_settings(OAPIF_COLLECTION_PRECISION={"network.track": 0}):
+            self.assertEqual(first_coordinate(url), [2508500, 1152001, 1])
+        self.assertEqual(self.client.get(f"{url}?precision=16").status_code, 400)
+
+
+class ChangeFeedTestCase(TransactionTestCase):
+    # the change feed only returns committed changes
+    def setUp(self):
+        self.tracks = create_tracks()
+
+    def test_change_feed(self):
+        # the tracks and their sections
+        features = self.get_all_changes("/changes?limit=4")
+        self.assertEqual(len(features), 10)
+        self.assertEqual(
+            {feature["collection"] for feature in features},
+            {"network.track", "network.section"},
+        )
+        self.assertFalse(any(feature["deleted"] for feature in features))
+        cursor = self.cursor
+
+        # nothing new
+        self.assertEqual(self.get_all_changes(f"/changes?since={cursor}"), [])
+        self.assertEqual(self.cursor, cursor)
+
+        # a feature updated twice is sent once, the deleted ones are tombstoned
+        deleted_id = str(self.tracks[1].id)
+        self.tracks[0].save()
+        self.tracks[0].save()
+        self.tracks[1].delete()
+        features = self.get_all_changes(f"/changes?since={cursor}")
+        self.assertEqual(
+            [(feature["collection"], feature["deleted"]) for feature in features],
+            [
+                ("network.track", False),
+                ("network.section", True),
+                ("network.track", True),
+            ],
+        )
+        self.assertEqual(features[0]["id"], str(self.tracks[0].id))
+        self.assertEqual(features[2]["id"], deleted_id)
+        self.assertEqual(features[0]["geometry"]["type"], "MultiLineString")
+        self.assertIsNone(features[-1]["properties"])
+
+        self.assertEqual(self.client.get("/changes?since=foo").status_code, 400)
+
+    def get_all_changes(self, url):
+        features = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            collection = json.loads(b"".join(response.streaming_content))
+            features += collection["features"]
+            self.cursor = collection["cursor"]
+            url = next(
+                (link["href"] for link in collection["links"] if link["rel"] == "next"),
+                None,
+            )
+        return features
+
+    def test_soft_deleted_track(self):
+        self.get_all_changes("/changes")
+        cursor = self.cursor
+        Track.all_objects.filter(pk=self.tracks[0].pk).update(deleted_at=timezone.now())
+        features = self.get_all_changes(f"/changes?since={cursor}")
+        self.assertEqual(
+            [(feature["collection"], feature["deleted"]) for feature in features],
+            [("network.track", True), ("network.section", True)],
+        )
+
+    def test_expired_cursor(self):
+        self.get_all_changes("/changes")
+        cursor = self.cursor
+        self.tracks[0].save()
+
+        # the latest change is kept for the clients up to date
+        Change.objects.update(changed_at=timezone.now() - timedelta(days=31))
+        self.assertGreaterEqual(prune_changes(30), 10)
+        self.assertEqual(Change.objects.count(), 1)
+        self.assertEqual(prune_changes(30), 0)
+
+        response = self.client.get(f"/changes?since={cursor}")
+        self.assertEqual(response.status_code, 410)
+        self.get_all_changes("/changes")
+        self.assertEqual(self.get_all_changes(f"/changes?since={self.cursor}"), [])
@@ -1 +1,314 @@
-# Create your views here.
+import base64
+import json
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.contrib.gis.geos import Polygon
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponseBadRequest, HttpResponseGone, StreamingHttpResponse
+from django.urls import URLResolver
+from django.urls.resolvers import RegexPattern
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+from django.views.decorators.csrf import csrf_exempt
+from django_oapif.urls import oapif_router
+
+from kablo.network.changes import (
+    CHANGE_MODELS,
+    ChangeCursor,
+    changes_after,
+    cursor_expired,
+    feature_changes,
+)
+from kablo.network.lod import lod_level, scale_resolution, simplified_geom
+from kablo.network.models import (
+    Cable,
+    Section,
+    Station,
+    Track,
+    Tube,
+    not_soft_deleted,
+    published_fields,
+)
+
+# collections streamed by `collection_items`, the others are served by django-oapif
+STREAMED_COLLECTIONS = {
+    model._meta.label_lower: model for model in (Track, Section, Cable, Tube, Station)
+}
+# query parameters handled by `collection_items`
+STREAMED_PARAMETERS = {
+    "limit",
+    "cursor",
+    "sortby",
+    "bbox",
+    "bbox-crs",
+    "crs",
+    "resolution",
+    "scale",
+    "precision",
+    "f",
+    "format",
+}
+SORT_KEYS = {"id": ("id",), "updated_at": ("updated_at", "id")}
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 100000
+MAX_PRECISION = 15
+# rows fetched per round trip from the server-side cursor
+CHUNK_SIZE = 2000
+
+_oapif_resolver = URLResolver(RegexPattern(r"^/oapif/"), oapif_router.urls)
+
+
+class _Page(NamedTuple):
+    limit: int
+    sort_key: tuple
+    cursor: list
+    # level of detail of the geometries
+    level: int
+    # decimals of the coordinates
+    precision: int
+
+
+def encode_cursor(values: list) -> str:
+    # full precision timestamps: DjangoJSONEncoder truncates them to milliseconds
+    values = [
+        value.isoformat() if hasattr(value, "isoformat") else str(value)
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+
+def _keyset_filter(sort_key: tuple, cursor: list) -> Q:
+    # rows after the cursor: (a, b) > (ca, cb) <=> a > ca or (a = ca and b > cb)
+    if sort_key == ("id",):
+        return Q(id__gt=cursor[0])
+    updated_at = parse_datetime(cursor[0])
+    return Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=cursor[1])
+
+
+def coordinate_precision(collection_id: str, params) -> int:
+    """
+    Decimals of the coordinates: `?precision=`, or the setting of the collection
+    """
+    if "precision" not in params:
+        return settings.OAPIF_COLLECTION_PRECISION.get(
+            collection_id, settings.OAPIF_PRECISION
+        )
+    precision = int(params["precision"])
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError("precision")
+    return precision
+
+
+def _parse_page(collection_id: str, params) -> _Page:
+    limit = min(int(params.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+    if limit < 1:
+        raise ValueError("limit")
+    sort_key = SORT_KEYS[params.get("sortby", "id")]
+    cursor = decode_cursor(params["cursor"]) if "cursor" in params else None
+    if cursor is not None and len(cursor) != len(sort_key):
+        raise ValueError("cursor")
+    # ground resolution of the client (m per pixel), or its scale denominator
+    if "resolution" in params:
+        level = lod_level(float(params["resolution"]))
+    elif "scale" in params:
+        level = lod_level(scale_resolution(float(params["scale"])))
+    else:
+        level = 0
+    precision = coordinate_precision(collection_id, params)
+    return _Page(limit, sort_key, cursor, level, precision)
+
+
+def crs_srid(crs: str) -> int:
+    # OGC CRS URI, e.g. http://www.opengis.net/def/crs/EPSG/0/2056 or .../OGC/1.3/CRS84
+    code = crs.strip("<>").rstrip("/").split("/")[-1]
+    return 4326 if code == "CRS84" else int(code)
+
+
+def crs_uri(srid: int) -> str:
+    return f"http://www.opengis.net/def/crs/EPSG/0/{srid}"
+
+
+def _bbox_filter(params) -> Q:
+    xmin, ymin, xmax, ymax = (float(value) for value in params["bbox"].split(","))
+    bbox = Polygon.from_bbox((xmin, ymin, xmax, ymax))
+    # CRS84 (longitude, latitude) unless given, as OGC API Features
+    bbox.srid = crs_srid(params.get("bbox-crs", "CRS84"))
+    return Q(geom__intersects=bbox)
+
+
+def _stream_features(rows, fields: list, page: _Page, next_url):
+    yield '{"type":"FeatureCollection","features":['
+    returned = 0
+    last = None
+    for row in rows:
+        if returned == page.limit:
+            # one more row than the page: there is a next page
+            cursor = encode_cursor([last[key] for key in page.sort_key])
+            yield (
+                f'],"numberReturned":{returned},"links":[{{"rel":"next",'
+                f'"type":"application/geo+json","href":{json.dumps(next_url(cursor))}}}]}}'
+            )
+            return
+        properties = {field.name: row[field.attname] for field in fields}
+        yield (
+            ("," if returned else "")
+            + '{"type":"Feature","id":'
+            + json.dumps(row["id"], cls=DjangoJSONEncoder)
+            + ',"geometry":'
+            + (row["geojson"] or "null")
+            + ',"properties":'
+            + json.dumps(properties, cls=DjangoJSONEncoder)
+            + "}"
+        )
+        returned += 1
+        last = row
+    yield f'],"numberReturned":{returned},"links":[]}}'
+
+
+@csrf_exempt
+def collection_items(request, collection_id):
+    """
+    Items of the big collections, streamed as they are read from a server-side cursor
+    and paginated by keyset (`?cursor=` of the `next` link), so that the cost of a page
+    and the memory of the request do not depend on the collection size.
+    A `resolution` (m per pixel) or `scale` hint returns simplified geometries,
+    `precision` sets the decimals of the coordinates.
+    The features are in the storage CRS of the collection (`Content-Crs`).
+    Other collections, parameters and output CRS are served by django-oapif.
+    """
+    model = STREAMED_COLLECTIONS.get(collection_id)
+    srid = model._meta.get_field("geom").srid if model is not None else None
+    try:
+        storage_crs = "crs" not in request.GET or crs_srid(request.GET["crs"]) == srid
+    except ValueError:
+        storage_crs = False
+    if (
+        model is None
+        or request.method != "GET"
+        or not set(request.GET).issubset(STREAMED_PARAMETERS)
+        or not storage_crs
+        or request.GET.get("f", request.GET.get("format", "json"))
+        not in ("json", "geojson")
+    ):
+        match = _oapif_resolver.resolve(request.path_info)
+        return match.func(request, *match.args, **match.kwargs)
+
+    try:
+        page = _parse_page(collection_id, request.GET)
+        queryset = model.objects.filter(not_soft_deleted(model)).order_by(
+            *page.sort_key
+        )
+        if page.cursor is not None:
+            queryset = queryset.filter(_keyset_filter(page.sort_key, page.cursor))
+        if "bbox" in request.GET:
+            queryset = queryset.filter(_bbox_filter(request.GET))
+    except (KeyError, ValueError, TypeError):
+        return HttpResponseBadRequest("Invalid parameters")
+
+    # properties as serialized by django-oapif: the foreign keys by their name
+    fields = [
+        field for field in published_fields(model) if field.name not in ("id", "geom")
+    ]
+    rows = (
+        queryset.annotate(
+            # rounded by PostGIS while writing the GeoJSON
+            geojson=AsGeoJSON(
+                simplified_geom(model, page.level), precision=page.precision
+            )
+        )
+        .values("id", "geojson", *(field.attname for field in fields))[: page.limit + 1]
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+    def next_url(cursor):
+        params = {key: value for key, value in request.GET.items() if key != "cursor"}
+        params["cursor"] = cursor
+        return request.build_absolute_uri(f"{request.path}?{urlencode(params)}")
+
+    response = StreamingHttpResponse(
+        _stream_features(rows, fields, page, next_url),
+        content_type="application/geo+json",
+    )
+    response["Content-Crs"] = f"<{crs_uri(srid)}>"
+    return response
+
+
+def _stream_changes(changes: list, precisions: dict, cursor: str, next_url):
+    yield '{"type":"FeatureCollection","features":['
+    for index, change in enumerate(
+        feature_changes(changes, precisions, chunk_size=CHUNK_SIZE)
+    ):
+        properties = change.feature
+        geometry = None
+        if properties is not None:
+            geometry = properties.pop("geojson", None)
+        yield (
+            ("," if index else "")
+            + '{"type":"Feature","id":'
+            + json.dumps(change.object_id, cls=DjangoJSONEncoder)
+            + ',"collection":'
+            + json.dumps(change.model._meta.label_lower)
+            + ',"deleted":'
+            + json.dumps(properties is None)
+            + ',"geometry":'
+            + (geometry or "null")
+            + ',"properties":'
+            + json.dumps(properties, cls=DjangoJSONEncoder)
+            + "}"
+        )
+    links = []
+    if next_url is not None:
+        links.append({"rel": "next", "type": "application/json", "href": next_url})
+    yield f'],"cursor":{json.dumps(cursor)},"links":{json.dumps(links)}}}'
+
+
+def changes(request):
+    """
+    Network features changed since the `since` cursor, for the offline synchronization:
+    the current state of the inserted and updated features, a tombstone
+    (`"deleted": true`) for the deleted ones, each feature once per page.
+    The `cursor` of the response is the `since` of the next synchronization,
+    the `next` link is given while there are more changes.
+    A cursor expires once its last change is older than CHANGE_RETENTION_DAYS
+    (410 Gone): the client must then synchronize all the features again.
+    """
+    try:
+        limit = min(int(request.GET.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+        if limit < 1:
+            raise ValueError("limit")
+        since = None
+        if "since" in request.GET:
+            since = ChangeCursor(*map(int, decode_cursor(request.GET["since"])))
+        precisions = {
+            name: coordinate_precision(model._meta.label_lower, request.GET)
+            for name, model in CHANGE_MODELS.items()
+        }
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest("Invalid parameters")
+    if since is not None and cursor_expired(since):
+        return HttpResponseGone("Expired cursor")
+
+    changes = changes_after(since, limit + 1)
+    more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = request.GET.get("since")
+    if changes:
+        cursor = encode_cursor([changes[-1]["xid"], changes[-1]["id"]])
+
+    next_url = None
+    if more:
+        params = {key: value for key, value in request.GET.items() if key != "since"}
+        params["since"] = cursor
+        next_url = request.build_absolute_uri(f"{request.path}?{urlencode(params)}")
+
+    return StreamingHttpResponse(
+        _stream_changes(changes, precisions, cursor, next_url),
+        content_type="application/json",
+    )
@@ -0,0 +1,122 @@
+import random
+import timeit
+from collections.abc import Callable
+from typing import NamedTuple
+
+from django.contrib.gis.geos import GEOSGeometry, LineString
+from shapely import get_srid, wkb
+
+from kablo.core.utils import (
+    ARCSDE_Z,
+    geodjango2shapely,
+    geodjango2shapely_many,
+    import_arcsde_linestrings_many,
+    import_arcsde_linestrings_to_geos,
+    shapely2geodjango,
+    shapely2geodjango_many,
+)
+
+# name => function returning the callables to time, by label
+BENCHMARKS: dict[str, Callable[[], dict[str, Callable]]] = {}
+
+
+class BenchmarkResult(NamedTuple):
+    benchmark: str
+    label: str
+    seconds: float
+    # length of the result, for the callables returning str or bytes
+    size: int | None = None
+
+
+def register_benchmark(name: str):
+    """
+    Register a benchmark, run by the `benchmark` management command.
+    The `benchmarks` module of each app is loaded by the command.
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def run_benchmark(name: str, number: int = 100, repeat: int = 3) -> list:
+    """
+    Time each callable of the benchmark, returns the best time per call
+    (and the size of the result, for str or bytes results).
+    """
+    results = []
+    for label, func in BENCHMARKS[name]().items():
+        value = func()
+        size = len(value) if isinstance(value, (str, bytes)) else None
+        seconds = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+        results.append(BenchmarkResult(name, label, seconds, size))
+    return results
+
+
+def sample_lines(count: int = 500, vertices: int = 40, dim: int = 3, seed: int = 0):
+    """
+    Random walk lines, shaped like the tubes (3D) or the cables (2D) of a network.
+    """
+    rand = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        x, y, z = 2508500 + rand.uniform(0, 5000), 1152000 + rand.uniform(0, 5000), 0
+        coords = []
+        for _ in range(vertices):
+            x += rand.uniform(-5, 5)
+            y += rand.uniform(-5, 5)
+            z += rand.uniform(-0.2, 0.2)
+            coords.append((x, y, z)[:dim])
+        lines.append(LineString(coords, srid=2056))
+    return lines
+
+
+@register_benchmark("geometry_conversion")
+def geometry_conversion_benchmark():
+    tubes = sample_lines(dim=3)
+    cables = sample_lines(dim=2, seed=1)
+    geos_geoms = tubes + cables
+    shapely_geoms = geodjango2shapely_many(geos_geoms)
+
+    return {
+        # former implementation, through hex strings
+        "geodjango2shapely (hex)": lambda: [
+            wkb.loads(geom.hexewkb) for geom in geos_geoms
+        ],
+        "geodjango2shapely": lambda: [geodjango2shapely(geom) for geom in geos_geoms],
+        "geodjango2shapely_many": lambda: geodjango2shapely_many(geos_geoms),
+        "shapely2geodjango (hex)": lambda: [
+            GEOSGeometry(geom.wkb_hex, srid=int(get_srid(geom)))
+            for geom in shapely_geoms
+        ],
+        "shapely2geodjango": lambda: [
+            shapely2geodjango(geom) for geom in shapely_geoms
+        ],
+        "shapely2geodjango_many": lambda: shapely2geodjango_many(shapely_geoms),
+    }
+
+
+@register_benchmark("arcsde_conversion")
+def arcsde_conversion_benchmark():
+    # GeoJSON geometries of a 2D layer exported from ArcSDE
+    geometries = [
+        {"type": "LineString", "coordinates": [list(vertex) for vertex in line.coords]}
+        for line in sample_lines(count=2000, vertices=20, dim=2)
+    ]
+
+    return {
+        # former implementation, Z appended vertex by vertex
+        "per vertex": lambda: [
+            LineString([[*vertex, ARCSDE_Z] for vertex in geometry["coordinates"]])
+            for geometry in geometries
+        ],
+        "import_arcsde_linestrings_to_geos": lambda: [
+            import_arcsde_linestrings_to_geos(geometry, output_type="LineString")
+            for geometry in geometries
+        ],
+        "import_arcsde_linestrings_many": lambda: import_arcsde_linestrings_many(
+            geometries, output_type="LineString"
+        ),
+    }
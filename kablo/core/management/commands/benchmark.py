@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+
+from kablo.core.benchmarks import BENCHMARKS, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Run the micro-benchmarks (all of them if none is given)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("benchmarks", nargs="*")
+        parser.add_argument(
+            "-n", "--number", type=int, default=20, help="Runs per measure"
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules("benchmarks")
+
+        names = options["benchmarks"] or sorted(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(
+                f"Unknown benchmarks: {', '.join(sorted(unknown))}. "
+                f"Available: {', '.join(sorted(BENCHMARKS))}"
+            )
+
+        for name in names:
+            print(f"🤖 {name}")
+            for result in run_benchmark(name, number=options["number"]):
+                size = "" if result.size is None else f"{result.size / 1024:10.1f} kB"
+                print(f"   {result.label:<40} {result.seconds * 1000:10.3f} ms {size}")
@@ -13,9 +13,25 @@ initMap = function (host) {
     let mapProjection = swissProjection;
     mapProjection.setExtent([485869.5728, 76443.1884, 837076.5648, 299941.7864]);
 
-    const track_url = `${host}/oapif/collections/network.track/items?format=json`;
-    const tube_url = `${host}/oapif/collections/network.tube/items?format=json`;
-    const cable_url = `${host}/oapif/collections/network.cable/items?format=json`;
+    /* vector tiles grid, see kablo.network.tiles */
+    const tileOrigin = [2420000, 1350000];
+    const tileSizeZ0 = 512000;
+    const tileMaxZoom = 16;
+    const tileGrid = new ol.tilegrid.TileGrid({
+        origin: tileOrigin,
+        extent: [tileOrigin[0], tileOrigin[1] - tileSizeZ0, tileOrigin[0] + tileSizeZ0, tileOrigin[1]],
+        tileSize: 512,
+        resolutions: [...Array(tileMaxZoom + 1).keys()].map(z => tileSizeZ0 / 512 / 2 ** z),
+    });
+
+    function tileSource(layer) {
+        return new ol.source.VectorTile({
+            format: new ol.format.MVT({idProperty: 'id'}),
+            projection: 'EPSG:2056',
+            tileGrid: tileGrid,
+            url: `${host}/tiles/${layer}/{z}/{x}/{y}.mvt`,
+        });
+    }
 
     /* setup wmts base layer from swisstopo capabilities */
 
@@ -60,45 +76,74 @@ initMap = function (host) {
           }),
     });
 
+    /* tracks, tubes and cables as vector tiles, with basic ol styling */
+
+    let selectedId = null;
+
+    function tileLayer(layer, style) {
+        return new ol.layer.VectorTile({
+            source: tileSource(layer),
+            // tile features can't be styled one by one
+            style: function (feature) {
+                return feature.getId() === selectedId ? selectStyle : style;
+            },
+            className: `${layer}s`,
+        });
+    }
+
+    map.addLayer(tileLayer('track', new ol.style.Style({
+        stroke: new ol.style.Stroke({
+            color: 'black',
+            width: 2,
+        }),
+    })));
+
+    const tubes_layer = tileLayer('tube', new ol.style.Style({
+        stroke: new ol.style.Stroke({
+            color: '#e246da',
+            width: 1,
+        }),
+    }));
+    map.addLayer(tubes_layer);
+
+    map.addLayer(tileLayer('cable', new ol.style.Style({
+        stroke: new ol.style.Stroke({
+            color: 'blue',
+            width: 1,
+        }),
+    })));
+
     /* basic get feature example */
-    let selected = null;
     let detailsDiv = document.getElementById("detailsDiv");
     let detailsLink = document.getElementById("detailsLink");
     let detailsCable = document.getElementById("detailsCable");
     detailsDiv.style.display = 'none';
     detailsCable.style.display = 'none';
     map.on('click', function (e) {
-        if (selected !== null) {
-          selected.setStyle(undefined);
-          selected = null;
-        }
-
+        let selected = null;
         map.forEachFeatureAtPixel(e.pixel, function (f) {
-          hit = true;
           selected = f;
-          f.setStyle(selectStyle);
           return true;
         },
         {
-            hitToleance: 20,
+            hitTolerance: 20,
             layerFilter: function(layer){
-                if (layer.className_ == 'tubes') {
-                    return true;
-                } else {
-                    return false;
-                }
+                return layer === tubes_layer;
             }
         });
-
+        selectedId = selected ? selected.getId() : null;
+        tubes_layer.changed();
 
         if (selected) {
         // TODO: set model name from OL layer
-            detailsLink.setAttribute("href", `${host}/admin/network/tube/${selected.id_}`);
+            detailsLink.setAttribute("href", `${host}/admin/network/tube/${selectedId}`);
             detailsDiv.style.display = 'block';
             detailsCable.innerHTML = '';
-            cables_list = '<hr><p>Câbles</p><ul>';
-            if (selected.values_.cables && selected.values_.cables.length > 0) {
-                selected.values_.cables.forEach(async (cable) => {
+            // the cables come with the tiles from the detail zoom
+            const cables = selected.get('cables') ? selected.get('cables').split(',') : [];
+            if (cables.length > 0) {
+                cables_list = '<hr><p>Câbles</p><ul>';
+                cables.forEach((cable) => {
                     cables_list += `<li><a href="${host}/admin/network/cable/${cable}" target="_blank">${cable}</a></li>`;
                 });
                 cables_list += '</ul>'
@@ -112,73 +157,4 @@ initMap = function (host) {
             detailsDiv.style.display = 'none';
         }
       });
-
-
-    /* load tracks, tubes and cables from django oapif, set basic ol styling*/
-
-    (async () => {
-        const tracks = await fetch(track_url, {
-        headers: {
-            'Accept': 'application/json'
-        }
-        }).then(response => response.json());
-
-        const tubes = await fetch(tube_url, {
-            headers: {
-                'Accept': 'application/json'
-            }
-        }).then(response => response.json());
-
-        const cables = await fetch(cable_url, {
-            headers: {
-                'Accept': 'application/json'
-            }
-        }).then(response => response.json());
-
-        var tracks_layer = new ol.layer.Vector({
-            source: new ol.source.Vector({
-                features: new ol.format.GeoJSON().readFeatures(tracks),
-            }),
-            style: new ol.style.Style({
-                stroke: new ol.style.Stroke({
-                    color: 'black',
-                    width: 2,
-                }),
-            }),
-            className: 'tracks',
-        })
-
-        map.addLayer(tracks_layer);
-
-        map.addLayer(new ol.layer.Vector({
-            source: new ol.source.Vector({
-                features: new ol.format.GeoJSON().readFeatures(tubes),
-            }),
-            style: new ol.style.Style({
-                stroke: new ol.style.Stroke({
-                    color: '#e246da',
-                    width: 1,
-                }),
-            }),
-            className: 'tubes',
-        }));
-
-        map.addLayer(new ol.layer.Vector({
-            source: new ol.source.Vector({
-                features: new ol.format.GeoJSON().readFeatures(cables),
-            }),
-            style: new ol.style.Style({
-                stroke: new ol.style.Stroke({
-                    color: 'blue',
-                    width: 1,
-                }),
-            }),
-            className: 'cables',
-        }));
-
-        /* Center map on tracks */
-        map.getView().fit(tracks_layer.getSource().getExtent() , map.getSize());
-
-
-    })();
 }
@@ -3,8 +3,17 @@ from math import cos, radians, sin
 
 from django.db import connection
 from django.test import TestCase, override_settings
+from shapely import get_srid
 
-from kablo.core.utils import wkt_from_line
+from kablo.core.benchmarks import sample_lines
+from kablo.core.utils import (
+    geodjango2shapely,
+    geodjango2shapely_many,
+    import_arcsde_linestrings_many,
+    shapely2geodjango,
+    shapely2geodjango_many,
+    wkt_from_line,
+)
 
 
 class GeometryTestCase(TestCase):
@@ -38,3 +47,62 @@ class GeometryTestCase(TestCase):
         expected_azimuths = [10, 25, 30, 60, 140, -135, -55, -5, 10]
 
         self.assertEqual(row, expected_azimuths)
+
+    def test_geometry_conversion(self):
+        geoms = sample_lines(count=3, vertices=5) + [None]
+
+        shapely_geoms = geodjango2shapely_many(geoms)
+        self.assertIsNone(shapely_geoms[-1])
+        for geom, shapely_geom in zip(geoms[:-1], shapely_geoms):
+            self.assertEqual(get_srid(shapely_geom), 2056)
+            self.assertTrue(shapely_geom.has_z)
+            self.assertEqual(geodjango2shapely(geom), shapely_geom)
+
+        geos_geoms = shapely2geodjango_many(shapely_geoms)
+        self.assertIsNone(geos_geoms[-1])
+        for geom, geos_geom, shapely_geom in zip(geoms[:-1], geos_geoms, shapely_geoms):
+            self.assertEqual(geos_geom.srid, 2056)
+            self.assertTrue(geos_geom.equals_exact(geom))
+            self.assertEqual(geos_geom.coords, shapely2geodjango(shapely_geom).coords)
+
+    def test_arcsde_conversion(self):
+        geometries = [
+            {"type": "LineString", "coordinates": [[0, 0], [1, 1]]},
+            {
+                "type": "MultiLineString",
+                "coordinates": [[[0, 0], [1, 1]], [[2, 2, 5], [3, 3, 6]]],
+            },
+            None,
+            {"type": "Point", "coordinates": [0, 0]},
+            {"type": "LineString", "coordinates": [[0, 0]]},
+            {"type": "LineString", "coordinates": [[0, "foo"], [1, 1]]},
+        ]
+
+        result = import_arcsde_linestrings_many(geometries)
+        line, multiline, *rejected = result.geometries
+        self.assertEqual(rejected, [None] * 4)
+        self.assertEqual(line.geom_type, "MultiLineString")
+        self.assertEqual(line.srid, 2056)
+        self.assertEqual(line.coords, (((0, 0, 999), (1, 1, 999)),))
+        # the given Z are kept
+        self.assertEqual(multiline.coords[1], ((2, 2, 5), (3, 3, 6)))
+        self.assertEqual(
+            result.rejected,
+            [
+                (2, "no geometry"),
+                (3, "unsupported geometry type Point"),
+                (4, "line with less than 2 vertices"),
+                (5, "invalid coordinates"),
+            ],
+        )
+
+        result = import_arcsde_linestrings_many(geometries[:2], "LineString")
+        self.assertEqual(result.geometries[0].coords, ((0, 0, 999), (1, 1, 999)))
+        self.assertEqual(result.rejected, [(1, "2 parts, a LineString is expected")])
+        # the source is not modified
+        self.assertEqual(geometries[0]["coordinates"], [[0, 0], [1, 1]])
+
+        non_finite = {"type": "LineString", "coordinates": [[0, float("nan")], [1, 1]]}
+        result = import_arcsde_linestrings_many([non_finite, *geometries[:2]])
+        self.assertEqual(result.rejected, [(0, "non-finite coordinates")])
+        self.assertEqual(result.geometries[2].coords[1], ((2, 2, 5), (3, 3, 6)))
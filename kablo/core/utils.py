@@ -1,13 +1,51 @@
-from django.contrib.gis.geos import GEOSGeometry, LineString, MultiLineString
-from shapely import Geometry, get_srid, wkb
+from itertools import chain
+from typing import NamedTuple
+
+import numpy as np
+from django.contrib.gis.geos import GEOSGeometry
+from shapely import (
+    Geometry,
+    GeometryType,
+    from_ragged_array,
+    from_wkb,
+    get_srid,
+    set_srid,
+    to_wkb,
+)
+
+# elevation of the ArcSDE lines, which are 2D
+ARCSDE_Z = 999
 
 
 def geodjango2shapely(geodjango_geom) -> Geometry:
-    return wkb.loads(geodjango_geom.hexewkb)
+    # binary EWKB: no hex encoding, the srid comes along
+    return from_wkb(bytes(geodjango_geom.ewkb))
 
 
 def shapely2geodjango(shapely_geom):
-    return GEOSGeometry(shapely_geom.wkb_hex, srid=int(get_srid(shapely_geom)))
+    return GEOSGeometry(
+        memoryview(to_wkb(shapely_geom)), srid=int(get_srid(shapely_geom))
+    )
+
+
+def geodjango2shapely_many(geodjango_geoms) -> np.ndarray:
+    """
+    Convert many GeoDjango geometries (or None) in one call
+    """
+    return from_wkb(
+        [None if geom is None else bytes(geom.ewkb) for geom in geodjango_geoms]
+    )
+
+
+def shapely2geodjango_many(shapely_geoms) -> list:
+    """
+    Convert many shapely geometries (or None) in one call
+    """
+    shapely_geoms = np.asarray(shapely_geoms, dtype=object)
+    return [
+        None if wkb is None else GEOSGeometry(memoryview(wkb), srid=int(srid))
+        for wkb, srid in zip(to_wkb(shapely_geoms), get_srid(shapely_geoms))
+    ]
 
 
 def wkt_from_line(line: list[tuple[float, float]], force3d=True) -> str:
@@ -24,29 +62,148 @@ def wkt_from_multiline(multiline: list[list[tuple[float, float]]]) -> str:
     return f"MULTILINESTRING ({line_wkts})"
 
 
-def import_arcsde_linestrings_to_geos(geometry, output_type="MultiLineString"):
-    geom = None
+class RejectedGeometry(NamedTuple):
+    # position of the geometry in the converted ones
+    index: int
+    reason: str
+
+
+class ConversionResult(NamedTuple):
+    # GeoDjango geometries, None for the rejected ones
+    geometries: list
+    rejected: list[RejectedGeometry]
+
+
+def _arcsde_parts(geometry, output_type: str) -> list:
+    """
+    Coordinate lists of the parts of a GeoJSON geometry, the coordinates
+    themselves are read later
+    """
+    if geometry is None:
+        raise ValueError("no geometry")
+    if geometry["type"] == "LineString":
+        parts = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiLineString":
+        parts = geometry["coordinates"]
+    else:
+        raise ValueError(f"unsupported geometry type {geometry['type']}")
+    if not parts:
+        raise ValueError("empty geometry")
+    if output_type == "LineString" and len(parts) > 1:
+        raise ValueError(f"{len(parts)} parts, a LineString is expected")
+    if any(len(part) < 2 for part in parts):
+        raise ValueError("line with less than 2 vertices")
+    return parts
+
+
+def _arcsde_coords(parts: list, z: float) -> np.ndarray:
+    """
+    3D coordinates of all the vertices of the parts, 2D and 3D vertices
+    may be mixed. The values are read at once, not vertex by vertex.
+    """
+    vertices = list(chain.from_iterable(parts))
+    try:
+        dims = np.fromiter(map(len, vertices), dtype=np.int64, count=len(vertices))
+        values = np.fromiter(
+            chain.from_iterable(vertices), dtype=float, count=int(dims.sum())
+        )
+    except (TypeError, ValueError):
+        raise ValueError("invalid coordinates")
+    if not np.isin(dims, (2, 3)).all():
+        raise ValueError("invalid coordinates")
+    if (dims == 2).all():
+        return np.column_stack((values.reshape(-1, 2), np.full(len(dims), z)))
+    starts = np.cumsum(dims) - dims
+    coords = np.full((len(dims), 3), z, dtype=float)
+    coords[:, 0] = values[starts]
+    coords[:, 1] = values[starts + 1]
+    has_z = dims == 3
+    coords[has_z, 2] = values[starts[has_z] + 2]
+    return coords
+
+
+def import_arcsde_linestrings_many(
+    geometries, output_type="MultiLineString", z=ARCSDE_Z, srid=2056
+) -> ConversionResult:
+    """
+    Convert the GeoJSON (Multi)LineStrings of a layer exported from ArcSDE
+    to 3D GeoDjango geometries of `output_type`, the missing Z being set to `z`.
+    The coordinates of all the geometries are read in one array, geometry by
+    geometry only to find the invalid ones.
+    The geometries which cannot be converted are rejected with the reason.
+    """
+    rejected = []
+    # parts of the accepted geometries, and their indexes
+    parts = []
+    accepted = []
+    for index, geometry in enumerate(geometries):
+        try:
+            parts.append(_arcsde_parts(geometry, output_type))
+        except (KeyError, TypeError, ValueError) as e:
+            reason = str(e) if isinstance(e, ValueError) else "invalid GeoJSON"
+            rejected.append(RejectedGeometry(index, reason))
+            continue
+        accepted.append(index)
+
+    converted = [None] * (len(accepted) + len(rejected))
     try:
-        # TODO: handle deagregation from multiline to line
-        if geometry["type"] == "MultiLineString" and output_type == "MultiLineString":
-            coordinates = []
-            for part in geometry["coordinates"]:
-                parts = []
-                for vertex in part:
-                    parts.append(vertex.append(999))
-                coordinates.append(parts)
-            geom = MultiLineString(coordinates)
-
-        elif geometry["type"] == "LineString":
-            coordinates = []
-            for vertex in geometry["coordinates"]:
-                vertex.append(999)
-                coordinates.append(vertex)
-            if output_type == "MultiLineString":
-                geom = MultiLineString(LineString(coordinates))
-            else:
-                geom = LineString(coordinates)
-    except:
-        # TODO: report broken geometries
-        pass
-    return geom
+        coords = _arcsde_coords(
+            [part for geometry_parts in parts for part in geometry_parts], z
+        )
+    except ValueError:
+        accepted_parts = list(zip(accepted, parts))
+        accepted, parts, arrays = [], [], []
+        for index, geometry_parts in accepted_parts:
+            try:
+                arrays.append(_arcsde_coords(geometry_parts, z))
+            except ValueError as e:
+                rejected.append(RejectedGeometry(index, str(e)))
+                continue
+            accepted.append(index)
+            parts.append(geometry_parts)
+        coords = np.concatenate(arrays) if arrays else np.empty((0, 3))
+    if not accepted:
+        return ConversionResult(converted, sorted(rejected))
+
+    vertex_counts = np.array(
+        [len(part) for geometry_parts in parts for part in geometry_parts]
+    )
+    part_counts = np.array([len(geometry_parts) for geometry_parts in parts])
+    part_offsets = np.concatenate(([0], np.cumsum(vertex_counts)))
+    geom_offsets = np.concatenate(([0], np.cumsum(part_counts)))
+
+    # geometries with non-finite coordinates
+    finite = np.logical_and.reduceat(
+        np.isfinite(coords).all(axis=1), part_offsets[geom_offsets[:-1]]
+    )
+    if not finite.all():
+        rejected += [
+            RejectedGeometry(int(index), "non-finite coordinates")
+            for index in np.asarray(accepted)[~finite]
+        ]
+        accepted = np.asarray(accepted)[finite]
+        coords = coords[np.repeat(finite, np.diff(part_offsets[geom_offsets]))]
+        vertex_counts = vertex_counts[np.repeat(finite, part_counts)]
+        part_counts = part_counts[finite]
+        part_offsets = np.concatenate(([0], np.cumsum(vertex_counts)))
+        geom_offsets = np.concatenate(([0], np.cumsum(part_counts)))
+
+    if output_type == "MultiLineString":
+        shapely_geoms = from_ragged_array(
+            GeometryType.MULTILINESTRING, coords, (part_offsets, geom_offsets)
+        )
+    else:
+        shapely_geoms = from_ragged_array(
+            GeometryType.LINESTRING, coords, (part_offsets,)
+        )
+    geos_geoms = shapely2geodjango_many(set_srid(shapely_geoms, srid))
+    for index, geom in zip(accepted, geos_geoms):
+        converted[index] = geom
+    return ConversionResult(converted, sorted(rejected))
+
+
+def import_arcsde_linestrings_to_geos(geometry, output_type="MultiLineString"):
+    """
+    Convert one geometry (see `import_arcsde_linestrings_many`), None if rejected
+    """
+    return import_arcsde_linestrings_many([geometry], output_type).geometries[0]
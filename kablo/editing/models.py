@@ -1,10 +1,13 @@
+import logging
 import uuid
 
 from django.contrib.gis.db import models
 from django.db import transaction
 from django_oapif.decorators import register_oapif_viewset
 
-from kablo.network.models import Track
+from kablo.network.split import split_tracks
+
+logger = logging.getLogger(__name__)
 
 
 @register_oapif_viewset(crs=2056)
@@ -20,5 +23,7 @@ class TrackSplit(models.Model):
         # TODO remove when we don't need data anymore
         # if self.force_save:
         if is_adding:
-            for track in Track.objects.filter(geom__intersects=self.geom):
-                track.split(self.geom)
+            result = split_tracks(self.geom)
+            logger.info(
+                f"track split {self.id}: {result.tracks} tracks and {result.sections} sections touched"
+            )
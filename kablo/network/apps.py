@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class NetworkConfig(AppConfig):
     name = "kablo.network"
+
+    def ready(self):
+        from kablo.network import signals  # noqa: F401
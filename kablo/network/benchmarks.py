@@ -0,0 +1,65 @@
+import uuid
+
+from django.contrib.gis.db.models import Extent
+from django.core.cache import cache
+
+from kablo.core.benchmarks import register_benchmark
+from kablo.network.models import Track
+from kablo.network.profile import (
+    ProfileCable,
+    ProfilePos,
+    ProfileTube,
+    profile_figure,
+    render_profile,
+)
+from kablo.network.tiles import TILE_ORIGIN, render_tile, tile_size
+
+
+@register_benchmark("section_profile")
+def section_profile_benchmark():
+    # a busy section: 4 rows of 4 tubes, with 4 cables each
+    tubes = []
+    for i in range(16):
+        pos = ProfilePos(x=(i % 4) * 200 - 300, z=-(i // 4) * 200 - 600)
+        cables = [
+            ProfileCable(id=str(uuid.uuid4()), identifier=f"cable {i}.{j}", pos=pos)
+            for j in range(4)
+        ]
+        tubes.append(
+            ProfileTube(
+                id=str(uuid.uuid4()),
+                diameter=120,
+                pos=pos,
+                offset_x=pos.x,
+                offset_z=pos.z,
+                cables=cables,
+            )
+        )
+    cache.set("benchmark-section-profile", render_profile(tubes))
+
+    return {
+        # former rendering, plotly.js inlined
+        "to_html (full)": lambda: profile_figure(tubes).to_html(),
+        "render_profile": lambda: render_profile(tubes),
+        "render_profile (cached)": lambda: cache.get("benchmark-section-profile"),
+    }
+
+
+@register_benchmark("vector_tiles")
+def vector_tiles_benchmark():
+    # tiles at the center of the network, rendered without the tile cache
+    xmin, ymin, xmax, ymax = Track.objects.aggregate(extent=Extent("geom"))[
+        "extent"
+    ] or (2600000, 1200000, 2600000, 1200000)
+    x, y = (xmin + xmax) / 2, (ymin + ymax) / 2
+
+    def tile(layer, z):
+        tile_x = int((x - TILE_ORIGIN[0]) // tile_size(z))
+        tile_y = int((TILE_ORIGIN[1] - y) // tile_size(z))
+        return lambda: render_tile(layer, z, tile_x, tile_y)
+
+    return {
+        f"{layer} z{z}": tile(layer, z)
+        for layer in ("track", "tube", "cable")
+        for z in (2, 6, 8, 10, 12, 14)
+    }
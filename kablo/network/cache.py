@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, NamedTuple
+
+from django.conf import settings
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+
+class LRUCache:
+    """
+    Thread-safe cache keeping the `maxsize` most recently used values (0 disables it).
+    Values can be attached to an owner (e.g. a section id), to invalidate them together.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Any], owner: Hashable = None
+    ):
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                self._values.move_to_end(key)
+                return self._values[key][0]
+            self.misses += 1
+
+        value = compute()
+        if self.maxsize <= 0:
+            return value
+
+        with self._lock:
+            self._values[key] = (value, owner)
+            self._values.move_to_end(key)
+            if owner is not None:
+                self._owners.setdefault(owner, set()).add(key)
+            while len(self._values) > self.maxsize:
+                old_key, (_, old_owner) = self._values.popitem(last=False)
+                self._discard_owner_key(old_owner, old_key)
+        return value
+
+    def _discard_owner_key(self, owner, key):
+        keys = self._owners.get(owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._owners[owner]
+
+    def invalidate(self, owner: Hashable):
+        """
+        Drop the values attached to `owner`
+        """
+        with self._lock:
+            for key in self._owners.pop(owner, ()):
+                self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._owners.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, len(self._values), self.maxsize)
+
+
+# offset parts of the tubes (owned by their section) and of the cables (owned by their tube)
+offset_part_cache = LRUCache(maxsize=settings.OFFSET_PART_CACHE_SIZE)
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from kablo.network.models import (
+    Cable,
+    CableTube,
+    Change,
+    Section,
+    Station,
+    Track,
+    Tube,
+    TubeSection,
+    not_soft_deleted,
+    published_fields,
+)
+
+# models whose changes are logged by triggers, by name
+CHANGE_MODELS = {
+    model.__name__: model
+    for model in (Track, Section, Tube, TubeSection, Cable, CableTube, Station)
+}
+
+
+class ChangeCursor(NamedTuple):
+    xid: int
+    id: int
+
+
+class FeatureChange(NamedTuple):
+    model: type
+    object_id: str
+    # current state of the feature, None if it was deleted (tombstone)
+    feature: dict | None
+
+
+def change_horizon() -> int:
+    """
+    Transaction id below which all the transactions are finished:
+    the changes below it will not be joined by changes committed later.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def cursor_expired(cursor: ChangeCursor) -> bool:
+    """
+    The last change read by the cursor was pruned (see `prune_changes`):
+    the changes after it may be incomplete, the client must synchronize again
+    """
+    return not Change.objects.filter(id=cursor.id).exists()
+
+
+def prune_changes(days: int) -> int:
+    """
+    Delete the changes older than `days`, but the latest one which is the cursor
+    of the clients up to date. Returns the number of deleted changes.
+    """
+    latest = Change.objects.aggregate(latest=Max("id"))["latest"]
+    deleted, _ = (
+        Change.objects.filter(changed_at__lt=timezone.now() - timedelta(days=days))
+        .exclude(id=latest)
+        .delete()
+    )
+    return deleted
+
+
+def changes_after(cursor: ChangeCursor | None, limit: int) -> list:
+    """
+    Logged changes after the cursor, in the order of their transactions,
+    up to the ones of the transactions still running
+    """
+    changes = Change.objects.filter(xid__lt=change_horizon())
+    if cursor is not None:
+        changes = changes.filter(xid__gt=cursor.xid) | changes.filter(
+            xid=cursor.xid, id__gt=cursor.id
+        )
+    return list(
+        changes.order_by("xid", "id").values("id", "xid", "model", "object_id")[:limit]
+    )
+
+
+def feature_states(model, object_ids: list, precision: int = 8) -> dict:
+    """
+    Current attributes of the features, with their geometry as GeoJSON
+    (`precision` decimals), by id
+    """
+    # named as the properties of the OAPIF collections
+    fields = {
+        field.attname: field.name
+        for field in published_fields(model)
+        if field.name not in ("id", "geom")
+    }
+    queryset = model.objects.filter(not_soft_deleted(model), pk__in=object_ids)
+    if any(field.name == "geom" for field in model._meta.concrete_fields):
+        queryset = queryset.annotate(geojson=AsGeoJSON("geom", precision=precision))
+        fields["geojson"] = "geojson"
+    return {
+        row.pop("id"): {name: row[column] for column, name in fields.items()}
+        for row in queryset.values("id", *fields)
+    }
+
+
+def feature_changes(changes: list, precisions: dict, chunk_size: int = 2000):
+    """
+    Latest state of the features changed by `changes`, once per feature,
+    read by chunks in the order of their last change.
+    `precisions` are the decimals of the coordinates, by model name.
+    """
+    latest = {}
+    for change in changes:
+        key = (change["model"], change["object_id"])
+        latest.pop(key, None)
+        latest[key] = change
+    keys = list(latest)
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start : start + chunk_size]
+        states = {}
+        for model_name in {model_name for model_name, _ in chunk}:
+            states[model_name] = feature_states(
+                CHANGE_MODELS[model_name],
+                [object_id for name, object_id in chunk if name == model_name],
+                precisions[model_name],
+            )
+        for model_name, object_id in chunk:
+            yield FeatureChange(
+                CHANGE_MODELS[model_name],
+                object_id,
+                states[model_name].get(object_id),
+            )
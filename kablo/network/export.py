@@ -0,0 +1,312 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from kablo.network.models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# export format => OGR driver of the spatial layers, extension of the artifact
+EXPORT_FORMATS = {"gpkg": ("GPKG", "gpkg"), "fgb": ("FlatGeobuf", "zip")}
+# features read per round trip by OGR, and written per transaction
+CURSOR_PAGE = 5000
+WRITE_GROUP = 65536
+# the running jobs are touched while written, the ones not touched for
+# STALE_AFTER were left by a stopped worker and are failed
+HEARTBEAT = 30
+STALE_AFTER = timedelta(minutes=10)
+
+# changes of the network tables (see kablo.network.models.Watermark),
+# and of the value lists which are small enough to be hashed
+WATERMARK_SQL = """
+    SELECT md5(concat_ws(
+        '|',
+        (
+            SELECT string_agg(table_name || ':' || changes, ',' ORDER BY table_name)
+            FROM (
+                SELECT table_name, sum(changes) AS changes
+                FROM network_watermark GROUP BY table_name
+            ) AS watermarks
+        ),
+        (SELECT md5(string_agg(v::text, ',' ORDER BY v.id)) FROM valuelist_statustype v),
+        (SELECT md5(string_agg(v::text, ',' ORDER BY v.id)) FROM valuelist_cabletensiontype v),
+        (SELECT md5(string_agg(v::text, ',' ORDER BY v.id)) FROM valuelist_tubecableprotectiontype v)
+    ))
+"""
+
+
+class ExportLayer(NamedTuple):
+    name: str
+    # the value lists are resolved to their names, the features soft-deleted
+    # by the import synchronization are left out, with their sections and relations
+    sql: str
+    spatial: bool = True
+
+
+EXPORT_LAYERS = [
+    ExportLayer(
+        "track",
+        "SELECT t.id::text AS id, t.created_at, t.updated_at, t.original_id, t.geom "
+        "FROM network_track t WHERE t.deleted_at IS NULL",
+    ),
+    ExportLayer(
+        "section",
+        "SELECT t.id::text AS id, t.created_at, t.updated_at, t.track_id::text AS track_id, "
+        "t.order_index, t.geom FROM network_section t "
+        "JOIN network_track track ON track.id = t.track_id "
+        "WHERE track.deleted_at IS NULL",
+    ),
+    ExportLayer(
+        "tube",
+        "SELECT t.id::text AS id, t.created_at, t.updated_at, t.original_id, "
+        "status.name_fr AS status, t.diameter, protection.name_fr AS cable_protection_type, "
+        "t.cable_count, t.geom FROM network_tube t "
+        "LEFT JOIN valuelist_statustype status ON status.id = t.status_id "
+        "LEFT JOIN valuelist_tubecableprotectiontype protection "
+        "ON protection.id = t.cable_protection_type_id "
+        "WHERE t.deleted_at IS NULL",
+    ),
+    ExportLayer(
+        "cable",
+        "SELECT t.id::text AS id, t.created_at, t.updated_at, t.identifier, t.original_id, "
+        "tension.name_fr AS tension, status.name_fr AS status, t.geom FROM network_cable t "
+        "LEFT JOIN valuelist_cabletensiontype tension ON tension.id = t.tension_id "
+        "LEFT JOIN valuelist_statustype status ON status.id = t.status_id "
+        "WHERE t.deleted_at IS NULL",
+    ),
+    ExportLayer(
+        "station",
+        "SELECT t.id::text AS id, t.created_at, t.updated_at, t.original_id, t.label, t.geom "
+        "FROM network_station t WHERE t.deleted_at IS NULL",
+    ),
+    ExportLayer(
+        "tube_section",
+        "SELECT t.id::text AS id, t.tube_id::text AS tube_id, t.section_id::text AS section_id, "
+        "t.order_index, t.interpolated, t.offset_x, t.offset_z FROM network_tubesection t "
+        "JOIN network_tube tube ON tube.id = t.tube_id "
+        "JOIN network_section section ON section.id = t.section_id "
+        "JOIN network_track track ON track.id = section.track_id "
+        "WHERE tube.deleted_at IS NULL AND track.deleted_at IS NULL",
+        spatial=False,
+    ),
+    ExportLayer(
+        "cable_tube",
+        "SELECT t.id::text AS id, t.cable_id::text AS cable_id, t.tube_id::text AS tube_id, "
+        "t.order_index, t.display_offset FROM network_cabletube t "
+        "JOIN network_cable cable ON cable.id = t.cable_id "
+        "JOIN network_tube tube ON tube.id = t.tube_id "
+        "WHERE cable.deleted_at IS NULL AND tube.deleted_at IS NULL",
+        spatial=False,
+    ),
+]
+
+
+def network_watermark(cursor=None) -> str:
+    """
+    Hash of the state of the exported tables
+    """
+    if cursor is None:
+        with connection.cursor() as cursor:
+            return network_watermark(cursor)
+    cursor.execute(WATERMARK_SQL)
+    return cursor.fetchone()[0]
+
+
+def fail_stale_exports() -> int:
+    """
+    Fail the running jobs of workers which stopped while writing them
+    """
+    return ExportJob.objects.filter(
+        status="running", updated_at__lt=timezone.now() - STALE_AFTER
+    ).update(
+        status="failed", error="The export worker stopped", updated_at=timezone.now()
+    )
+
+
+def request_export(export_format: str) -> ExportJob:
+    """
+    Export job of the current data: the finished or queued one if any, a new one otherwise
+    """
+    fail_stale_exports()
+    watermark = network_watermark()
+    job = (
+        ExportJob.objects.filter(format=export_format, watermark=watermark)
+        .exclude(status="failed")
+        .order_by("-created_at")
+        .first()
+    )
+    if job is None:
+        job = ExportJob.objects.create(format=export_format, watermark=watermark)
+    return job
+
+
+def _touch(job: ExportJob, **fields):
+    ExportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now(), **fields)
+
+
+def _ogr2ogr(args: list, heartbeat=None):
+    db = connection.settings_dict
+    env = {
+        **os.environ,
+        "PGHOST": db["HOST"] or "",
+        "PGPORT": str(db["PORT"] or ""),
+        "PGUSER": db["USER"] or "",
+        "PGPASSWORD": db["PASSWORD"] or "",
+    }
+    with subprocess.Popen(
+        [
+            "ogr2ogr",
+            "--config",
+            "OGR_PG_CURSOR_PAGE",
+            str(CURSOR_PAGE),
+            "-gt",
+            str(WRITE_GROUP),
+            *args,
+        ],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    ) as process:
+        try:
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=HEARTBEAT)
+                    break
+                except subprocess.TimeoutExpired:
+                    if heartbeat is not None:
+                        heartbeat()
+        except BaseException:
+            process.kill()
+            raise
+    if process.returncode:
+        raise subprocess.CalledProcessError(
+            process.returncode, process.args, stdout, stderr
+        )
+
+
+def _export_layer(
+    layer: ExportLayer, driver: str, path: str, snapshot: str, heartbeat=None
+):
+    # all the layers are read from the same snapshot
+    source = [
+        f"PG:dbname={connection.settings_dict['NAME']}",
+        "-oo",
+        "PRELUDE_STATEMENTS=BEGIN ISOLATION LEVEL REPEATABLE READ; "
+        f"SET TRANSACTION SNAPSHOT '{snapshot}'",
+        "-oo",
+        "CLOSING_STATEMENTS=COMMIT",
+    ]
+    if driver == "GPKG":
+        append = ["-append"] if os.path.exists(path) else []
+        target = ["-f", driver, path, *append]
+    else:
+        # one file per layer, FlatGeobuf has no geometryless layers
+        target = ["-f", driver if layer.spatial else "CSV", path]
+    srs = ["-a_srs", "EPSG:2056"] if layer.spatial else []
+    _ogr2ogr([*target, *source, "-sql", layer.sql, "-nln", layer.name, *srs], heartbeat)
+
+
+def run_export(job: ExportJob):
+    """
+    Write the export of the job and keep it as the cached export of its format.
+    The progress is updated once each layer is written, the job is touched
+    every HEARTBEAT seconds meanwhile.
+    """
+    driver, extension = EXPORT_FORMATS[job.format]
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(dir=settings.EXPORT_DIR)
+    # a transaction on its own connection holds the snapshot of the export
+    snapshot_connection = connections.create_connection("default")
+    try:
+        with snapshot_connection.cursor() as cursor:
+            cursor.execute("BEGIN ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot = cursor.fetchone()[0]
+            counts = []
+            for layer in EXPORT_LAYERS:
+                cursor.execute(f"SELECT count(*) FROM ({layer.sql}) AS layer")
+                counts.append(cursor.fetchone()[0])
+
+            total = max(sum(counts), 1)
+            exported = 0
+            for layer, count in zip(EXPORT_LAYERS, counts):
+                if driver == "GPKG":
+                    path = os.path.join(workdir, f"kablo.{extension}")
+                else:
+                    suffix = "fgb" if layer.spatial else "csv"
+                    path = os.path.join(workdir, f"{layer.name}.{suffix}")
+                _export_layer(
+                    layer, driver, path, snapshot, heartbeat=lambda: _touch(job)
+                )
+                exported += count
+                _touch(job, progress=100 * exported // total)
+                logger.info(f"export {job.pk}: {count} {layer.name} written")
+            cursor.execute("COMMIT")
+
+        file = os.path.join(settings.EXPORT_DIR, f"kablo-{job.pk}.{extension}")
+        if driver == "GPKG":
+            os.replace(path, file)
+        else:
+            with zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED) as archive:
+                for name in sorted(os.listdir(workdir)):
+                    archive.write(os.path.join(workdir, name), name)
+    finally:
+        snapshot_connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    job.status = "done"
+    job.progress = 100
+    job.file = file
+    job.size = os.path.getsize(file)
+    job.save()
+
+    # the former exports of the format are outdated
+    for former in ExportJob.objects.filter(format=job.format, status="done").exclude(
+        pk=job.pk
+    ):
+        delete_export(former)
+
+
+def delete_export(job: ExportJob):
+    if job.file and os.path.exists(job.file):
+        os.remove(job.file)
+    job.delete()
+
+
+def process_next_export() -> ExportJob | None:
+    """
+    Run the oldest pending export job, concurrent workers run distinct jobs.
+    Returns the job, None if there was none.
+    """
+    fail_stale_exports()
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status="pending")
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = "running"
+        job.save()
+
+    try:
+        run_export(job)
+    except Exception as e:
+        stderr = getattr(e, "stderr", None) or ""
+        logger.exception(f"export {job.pk} failed: {e} {stderr}")
+        job.status = "failed"
+        job.error = f"{e}\n{stderr}".strip()
+        job.save()
+    return job
@@ -0,0 +1,20 @@
+from django.contrib.gis.db import models
+from django.db.models import Func
+
+
+class TubeGeom(Func):
+    """
+    Offset geometry of a tube, computed by the database (see `tube_geom` in sql_config)
+    """
+
+    function = "tube_geom"
+    output_field = models.LineStringField(srid=2056, dim=3)
+
+
+class CableGeom(Func):
+    """
+    Offset geometry of a cable, computed by the database (see `cable_geom` in sql_config)
+    """
+
+    function = "cable_geom"
+    output_field = models.LineStringField(srid=2056)
@@ -0,0 +1,241 @@
+import logging
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from math import cos, radians, sin
+from typing import NamedTuple
+
+from django.contrib.gis.geos import LineString, MultiLineString
+
+from kablo.network.models import Cable, CableTube, Section, Track, Tube, TubeSection
+from kablo.network.recompute import deferred_recompute, mark_dirty
+
+logger = logging.getLogger(__name__)
+
+# a route is a chain of tracks, each track end being the start of the next one
+TRACKS_PER_ROUTE = (2, 5)
+SECTIONS_PER_TRACK = (1, 4)
+SEGMENTS_PER_SECTION = (2, 6)
+# meters
+SEGMENT_LENGTH = (8, 15)
+ROUTE_SPACING = 1000
+# tubes per section of a route, and sections spanned by a tube
+TUBES_PER_SECTION = 1
+SECTIONS_PER_TUBE = (1, 12)
+# tubes followed by a cable, each one starting at the section where the former
+# ends, so that the cable geometry is a single line
+TUBES_PER_CABLE = (1, 3)
+# positions of the tubes in a section (mm), as populate_data
+TUBE_SLOTS = [(x + y // 10, y) for x in range(-800, 801, 200) for y in (-200, 200)]
+# sections generated before the objects are inserted and recomputed
+CHUNK_SECTIONS = 5000
+BATCH_SIZE = 2000
+
+
+class GeneratedNetwork(NamedTuple):
+    tracks: int
+    sections: int
+    tubes: int
+    cables: int
+    cable_tubes: int
+    seconds: float
+
+    def __str__(self):
+        return (
+            f"{self.tracks} tracks, {self.sections} sections, {self.tubes} tubes, "
+            f"{self.cables} cables ({self.cable_tubes} in tubes) "
+            f"generated in {self.seconds:.1f}s"
+        )
+
+
+class _Chunk:
+    def __init__(self):
+        self.tracks = []
+        self.sections = []
+        self.tubes = []
+        self.tube_sections = []
+        self.cables = []
+        self.cable_tubes = []
+
+
+class NetworkGenerator:
+    """
+    Synthetic network of `size` sections: routes of tracks laid out on a grid,
+    tubes spanning several sections of a route, and up to `max_cables` cables
+    per tube going on in the tubes which start where it ends.
+    The network only depends on the seed: the ids, geometries and attributes
+    are the same on each run (the timestamps are not).
+    """
+
+    def __init__(
+        self,
+        size: int,
+        seed: int = 0,
+        max_cables: int = 8,
+        origin: tuple[float, float] = (2516800, 1152200),
+    ):
+        self.size = size
+        self.max_cables = max_cables
+        self.origin = origin
+        self.rng = random.Random(seed)
+        # routes per side of the grid, from their average number of sections
+        average_sections = sum(TRACKS_PER_ROUTE) / 2 * sum(SECTIONS_PER_TRACK) / 2
+        self.columns = max(1, int((size / average_sections) ** 0.5) + 1)
+
+    def uuid(self) -> uuid.UUID:
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def _track_parts(self, x: float, y: float, heading: float, sections: int):
+        parts = []
+        for _ in range(sections):
+            line = [(x, y, 0)]
+            for _ in range(self.rng.randint(*SEGMENTS_PER_SECTION)):
+                heading += self.rng.uniform(-25, 25)
+                length = self.rng.uniform(*SEGMENT_LENGTH)
+                x = round(x + length * cos(radians(heading)), 3)
+                y = round(y + length * sin(radians(heading)), 3)
+                line.append((x, y, 0))
+            parts.append(line)
+        return parts, x, y, heading
+
+    def _route(self, index: int, budget: int, chunk: _Chunk) -> int:
+        """
+        Generate a route with at most `budget` sections in the chunk,
+        returns its number of sections
+        """
+        x = self.origin[0] + (index % self.columns) * ROUTE_SPACING
+        y = self.origin[1] + (index // self.columns) * ROUTE_SPACING
+        heading = self.rng.uniform(0, 360)
+
+        route_sections = []
+        for _ in range(self.rng.randint(*TRACKS_PER_ROUTE)):
+            if len(route_sections) == budget:
+                break
+            count = min(
+                self.rng.randint(*SECTIONS_PER_TRACK), budget - len(route_sections)
+            )
+            parts, x, y, heading = self._track_parts(x, y, heading, count)
+            track = Track(
+                id=self.uuid(),
+                geom=MultiLineString(
+                    [LineString(part, srid=2056) for part in parts], srid=2056
+                ),
+            )
+            sections = track.build_sections()
+            for section in sections:
+                section.id = self.uuid()
+            chunk.tracks.append(track)
+            chunk.sections += sections
+            route_sections += sections
+
+        self._tubes_and_cables(route_sections, chunk)
+        return len(route_sections)
+
+    def _tubes_and_cables(self, route_sections: list[Section], chunk: _Chunk):
+        slots = [list(TUBE_SLOTS) for _ in route_sections]
+        tubes = []
+        for _ in range(max(1, round(len(route_sections) * TUBES_PER_SECTION))):
+            start = self.rng.randrange(len(route_sections))
+            end = min(start + self.rng.randint(*SECTIONS_PER_TUBE), len(route_sections))
+            tube = Tube(
+                id=self.uuid(),
+                fake_id=self.uuid(),
+                diameter=10 * self.rng.randint(8, 12),
+            )
+            tube_sections = []
+            for index in range(start, end):
+                if not slots[index]:
+                    # the section is full, the tube ends
+                    break
+                offset_x, offset_z = slots[index].pop(
+                    self.rng.randrange(len(slots[index]))
+                )
+                tube_sections.append(
+                    TubeSection(
+                        id=self.uuid(),
+                        tube=tube,
+                        section=route_sections[index],
+                        order_index=len(tube_sections),
+                        interpolated=False,
+                        offset_x=offset_x,
+                        offset_z=offset_z,
+                    )
+                )
+            if tube_sections:
+                tubes.append((start, start + len(tube_sections), tube))
+                chunk.tube_sections += tube_sections
+
+        # the tubes in the order of the route, and by their first section
+        tubes.sort(key=lambda item: item[0])
+        starting = defaultdict(list)
+        for start, end, tube in tubes:
+            starting[start].append((end, tube))
+        cable_counts = Counter()
+        for _, end, tube in tubes:
+            for _ in range(self.rng.randint(1, self.max_cables)):
+                cable = Cable(id=self.uuid(), fake_id=self.uuid())
+                chunk.cables.append(cable)
+                through = [tube]
+                through_end = end
+                for _ in range(self.rng.randint(*TUBES_PER_CABLE) - 1):
+                    if not starting[through_end]:
+                        break
+                    through_end, next_tube = self.rng.choice(starting[through_end])
+                    through.append(next_tube)
+                for order_index, cable_tube in enumerate(through):
+                    chunk.cable_tubes.append(
+                        CableTube(
+                            id=self.uuid(),
+                            cable=cable,
+                            tube=cable_tube,
+                            order_index=order_index,
+                            display_offset=cable_counts[cable_tube.id],
+                        )
+                    )
+                    cable_counts[cable_tube.id] += 1
+        for _, _, tube in tubes:
+            tube.cable_count = cable_counts[tube.id]
+            chunk.tubes.append(tube)
+
+    @staticmethod
+    def _insert(chunk: _Chunk):
+        # the geometries of the tubes and cables are computed at the end of the block
+        with deferred_recompute():
+            for model, objects in (
+                (Track, chunk.tracks),
+                (Section, chunk.sections),
+                (Tube, chunk.tubes),
+                (TubeSection, chunk.tube_sections),
+                (Cable, chunk.cables),
+                (CableTube, chunk.cable_tubes),
+            ):
+                model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+            mark_dirty(
+                {
+                    Tube: {tube.pk for tube in chunk.tubes},
+                    Cable: {cable.pk for cable in chunk.cables},
+                }
+            )
+
+    def generate(self) -> GeneratedNetwork:
+        """
+        Insert the network, chunk by chunk
+        """
+        start = time.perf_counter()
+        counts = dict.fromkeys(
+            ("tracks", "sections", "tubes", "cables", "cable_tubes"), 0
+        )
+        sections = 0
+        route = 0
+        chunk = _Chunk()
+        while sections < self.size:
+            sections += self._route(route, self.size - sections, chunk)
+            route += 1
+            if len(chunk.sections) >= CHUNK_SECTIONS or sections == self.size:
+                self._insert(chunk)
+                for name in counts:
+                    counts[name] += len(getattr(chunk, name))
+                logger.info(f"{sections}/{self.size} sections generated")
+                chunk = _Chunk()
+        return GeneratedNetwork(**counts, seconds=time.perf_counter() - start)
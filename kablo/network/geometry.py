@@ -0,0 +1,301 @@
+import numpy as np
+from shapely import (
+    LineString,
+    MultiLineString,
+    Point,
+    distance,
+    force_2d,
+    get_coordinates,
+    get_num_coordinates,
+    line_interpolate_point,
+    line_merge,
+    linestrings,
+    multilinestrings,
+    offset_curve,
+    set_srid,
+)
+
+from kablo.core.utils import (
+    geodjango2shapely,
+    geodjango2shapely_many,
+    shapely2geodjango,
+    shapely2geodjango_many,
+)
+from kablo.network.cache import offset_part_cache
+from kablo.network.functions import CableGeom, TubeGeom
+
+CABLE_SPACING = 0.1
+
+
+def _trim_coords(part: LineString) -> list:
+    """
+    The first (resp. last) vertex is moved 0.5 m along the part if it is far
+    enough from the last (resp. previous) vertex, otherwise it is dropped.
+    """
+    coords = list(part.coords)
+
+    first_vertex_distance = distance(Point(coords[0]), Point(coords[-1]))
+    if first_vertex_distance > 1:
+        coords[0] = part.interpolate(0.5).coords[0]
+    else:
+        coords.pop(0)
+
+    last_vertex_distance = distance(Point(coords[-1]), Point(coords[-2]))
+    if last_vertex_distance > 1:
+        coords[-1] = part.interpolate(-0.5).coords[0]
+    else:
+        coords.pop(-1)
+    return coords
+
+
+def offset_tube_part(part: LineString, offset_x: int, offset_z: int) -> LineString:
+    """
+    Offset a 3D section `part` of a tube by `offset_x` and `offset_z` (in mm).
+    """
+    coords = list(part.coords)
+    original_start_point = (coords[0][0], coords[0][1], coords[0][2] + offset_z / 1000)
+    original_end_point = (coords[-1][0], coords[-1][1], coords[-1][2] + offset_z / 1000)
+
+    coords = _trim_coords(part)
+    # forcing 2d: otherwise if offset=0, the original geometry
+    # is returned as is i.e. with z-dimension
+    offset_part = force_2d(
+        offset_curve(LineString(coords), distance=offset_x / 1000, join_style="mitre")
+    )
+
+    new_coords = []
+    for point_offset, point_z in zip(offset_part.coords, coords):
+        new_coords.append(point_offset + (point_z[2] + offset_z / 1000,))
+    return LineString([original_start_point] + new_coords + [original_end_point])
+
+
+def offset_cable_part(part: LineString, offset_x: float) -> LineString:
+    """
+    Offset a tube `part` of a cable by `offset_x` (in m), the result is 2D.
+    """
+    original_start_point = part.coords[0][0:2]
+    original_end_point = part.coords[-1][0:2]
+
+    # forcing 2d: otherwise if offset=0, the original geometry
+    # is returned as is i.e. with z-dimension
+    offset_part = force_2d(
+        offset_curve(
+            LineString(_trim_coords(part)), distance=offset_x, join_style="bevel"
+        )
+    )
+    return LineString(
+        [original_start_point] + list(offset_part.coords) + [original_end_point]
+    )
+
+
+def cable_offset(display_offset: int, cable_count: int) -> float:
+    """
+    The cables are spread in the tube, centered on their count.
+    """
+    return (display_offset - (cable_count - 1) / 2) * CABLE_SPACING
+
+
+def cached_offset_tube_part(section_id, section_geom, offset_x: int, offset_z: int):
+    """
+    `offset_tube_part` of a section (GeoDjango geometry), cached until the section changes.
+    """
+    key = ("tube", section_id, hash(bytes(section_geom.ewkb)), offset_x, offset_z)
+    return offset_part_cache.get_or_compute(
+        key,
+        lambda: offset_tube_part(geodjango2shapely(section_geom), offset_x, offset_z),
+        owner=section_id,
+    )
+
+
+def cached_offset_cable_part(tube_id, tube_geom, offset_x: float):
+    """
+    `offset_cable_part` of a tube (GeoDjango geometry), cached until the tube changes.
+    """
+    key = ("cable", tube_id, hash(bytes(tube_geom.ewkb)), offset_x)
+    return offset_part_cache.get_or_compute(
+        key,
+        lambda: offset_cable_part(geodjango2shapely(tube_geom), offset_x),
+        owner=tube_id,
+    )
+
+
+def _trim_parts(coords: np.ndarray, part_index: np.ndarray, parts: np.ndarray):
+    """
+    Vectorized version of the end vertices handling in `Tube.geom`:
+    the first (resp. last) vertex is moved 0.5 m along the part if it is far
+    enough from the last (resp. previous) vertex, otherwise it is dropped.
+    Returns the trimmed coordinates and a mask of the kept vertices.
+    """
+    counts = np.bincount(part_index, minlength=len(parts))
+    ends = np.cumsum(counts) - 1
+    starts = ends - counts + 1
+
+    start_points = get_coordinates(line_interpolate_point(parts, 0.5), include_z=True)
+    end_points = get_coordinates(line_interpolate_point(parts, -0.5), include_z=True)
+
+    first_vertex_distance = np.hypot(*(coords[starts, :2] - coords[ends, :2]).T)
+    move_first = first_vertex_distance > 1
+
+    # vertex preceding the last one once the first one has been handled
+    previous_vertices = coords[ends - 1].copy()
+    two_vertices = move_first & (counts == 2)
+    previous_vertices[two_vertices] = start_points[two_vertices]
+    last_vertex_distance = np.hypot(*(coords[ends, :2] - previous_vertices[:, :2]).T)
+    move_last = last_vertex_distance > 1
+
+    trimmed = coords.copy()
+    trimmed[starts[move_first]] = start_points[move_first]
+    trimmed[ends[move_last]] = end_points[move_last]
+
+    keep = np.ones(len(coords), dtype=bool)
+    keep[starts[~move_first]] = False
+    keep[ends[~move_last]] = False
+    return trimmed, keep
+
+
+def offset_tube_parts(
+    parts: np.ndarray, offsets_x: np.ndarray, offsets_z: np.ndarray
+) -> np.ndarray:
+    """
+    Offset the 3D section `parts` of tubes by `offsets_x` and `offsets_z` (in mm),
+    vertex handling being the same as `Tube.geom` does for a single tube.
+    """
+    parts = np.asarray(parts)
+    delta_z = np.asarray(offsets_z, dtype=float) / 1000
+    coords, part_index = get_coordinates(parts, include_z=True, return_index=True)
+
+    trimmed, keep = _trim_parts(coords, part_index, parts)
+    trimmed, trimmed_index = trimmed[keep], part_index[keep]
+
+    # forcing 2d: otherwise if offset=0, the original geometry
+    # is returned as is i.e. with z-dimension
+    offset_parts = force_2d(
+        offset_curve(
+            linestrings(trimmed, indices=trimmed_index),
+            distance=np.asarray(offsets_x, dtype=float) / 1000,
+            join_style="mitre",
+        )
+    )
+
+    # re-attach the z of the trimmed vertices to the offset vertices, by position
+    offset_coords, offset_index = get_coordinates(offset_parts, return_index=True)
+    offset_starts = np.cumsum(get_num_coordinates(offset_parts)) - get_num_coordinates(
+        offset_parts
+    )
+    trimmed_counts = np.bincount(trimmed_index, minlength=len(parts))
+    trimmed_starts = np.cumsum(trimmed_counts) - trimmed_counts
+    position = np.arange(len(offset_coords)) - offset_starts[offset_index]
+    has_z = position < trimmed_counts[offset_index]
+    offset_index, position = offset_index[has_z], position[has_z]
+    z = trimmed[trimmed_starts[offset_index] + position, 2] + delta_z[offset_index]
+    offset_coords = np.column_stack([offset_coords[has_z], z])
+
+    # the part starts and ends on the original (not offset) end vertices
+    counts = np.bincount(part_index, minlength=len(parts))
+    ends = np.cumsum(counts) - 1
+    starts = ends - counts + 1
+    end_vertices = np.concatenate([coords[starts], coords[ends]])
+    end_vertices[:, 2] += np.concatenate([delta_z, delta_z])
+
+    all_coords = np.concatenate([end_vertices, offset_coords])
+    all_index = np.concatenate(
+        [np.arange(len(parts)), np.arange(len(parts)), offset_index]
+    )
+    # start vertices first, then the offset vertices, end vertices last
+    all_position = np.concatenate(
+        [
+            np.full(len(parts), -1),
+            np.full(len(parts), np.iinfo(np.int64).max),
+            position,
+        ]
+    )
+    order = np.lexsort((all_position, all_index))
+    return linestrings(all_coords[order], indices=all_index[order])
+
+
+def merge_parts(parts: np.ndarray, owner_index: np.ndarray, srid: int) -> np.ndarray:
+    """
+    Merge the `parts` belonging to the same owner (given by `owner_index`) into one line.
+    """
+    merged = line_merge(multilinestrings(parts, indices=owner_index))
+    return set_srid(merged, srid)
+
+
+def tube_geoms(tubes) -> dict:
+    """
+    Compute the geometry of many tubes at once.
+    `tubes` is a queryset (or an iterable of tubes or ids).
+    Returns a mapping of tube id to its geometry, tubes without section are left out.
+    """
+    from kablo.network.models import TubeSection
+
+    rows = list(
+        TubeSection.objects.filter(tube__in=tubes)
+        .order_by("tube_id", "order_index")
+        .values_list("tube_id", "section__geom", "offset_x", "offset_z")
+    )
+    geoms = {}
+    if not rows:
+        return geoms
+
+    tube_ids, section_geoms, offsets_x, offsets_z = zip(*rows)
+    parts = geodjango2shapely_many(section_geoms)
+    srid = section_geoms[0].srid
+
+    offset_parts = offset_tube_parts(parts, offsets_x, offsets_z)
+
+    owners = {tube_id: index for index, tube_id in enumerate(dict.fromkeys(tube_ids))}
+    owner_index = np.array([owners[tube_id] for tube_id in tube_ids])
+    merged = shapely2geodjango_many(merge_parts(offset_parts, owner_index, srid))
+    geoms.update(zip(owners, merged))
+    return geoms
+
+
+def cable_geoms(cables) -> dict:
+    """
+    Compute the geometry of many cables at once, from the stored tube geometries.
+    `cables` is a queryset (or an iterable of cables or ids).
+    Returns a mapping of cable id to its geometry, cables without tube are left out.
+    """
+    from kablo.network.models import CableTube
+
+    rows = (
+        CableTube.objects.filter(cable__in=cables, tube__geom__isnull=False)
+        .order_by("cable_id", "order_index")
+        .values_list(
+            "cable_id", "tube_id", "tube__geom", "display_offset", "tube__cable_count"
+        )
+    )
+    parts = {}
+    for cable_id, tube_id, tube_geom, display_offset, cable_count in rows:
+        offset_x = cable_offset(display_offset, cable_count)
+        parts.setdefault(cable_id, []).append(
+            cached_offset_cable_part(tube_id, tube_geom, offset_x)
+        )
+    return {
+        cable_id: shapely2geodjango(line_merge(MultiLineString(cable_parts)))
+        for cable_id, cable_parts in parts.items()
+    }
+
+
+def update_tube_geoms_sql(tubes) -> int:
+    """
+    Recompute the geometry of `tubes` (a queryset or an iterable of tubes or ids)
+    in a single set-based UPDATE, the computation being done by PostGIS.
+    The cables are not updated, see `update_cable_geoms_sql`.
+    Returns the number of updated tubes.
+    """
+    from kablo.network.models import Tube
+
+    return Tube.objects.filter(pk__in=tubes).update(geom=TubeGeom("id"))
+
+
+def update_cable_geoms_sql(cables) -> int:
+    """
+    Recompute the geometry of `cables` (a queryset or an iterable of cables or ids)
+    from the stored tube geometries, in a single set-based UPDATE.
+    Returns the number of updated cables.
+    """
+    from kablo.network.models import Cable
+
+    return Cable.objects.filter(pk__in=cables).update(geom=CableGeom("id"))
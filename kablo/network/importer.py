@@ -0,0 +1,230 @@
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+from typing import NamedTuple
+
+import ijson
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# features converted and inserted per batch
+CHUNK_SIZE = 2000
+
+
+class ImportReport(NamedTuple):
+    name: str
+    rows: int
+    skipped: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0
+
+    def __str__(self):
+        return (
+            f"{self.rows} {self.name} imported in {self.seconds:.1f}s "
+            f"({self.rows_per_second:.0f} rows/s), {self.skipped} skipped"
+        )
+
+
+class SyncReport(NamedTuple):
+    name: str
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+    skipped: int
+    seconds: float
+    # ids of the inserted and updated objects
+    # (cable and tube ids of the inserted and deleted tube-cable relations)
+    changed_ids: set
+    # changed features whose objects could not be updated, retried on the next sync
+    conflicts: int = 0
+
+    def __str__(self):
+        conflicts = f", {self.conflicts} conflicts" if self.conflicts else ""
+        return (
+            f"{self.name} synchronized in {self.seconds:.1f}s: {self.inserted} inserted, "
+            f"{self.updated} updated, {self.deleted} deleted, "
+            f"{self.unchanged} unchanged, {self.skipped} skipped{conflicts}"
+        )
+
+
+class CodeMap:
+    """
+    Primary keys of the values of a value list by code, read once.
+    Unknown codes map to the value of `default_code`.
+    """
+
+    def __init__(self, model, default_code: int = 1):
+        self.codes = dict(model.objects.values_list("code", "pk"))
+        self.default = self.codes[default_code]
+
+    def __getitem__(self, code):
+        return self.codes.get(code, self.default)
+
+
+def iter_features(file: str, prefix: str = "features.item") -> Iterator[dict]:
+    """
+    Features of a GeoJSON file, parsed as they are read: the memory does not depend
+    on the file size. Use `prefix="item"` for a plain JSON array.
+    """
+    with open(file, "rb") as fd:
+        yield from ijson.items(fd, prefix, use_float=True)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_features(
+    name: str,
+    model,
+    features: Iterable[dict],
+    build: Callable[[list], list],
+    after_chunk: Callable[[list], None] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> ImportReport:
+    """
+    Insert the objects built from the features, chunk by chunk.
+    `build` returns the (unsaved) objects of a chunk of features, without the ones
+    it cannot convert. `after_chunk` is called with the inserted objects,
+    e.g. to insert their dependent objects.
+    The computed fields are not computed: they must be recomputed afterwards.
+    """
+    start = time.perf_counter()
+    rows = skipped = 0
+    for chunk in chunked(features, chunk_size):
+        objects = model.objects.bulk_create(build(chunk))
+        if after_chunk is not None:
+            after_chunk(objects)
+        rows += len(objects)
+        skipped += len(chunk) - len(objects)
+        logger.debug(f"{rows} {name} imported")
+    return ImportReport(name, rows, skipped, time.perf_counter() - start)
+
+
+def feature_hash(feature) -> str:
+    """
+    Hash of the geometry and of the attributes of a source feature
+    """
+    data = json.dumps(feature, sort_keys=True, separators=(",", ":"))
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+def sync_features(
+    name: str,
+    model,
+    features: Iterable[dict],
+    build: Callable[[list], list],
+    original_id: Callable[[dict], str],
+    update_fields: list,
+    after_insert: Callable[[list], None] = None,
+    after_update: Callable[[list], None] = None,
+    conflicts: Callable[[list], set] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> SyncReport:
+    """
+    Synchronize the imported objects of the model with the features, by original id,
+    instead of deleting and inserting them all:
+    the new features are inserted, the objects of the changed features (by hash)
+    get the `update_fields` of the built objects, the objects whose feature is gone
+    are soft-deleted (`deleted_at`) and restored if it comes back.
+    The objects of the unchanged features are neither built nor written.
+    `after_insert` and `after_update` are called with the objects of each chunk.
+    `conflicts` returns the pks of the objects to update which cannot be: they are
+    left as they are, with their former hash so that the next sync retries them.
+    The computed fields are not computed: the changed objects must be recomputed.
+    """
+    start = time.perf_counter()
+    now = timezone.now()
+    # original id => pk, hash and soft deletion of the imported objects, read once
+    existing = {
+        key: (pk, source_hash, deleted_at is not None)
+        for key, pk, source_hash, deleted_at in model.all_objects.filter(
+            original_id__isnull=False
+        ).values_list("original_id", "pk", "source_hash", "deleted_at")
+    }
+    seen = set()
+    inserted = updated = deleted = unchanged = skipped = conflicting = 0
+    changed_ids = set()
+    for chunk in chunked(features, chunk_size):
+        hashes = {}
+        changed = []
+        for feature in chunk:
+            key = original_id(feature)
+            if key is None or key in seen:
+                skipped += 1
+                continue
+            seen.add(key)
+            hashes[key] = feature_hash(feature)
+            current = existing.get(key)
+            if current is not None and current[1:] == (hashes[key], False):
+                unchanged += 1
+            else:
+                changed.append(feature)
+        if not changed:
+            continue
+
+        objects = build(changed)
+        skipped += len(changed) - len(objects)
+        new_objects = []
+        updated_objects = []
+        for obj in objects:
+            obj.source_hash = hashes[obj.original_id]
+            current = existing.get(obj.original_id)
+            if current is None:
+                new_objects.append(obj)
+            else:
+                obj.pk = current[0]
+                obj.deleted_at = None
+                # not set by bulk_update
+                obj.updated_at = now
+                updated_objects.append(obj)
+
+        if conflicts is not None and updated_objects:
+            kept = conflicts(updated_objects)
+            conflicting += len(kept)
+            updated_objects = [obj for obj in updated_objects if obj.pk not in kept]
+
+        new_objects = model.all_objects.bulk_create(new_objects)
+        model.all_objects.bulk_update(
+            updated_objects,
+            [*update_fields, "source_hash", "deleted_at", "updated_at"],
+        )
+        if after_insert is not None:
+            after_insert(new_objects)
+        if after_update is not None and updated_objects:
+            after_update(updated_objects)
+        inserted += len(new_objects)
+        updated += len(updated_objects)
+        changed_ids.update(obj.pk for obj in new_objects + updated_objects)
+        logger.debug(f"{inserted} {name} inserted, {updated} updated")
+
+    gone = [
+        pk
+        for key, (pk, _, is_deleted) in existing.items()
+        if key not in seen and not is_deleted
+    ]
+    for pks in chunked(gone, chunk_size):
+        deleted += model.all_objects.filter(pk__in=pks).update(
+            deleted_at=now, updated_at=now
+        )
+    return SyncReport(
+        name,
+        inserted,
+        updated,
+        deleted,
+        unchanged,
+        skipped,
+        time.perf_counter() - start,
+        changed_ids,
+        conflicting,
+    )
@@ -0,0 +1,44 @@
+from django.contrib.gis.db.models import GeometryField
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# simplification tolerance (in m) of the levels of detail, level 0 is the full geometry
+LOD_TOLERANCES = {1: 0.5, 2: 2.5, 3: 12.5}
+# models whose simplified geometries are kept by triggers
+SIMPLIFIED_MODELS = ("Track", "Tube", "Cable")
+# pixel size of the OGC scale denominators
+OGC_PIXEL_SIZE = 0.00028
+
+
+def scale_resolution(scale: float) -> float:
+    """
+    Ground resolution (m per pixel) of a scale denominator
+    """
+    return scale * OGC_PIXEL_SIZE
+
+
+def lod_level(resolution: float) -> int:
+    """
+    Coarsest level whose simplification is not visible at `resolution` (m per pixel)
+    """
+    levels = [
+        level for level, tolerance in LOD_TOLERANCES.items() if tolerance <= resolution
+    ]
+    return max(levels, default=0)
+
+
+def simplified_geom(model, level: int):
+    """
+    Expression of the geometry of `model` at the level of detail,
+    the full geometry if it has no simplified geometries
+    """
+    from kablo.network.models import SimplifiedGeometry
+
+    if level == 0 or model.__name__ not in SIMPLIFIED_MODELS:
+        return F("geom")
+    simplified = SimplifiedGeometry.objects.filter(
+        model=model.__name__, object_id=OuterRef("id"), level=level
+    ).values("geom")[:1]
+    return Coalesce(
+        Subquery(simplified), F("geom"), output_field=GeometryField(srid=2056)
+    )
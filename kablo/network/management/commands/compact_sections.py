@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import Lead
+
+from kablo.network.models import Section
+from kablo.network.split import compact_order_index
+
+
+class Command(BaseCommand):
+    help = "Restore the gaps between the order indexes of the sections"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-gap",
+            type=int,
+            default=8,
+            help="Compact the tracks having two sections closer than this gap",
+        )
+        parser.add_argument("--all", action="store_true", help="Compact all the tracks")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        tracks = None
+        if not options["all"]:
+            tracks = set(
+                Section.objects.annotate(
+                    gap=Window(
+                        Lead("order_index"),
+                        partition_by=[F("track_id")],
+                        order_by=F("order_index").asc(),
+                    )
+                    - F("order_index")
+                )
+                .filter(gap__lt=options["min_gap"])
+                .values_list("track_id", flat=True)
+            )
+
+        if tracks is not None and not tracks:
+            print("🤖 no track to compact")
+            return
+
+        sections = compact_order_index(tracks)
+        print(f"🤖 {len(sections)} sections renumbered!")
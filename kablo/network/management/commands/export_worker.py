@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from kablo.network.export import process_next_export
+
+
+class Command(BaseCommand):
+    help = "Write the network exports requested through /network/exports/"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once there is no pending export"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait before polling for new exports",
+        )
+
+    def handle(self, *args, **options):
+        print("🤖 export worker started")
+        while True:
+            start = time.perf_counter()
+            job = process_next_export()
+            if job is not None:
+                elapsed = time.perf_counter() - start
+                print(
+                    f"🤖 export {job.pk} ({job.format}) {job.status} in {elapsed:.1f}s"
+                )
+                continue
+            if options["once"]:
+                print("🤖 no pending export!")
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from kablo.network.changes import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete the changes of the change feed older than the retention"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.CHANGE_RETENTION_DAYS,
+            help="Retention of the changes in days",
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options["days"])
+        print(f"🤖 {deleted} changes older than {options['days']} days pruned!")
@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count
+
+from kablo.network.geometry import (
+    cable_geoms,
+    tube_geoms,
+    update_cable_geoms_sql,
+    update_tube_geoms_sql,
+)
+from kablo.network.models import Cable, Tube
+
+
+def _init_worker():
+    # the connections inherited from the parent process must not be shared
+    connections.close_all()
+
+
+@transaction.atomic
+def recompute_tubes(tube_ids: list) -> int:
+    counts = dict(
+        Tube.objects.filter(pk__in=tube_ids)
+        .annotate(count=Count("cabletube"))
+        .values_list("id", "count")
+    )
+    if settings.GEOMETRY_ENGINE == "sql":
+        Tube.objects.bulk_update(
+            [Tube(id=tube_id, cable_count=counts[tube_id]) for tube_id in tube_ids],
+            ["cable_count"],
+        )
+        update_tube_geoms_sql(tube_ids)
+    else:
+        geoms = tube_geoms(tube_ids)
+        Tube.objects.bulk_update(
+            [
+                Tube(id=tube_id, geom=geoms.get(tube_id), cable_count=counts[tube_id])
+                for tube_id in tube_ids
+            ],
+            ["geom", "cable_count"],
+        )
+    return len(tube_ids)
+
+
+@transaction.atomic
+def recompute_cables(cable_ids: list) -> int:
+    if settings.GEOMETRY_ENGINE == "sql":
+        update_cable_geoms_sql(cable_ids)
+    else:
+        geoms = cable_geoms(cable_ids)
+        Cable.objects.bulk_update(
+            [Cable(id=cable_id, geom=geoms.get(cable_id)) for cable_id in cable_ids],
+            ["geom"],
+        )
+    return len(cable_ids)
+
+
+class Command(BaseCommand):
+    help = "Recompute the geometry of all the tubes and cables, in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-p",
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes, 1 runs in the current process",
+        )
+        parser.add_argument("-c", "--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        # cables are offset from their tubes: all the tubes are done first
+        self.run(
+            "tubes",
+            recompute_tubes,
+            list(Tube.objects.order_by("id").values_list("id", flat=True)),
+            options,
+        )
+        self.run(
+            "cables",
+            recompute_cables,
+            list(Cable.objects.order_by("id").values_list("id", flat=True)),
+            options,
+        )
+
+    def run(self, name: str, func, ids: list, options: dict):
+        chunk_size = options["chunk_size"]
+        chunks = [ids[i : i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        start = time.perf_counter()
+        done = 0
+
+        def progress(count):
+            nonlocal done
+            done += count
+            elapsed = time.perf_counter() - start
+            print(
+                f"🤖 {done}/{len(ids)} {name} recomputed ({done / elapsed:.0f} {name}/s)"
+            )
+
+        if options["processes"] <= 1:
+            for chunk in chunks:
+                progress(func(chunk))
+        else:
+            # each worker opens its own connection
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            with context.Pool(options["processes"], initializer=_init_worker) as pool:
+                for count in pool.imap_unordered(func, chunks):
+                    progress(count)
+
+        elapsed = time.perf_counter() - start
+        print(f"🤖 {len(ids)} {name} recomputed in {elapsed:.1f}s!")
@@ -0,0 +1,63 @@
+import time
+
+from computedfields.models import update_dependent
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from kablo.network.geometry import (
+    tube_geoms,
+    update_cable_geoms_sql,
+    update_tube_geoms_sql,
+)
+from kablo.network.models import Cable, Tube
+
+
+class Command(BaseCommand):
+    help = "Recompute the geometry of all the tubes with the batch engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-c", "--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--skip-cables",
+            action="store_true",
+            help="Do not update the cables going through the tubes",
+        )
+        parser.add_argument(
+            "-e",
+            "--engine",
+            choices=["python", "sql"],
+            default=settings.GEOMETRY_ENGINE,
+            help="python: vectorized shapely, sql: set-based UPDATE computed by PostGIS",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        tube_ids = list(Tube.objects.order_by("id").values_list("id", flat=True))
+        start = time.perf_counter()
+
+        for offset in range(0, len(tube_ids), chunk_size):
+            chunk = tube_ids[offset : offset + chunk_size]
+            if options["engine"] == "sql":
+                update_tube_geoms_sql(chunk)
+                if not options["skip_cables"]:
+                    update_cable_geoms_sql(
+                        Cable.objects.filter(cabletube__tube__in=chunk).values("pk")
+                    )
+            else:
+                geoms = tube_geoms(chunk)
+                Tube.objects.bulk_update(
+                    [Tube(id=tube_id, geom=geoms.get(tube_id)) for tube_id in chunk],
+                    ["geom"],
+                )
+                if not options["skip_cables"]:
+                    update_dependent(
+                        Tube.objects.filter(pk__in=chunk), update_fields=["geom"]
+                    )
+            print(f"🤖 {offset + len(chunk)}/{len(tube_ids)} tubes recomputed")
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"🤖 {len(tube_ids)} tubes recomputed in {elapsed:.1f}s ({options['engine']} engine)"
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from kablo.network.recompute import process_queue
+
+
+class Command(BaseCommand):
+    help = "Recompute the geometries queued by the edits (RECOMPUTE_MODE=async)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-b", "--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once the queue is empty"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1,
+            help="Seconds to wait before polling an empty queue",
+        )
+
+    def handle(self, *args, **options):
+        print("🤖 recompute worker started")
+        while True:
+            start = time.perf_counter()
+            processed = process_queue(batch_size=options["batch_size"])
+            if processed:
+                elapsed = time.perf_counter() - start
+                print(f"🤖 {processed} objects recomputed in {elapsed:.1f}s")
+                continue
+            if options["once"]:
+                print("🤖 queue is empty!")
+                return
+            time.sleep(options["interval"])
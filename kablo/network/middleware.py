@@ -0,0 +1,30 @@
+import logging
+
+from kablo.network.cache import offset_part_cache
+from kablo.network.recompute import counting_recomputes, deferred_recompute
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class DeferredRecomputeMiddleware:
+    """
+    Recompute the tube and cable geometries once per OAPIF write request,
+    instead of once per saved object, and log how many were recomputed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in WRITE_METHODS and request.path_info.startswith("/oapif/"):
+            with counting_recomputes() as recomputes, deferred_recompute():
+                response = self.get_response(request)
+            logger.info(
+                f"{request.method} {request.path_info}: "
+                f"{recomputes['Cable']} cable and {recomputes['Tube']} tube recomputes"
+            )
+            logger.debug(f"offset part cache: {offset_part_cache.info()}")
+            return response
+        return self.get_response(request)
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# kablo.network.models.SECTION_ORDER_INDEX_STEP at the time of the migration
+SECTION_ORDER_INDEX_STEP = 1024
+
+
+def renumber_sql(step):
+    # two passes through negative values to respect the (track, order_index) constraint
+    return [
+        f"""
+        UPDATE network_section AS section
+        SET order_index = -1 - numbered.order_index
+        FROM (
+            SELECT id, (ROW_NUMBER() OVER (PARTITION BY track_id ORDER BY order_index) - 1) * {step} AS order_index
+            FROM network_section
+        ) AS numbered
+        WHERE section.id = numbered.id;
+        """,
+        "UPDATE network_section SET order_index = -1 - order_index WHERE order_index < 0;",
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=renumber_sql(SECTION_ORDER_INDEX_STEP),
+            reverse_sql=renumber_sql(1),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-17 09:12
+
+import migrate_sql.operations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+        ("network", "0002_section_order_index_gaps"),
+    ]
+
+    operations = [
+        migrate_sql.operations.CreateSQL(
+            name="trim_line_ends",
+            sql="\n        CREATE OR REPLACE FUNCTION trim_line_ends(line geometry)\n           RETURNS geometry\n           LANGUAGE plpgsql\n           IMMUTABLE\n          AS\n        $$\n        declare\n           trimmed geometry;\n           line_length float;\n        begin\n            line_length := ST_Length(line);\n            -- first vertex: moved along the line if far enough from the last one, removed otherwise\n            IF ST_Distance(ST_StartPoint(line), ST_EndPoint(line)) > 1 THEN\n                trimmed := ST_SetPoint(line, 0, ST_LineInterpolatePoint(line, LEAST(0.5 / line_length, 1)));\n            ELSE\n                trimmed := ST_RemovePoint(line, 0);\n            END IF;\n            -- last vertex: moved along the line if far enough from the previous one, removed otherwise\n            IF ST_Distance(ST_EndPoint(trimmed), ST_PointN(trimmed, -2)) > 1 THEN\n                trimmed := ST_SetPoint(trimmed, -1, ST_LineInterpolatePoint(line, GREATEST(1 - 0.5 / line_length, 0)));\n            ELSE\n                trimmed := ST_RemovePoint(trimmed, ST_NPoints(trimmed) - 1);\n            END IF;\n            return trimmed;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION trim_line_ends(line geometry);\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="tube_geom",
+            sql="\n        CREATE OR REPLACE FUNCTION tube_geom(tube_id uuid)\n           RETURNS geometry\n           LANGUAGE sql\n           STABLE\n          AS\n        $$\n            SELECT ST_LineMerge(ST_Collect(parts.geom ORDER BY parts.order_index))\n            FROM (\n                SELECT\n                    tube_section.order_index,\n                    ST_AddPoint(\n                        ST_AddPoint(\n                            project_z_on_line(\n                                ST_Force2D(ST_OffsetCurve(trimmed.geom, tube_section.offset_x / 1000.0, 'join=mitre')),\n                                trimmed.geom,\n                                tube_section.offset_z / 1000.0\n                            ),\n                            ST_Translate(ST_StartPoint(section.geom), 0, 0, tube_section.offset_z / 1000.0),\n                            0\n                        ),\n                        ST_Translate(ST_EndPoint(section.geom), 0, 0, tube_section.offset_z / 1000.0)\n                    ) AS geom\n                FROM network_tubesection tube_section\n                    INNER JOIN network_section section ON section.id = tube_section.section_id\n                    CROSS JOIN LATERAL (SELECT trim_line_ends(section.geom) AS geom) trimmed\n                WHERE tube_section.tube_id = $1\n            ) parts;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION tube_geom(tube_id uuid);\n        ",
+            dependencies=[("core", "project_z_on_line"), ("network", "trim_line_ends")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="cable_geom",
+            sql="\n        CREATE OR REPLACE FUNCTION cable_geom(cable_id uuid)\n           RETURNS geometry\n           LANGUAGE sql\n           STABLE\n          AS\n        $$\n            SELECT ST_LineMerge(ST_Collect(parts.geom ORDER BY parts.order_index))\n            FROM (\n                SELECT\n                    cable_tube.order_index,\n                    ST_AddPoint(\n                        ST_AddPoint(\n                            ST_Force2D(ST_OffsetCurve(\n                                trim_line_ends(tube.geom),\n                                (cable_tube.display_offset - (tube.cable_count - 1) / 2.0) * 0.1,\n                                'join=bevel'\n                            )),\n                            ST_Force2D(ST_StartPoint(tube.geom)),\n                            0\n                        ),\n                        ST_Force2D(ST_EndPoint(tube.geom))\n                    ) AS geom\n                FROM network_cabletube cable_tube\n                    INNER JOIN network_tube tube ON tube.id = cable_tube.tube_id\n                WHERE cable_tube.cable_id = $1 AND tube.geom IS NOT NULL\n            ) parts;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION cable_geom(cable_id uuid);\n        ",
+            dependencies=[("network", "trim_line_ends")],
+        ),
+    ]
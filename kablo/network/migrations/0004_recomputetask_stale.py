@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0003_tube_cable_geom_functions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecomputeTask",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("model", models.CharField(max_length=20)),
+                ("object_id", models.UUIDField()),
+            ],
+            options={
+                "unique_together": {("model", "object_id")},
+            },
+        ),
+        migrations.AddField(
+            model_name="cable",
+            name="stale",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                help_text="The geometry is waiting for the recompute worker",
+            ),
+        ),
+        migrations.AddField(
+            model_name="tube",
+            name="stale",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                help_text="The geometry is waiting for the recompute worker",
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.0.3 on 2026-10-17 11:20
+
+import django.contrib.gis.db.models.fields
+import migrate_sql.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0004_recomputetask_stale"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TileCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("layer", models.CharField(max_length=20)),
+                ("z", models.IntegerField()),
+                ("x", models.IntegerField()),
+                ("y", models.IntegerField()),
+                ("tile", models.BinaryField()),
+                (
+                    "bbox",
+                    django.contrib.gis.db.models.fields.PolygonField(srid=2056),
+                ),
+            ],
+            options={
+                "unique_together": {("layer", "z", "x", "y")},
+            },
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="invalidate_tile_cache",
+            sql="\n        CREATE OR REPLACE FUNCTION invalidate_tile_cache()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            -- TG_ARGV[0] is the tile layer of the table\n            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.geom IS NOT NULL THEN\n                DELETE FROM network_tilecache WHERE layer = TG_ARGV[0] AND bbox && OLD.geom;\n            END IF;\n            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.geom IS NOT NULL THEN\n                DELETE FROM network_tilecache WHERE layer = TG_ARGV[0] AND bbox && NEW.geom;\n            END IF;\n            return NULL;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION invalidate_tile_cache();\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="tile_cache_track_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_track\n            AFTER INSERT OR UPDATE OR DELETE ON network_track\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('track');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_track ON network_track;\n        ",
+            dependencies=[("network", "invalidate_tile_cache")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="tile_cache_section_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_section\n            AFTER INSERT OR UPDATE OR DELETE ON network_section\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('section');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_section ON network_section;\n        ",
+            dependencies=[("network", "invalidate_tile_cache")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="tile_cache_tube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_tube\n            AFTER INSERT OR UPDATE OR DELETE ON network_tube\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('tube');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_tube ON network_tube;\n        ",
+            dependencies=[("network", "invalidate_tile_cache")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="tile_cache_cable_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_cable\n            AFTER INSERT OR UPDATE OR DELETE ON network_cable\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('cable');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_cable ON network_cable;\n        ",
+            dependencies=[("network", "invalidate_tile_cache")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="tile_cache_station_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_station\n            AFTER INSERT OR UPDATE OR DELETE ON network_station\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('station');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_station ON network_station;\n        ",
+            dependencies=[("network", "invalidate_tile_cache")],
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.0.3 on 2026-10-17 13:05
+
+import migrate_sql.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0005_tilecache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Watermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("table_name", models.CharField(max_length=63)),
+                ("shard", models.IntegerField()),
+                ("updated_at", models.DateTimeField()),
+                ("deletions", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("table_name", "shard")},
+            },
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="update_watermark",
+            sql="\n        CREATE OR REPLACE FUNCTION update_watermark()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            INSERT INTO network_watermark (table_name, shard, updated_at, deletions)\n            VALUES (\n                TG_TABLE_NAME,\n                pg_backend_pid() % 16,\n                clock_timestamp(),\n                CASE WHEN TG_OP IN ('DELETE', 'TRUNCATE') THEN 1 ELSE 0 END\n            )\n            ON CONFLICT (table_name, shard) DO UPDATE SET\n                updated_at = EXCLUDED.updated_at,\n                deletions = network_watermark.deletions + EXCLUDED.deletions;\n            return NULL;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION update_watermark();\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="watermark_track_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER watermark_track\n            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_track\n            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();\n        ",
+            reverse_sql="\n            DROP TRIGGER watermark_track ON network_track;\n        ",
+            dependencies=[("network", "update_watermark")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="watermark_section_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER watermark_section\n            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_section\n            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();\n        ",
+            reverse_sql="\n            DROP TRIGGER watermark_section ON network_section;\n        ",
+            dependencies=[("network", "update_watermark")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="watermark_tube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER watermark_tube\n            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_tube\n            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();\n        ",
+            reverse_sql="\n            DROP TRIGGER watermark_tube ON network_tube;\n        ",
+            dependencies=[("network", "update_watermark")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="watermark_cable_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER watermark_cable\n            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_cable\n            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();\n        ",
+            reverse_sql="\n            DROP TRIGGER watermark_cable ON network_cable;\n        ",
+            dependencies=[("network", "update_watermark")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="watermark_tubesection_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER watermark_tubesection\n            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_tubesection\n            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();\n        ",
+            reverse_sql="\n            DROP TRIGGER watermark_tubesection ON network_tubesection;\n        ",
+            dependencies=[("network", "update_watermark")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="watermark_cabletube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER watermark_cabletube\n            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_cabletube\n            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();\n        ",
+            reverse_sql="\n            DROP TRIGGER watermark_cabletube ON network_cabletube;\n        ",
+            dependencies=[("network", "update_watermark")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="watermark_station_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER watermark_station\n            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_station\n            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();\n        ",
+            reverse_sql="\n            DROP TRIGGER watermark_station ON network_station;\n        ",
+            dependencies=[("network", "update_watermark")],
+        ),
+    ]
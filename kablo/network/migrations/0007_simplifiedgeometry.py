@@ -0,0 +1,77 @@
+# Generated by Django 5.0.3 on 2026-10-17 14:10
+
+import django.contrib.gis.db.models.fields
+import migrate_sql.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0006_watermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimplifiedGeometry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=20)),
+                ("object_id", models.UUIDField()),
+                ("level", models.SmallIntegerField()),
+                (
+                    "geom",
+                    django.contrib.gis.db.models.fields.GeometryField(dim=3, srid=2056),
+                ),
+            ],
+            options={
+                "unique_together": {("model", "object_id", "level")},
+            },
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="update_simplified_geometries",
+            sql="\n        CREATE OR REPLACE FUNCTION update_simplified_geometries()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            -- TG_ARGV[0] is the model of the table\n            IF TG_OP = 'UPDATE' AND NEW.geom IS NOT DISTINCT FROM OLD.geom THEN\n                return NULL;\n            END IF;\n            IF TG_OP IN ('UPDATE', 'DELETE') THEN\n                DELETE FROM network_simplifiedgeometry WHERE model = TG_ARGV[0] AND object_id = OLD.id;\n            END IF;\n            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.geom IS NOT NULL THEN\n                INSERT INTO network_simplifiedgeometry (model, object_id, level, geom)\n                SELECT TG_ARGV[0], NEW.id, lod.level, ST_SimplifyPreserveTopology(NEW.geom, lod.tolerance)\n                FROM (VALUES (1, 0.5), (2, 2.5), (3, 12.5)) AS lod(level, tolerance);\n            END IF;\n            return NULL;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION update_simplified_geometries();\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="simplified_geometries_track_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER simplified_geometries_track\n            AFTER INSERT OR UPDATE OF geom OR DELETE ON network_track\n            FOR EACH ROW EXECUTE FUNCTION update_simplified_geometries('Track');\n        ",
+            reverse_sql="\n            DROP TRIGGER simplified_geometries_track ON network_track;\n        ",
+            dependencies=[("network", "update_simplified_geometries")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="simplified_geometries_tube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER simplified_geometries_tube\n            AFTER INSERT OR UPDATE OF geom OR DELETE ON network_tube\n            FOR EACH ROW EXECUTE FUNCTION update_simplified_geometries('Tube');\n        ",
+            reverse_sql="\n            DROP TRIGGER simplified_geometries_tube ON network_tube;\n        ",
+            dependencies=[("network", "update_simplified_geometries")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="simplified_geometries_cable_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER simplified_geometries_cable\n            AFTER INSERT OR UPDATE OF geom OR DELETE ON network_cable\n            FOR EACH ROW EXECUTE FUNCTION update_simplified_geometries('Cable');\n        ",
+            reverse_sql="\n            DROP TRIGGER simplified_geometries_cable ON network_cable;\n        ",
+            dependencies=[("network", "update_simplified_geometries")],
+        ),
+        # simplified geometries of the existing features
+        migrations.RunSQL(
+            """
+            INSERT INTO network_simplifiedgeometry (model, object_id, level, geom)
+            SELECT features.model, features.id, lod.level, ST_SimplifyPreserveTopology(features.geom, lod.tolerance)
+            FROM (
+                SELECT 'Track' AS model, id, geom FROM network_track
+                UNION ALL SELECT 'Tube', id, geom FROM network_tube
+                UNION ALL SELECT 'Cable', id, geom FROM network_cable
+            ) AS features,
+            (VALUES (1, 0.5), (2, 2.5), (3, 12.5)) AS lod(level, tolerance)
+            WHERE features.geom IS NOT NULL;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
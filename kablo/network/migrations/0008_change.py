@@ -0,0 +1,87 @@
+# Generated by Django 5.0.3 on 2026-10-17 15:02
+
+import migrate_sql.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0007_simplifiedgeometry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("xid", models.BigIntegerField()),
+                ("model", models.CharField(max_length=20)),
+                ("object_id", models.UUIDField()),
+                ("operation", models.CharField(max_length=1)),
+                ("changed_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["xid", "id"], name="network_cha_xid_6ace7e_idx"
+                    )
+                ],
+            },
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="record_change",
+            sql="\n        CREATE OR REPLACE FUNCTION record_change()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            -- TG_ARGV[0] is the model of the table\n            INSERT INTO network_change (xid, model, object_id, operation, changed_at)\n            VALUES (\n                pg_current_xact_id()::text::bigint,\n                TG_ARGV[0],\n                CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,\n                left(TG_OP, 1),\n                clock_timestamp()\n            );\n            return NULL;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION record_change();\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="change_track_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER change_track\n            AFTER INSERT OR UPDATE OR DELETE ON network_track\n            FOR EACH ROW EXECUTE FUNCTION record_change('Track');\n        ",
+            reverse_sql="\n            DROP TRIGGER change_track ON network_track;\n        ",
+            dependencies=[("network", "record_change")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="change_section_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER change_section\n            AFTER INSERT OR UPDATE OR DELETE ON network_section\n            FOR EACH ROW EXECUTE FUNCTION record_change('Section');\n        ",
+            reverse_sql="\n            DROP TRIGGER change_section ON network_section;\n        ",
+            dependencies=[("network", "record_change")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="change_tube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER change_tube\n            AFTER INSERT OR UPDATE OR DELETE ON network_tube\n            FOR EACH ROW EXECUTE FUNCTION record_change('Tube');\n        ",
+            reverse_sql="\n            DROP TRIGGER change_tube ON network_tube;\n        ",
+            dependencies=[("network", "record_change")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="change_tubesection_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER change_tubesection\n            AFTER INSERT OR UPDATE OR DELETE ON network_tubesection\n            FOR EACH ROW EXECUTE FUNCTION record_change('TubeSection');\n        ",
+            reverse_sql="\n            DROP TRIGGER change_tubesection ON network_tubesection;\n        ",
+            dependencies=[("network", "record_change")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="change_cable_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER change_cable\n            AFTER INSERT OR UPDATE OR DELETE ON network_cable\n            FOR EACH ROW EXECUTE FUNCTION record_change('Cable');\n        ",
+            reverse_sql="\n            DROP TRIGGER change_cable ON network_cable;\n        ",
+            dependencies=[("network", "record_change")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="change_cabletube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER change_cabletube\n            AFTER INSERT OR UPDATE OR DELETE ON network_cabletube\n            FOR EACH ROW EXECUTE FUNCTION record_change('CableTube');\n        ",
+            reverse_sql="\n            DROP TRIGGER change_cabletube ON network_cabletube;\n        ",
+            dependencies=[("network", "record_change")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="change_station_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER change_station\n            AFTER INSERT OR UPDATE OR DELETE ON network_station\n            FOR EACH ROW EXECUTE FUNCTION record_change('Station');\n        ",
+            reverse_sql="\n            DROP TRIGGER change_station ON network_station;\n        ",
+            dependencies=[("network", "record_change")],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-17 16:20
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0008_change"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("format", models.CharField(max_length=10)),
+                ("status", models.CharField(default="pending", max_length=10)),
+                (
+                    "progress",
+                    models.IntegerField(default=0, help_text="Exported features in %"),
+                ),
+                ("watermark", models.CharField(max_length=32)),
+                ("file", models.CharField(blank=True, max_length=255)),
+                ("size", models.BigIntegerField(null=True)),
+                ("error", models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.3 on 2026-10-17 17:05
+
+import migrate_sql.operations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0009_exportjob"),
+    ]
+
+    operations = [
+        migrate_sql.operations.CreateSQL(
+            name="snap_geom_to_grid",
+            sql="\n        CREATE OR REPLACE FUNCTION snap_geom_to_grid()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        declare\n           grid_size float;\n           snapped geometry;\n        begin\n            -- set on the connections of kablo when GEOMETRY_GRID_SIZE is configured\n            grid_size := NULLIF(current_setting('kablo.geometry_grid', true), '')::float;\n            IF grid_size IS NULL OR NEW.geom IS NULL THEN\n                return NEW;\n            END IF;\n            snapped := ST_SnapToGrid(NEW.geom, ST_MakePoint(0, 0, 0), grid_size, grid_size, grid_size, 0);\n            -- geometries collapsing on the grid are kept as is\n            IF snapped IS NOT NULL AND NOT ST_IsEmpty(snapped) THEN\n                NEW.geom := snapped;\n            END IF;\n            return NEW;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION snap_geom_to_grid();\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="snap_geom_track_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER snap_geom_track\n            BEFORE INSERT OR UPDATE OF geom ON network_track\n            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();\n        ",
+            reverse_sql="\n            DROP TRIGGER snap_geom_track ON network_track;\n        ",
+            dependencies=[("network", "snap_geom_to_grid")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="snap_geom_section_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER snap_geom_section\n            BEFORE INSERT OR UPDATE OF geom ON network_section\n            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();\n        ",
+            reverse_sql="\n            DROP TRIGGER snap_geom_section ON network_section;\n        ",
+            dependencies=[("network", "snap_geom_to_grid")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="snap_geom_tube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER snap_geom_tube\n            BEFORE INSERT OR UPDATE OF geom ON network_tube\n            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();\n        ",
+            reverse_sql="\n            DROP TRIGGER snap_geom_tube ON network_tube;\n        ",
+            dependencies=[("network", "snap_geom_to_grid")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="snap_geom_cable_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER snap_geom_cable\n            BEFORE INSERT OR UPDATE OF geom ON network_cable\n            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();\n        ",
+            reverse_sql="\n            DROP TRIGGER snap_geom_cable ON network_cable;\n        ",
+            dependencies=[("network", "snap_geom_to_grid")],
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="snap_geom_station_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER snap_geom_station\n            BEFORE INSERT OR UPDATE OF geom ON network_station\n            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();\n        ",
+            reverse_sql="\n            DROP TRIGGER snap_geom_station ON network_station;\n        ",
+            dependencies=[("network", "snap_geom_to_grid")],
+        ),
+    ]
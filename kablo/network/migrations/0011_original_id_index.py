@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0010_snap_geom_to_grid"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cable",
+            name="original_id",
+            field=models.TextField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="station",
+            name="original_id",
+            field=models.TextField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="track",
+            name="original_id",
+            field=models.TextField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="tube",
+            name="original_id",
+            field=models.TextField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0011_original_id_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cable",
+            name="deleted_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="cable",
+            name="source_hash",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name="station",
+            name="deleted_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="station",
+            name="source_hash",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="deleted_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="source_hash",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name="tube",
+            name="deleted_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="tube",
+            name="source_hash",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+    ]
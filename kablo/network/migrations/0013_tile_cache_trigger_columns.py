@@ -0,0 +1,64 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:12
+
+import migrate_sql.operations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0012_soft_delete_source_hash"),
+    ]
+
+    operations = [
+        migrate_sql.operations.ReverseAlterSQL(
+            name="tile_cache_track_trigger",
+            sql="\n            DROP TRIGGER tile_cache_track ON network_track;\n        ",
+            reverse_sql="\n        CREATE OR REPLACE TRIGGER tile_cache_track\n            AFTER INSERT OR UPDATE OR DELETE ON network_track\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('track');\n        ",
+        ),
+        migrate_sql.operations.ReverseAlterSQL(
+            name="tile_cache_section_trigger",
+            sql="\n            DROP TRIGGER tile_cache_section ON network_section;\n        ",
+            reverse_sql="\n        CREATE OR REPLACE TRIGGER tile_cache_section\n            AFTER INSERT OR UPDATE OR DELETE ON network_section\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('section');\n        ",
+        ),
+        migrate_sql.operations.ReverseAlterSQL(
+            name="tile_cache_tube_trigger",
+            sql="\n            DROP TRIGGER tile_cache_tube ON network_tube;\n        ",
+            reverse_sql="\n        CREATE OR REPLACE TRIGGER tile_cache_tube\n            AFTER INSERT OR UPDATE OR DELETE ON network_tube\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('tube');\n        ",
+        ),
+        migrate_sql.operations.ReverseAlterSQL(
+            name="tile_cache_cable_trigger",
+            sql="\n            DROP TRIGGER tile_cache_cable ON network_cable;\n        ",
+            reverse_sql="\n        CREATE OR REPLACE TRIGGER tile_cache_cable\n            AFTER INSERT OR UPDATE OR DELETE ON network_cable\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('cable');\n        ",
+        ),
+        migrate_sql.operations.ReverseAlterSQL(
+            name="tile_cache_station_trigger",
+            sql="\n            DROP TRIGGER tile_cache_station ON network_station;\n        ",
+            reverse_sql="\n        CREATE OR REPLACE TRIGGER tile_cache_station\n            AFTER INSERT OR UPDATE OR DELETE ON network_station\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('station');\n        ",
+        ),
+        migrate_sql.operations.AlterSQL(
+            name="tile_cache_track_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_track\n            AFTER INSERT OR UPDATE OF geom, deleted_at OR DELETE ON network_track\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('track');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_track ON network_track;\n        ",
+        ),
+        migrate_sql.operations.AlterSQL(
+            name="tile_cache_section_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_section\n            AFTER INSERT OR UPDATE OF geom, track_id, order_index OR DELETE ON network_section\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('section');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_section ON network_section;\n        ",
+        ),
+        migrate_sql.operations.AlterSQL(
+            name="tile_cache_tube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_tube\n            AFTER INSERT OR UPDATE OF geom, diameter, cable_count, deleted_at OR DELETE ON network_tube\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('tube');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_tube ON network_tube;\n        ",
+        ),
+        migrate_sql.operations.AlterSQL(
+            name="tile_cache_cable_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_cable\n            AFTER INSERT OR UPDATE OF geom, identifier, deleted_at OR DELETE ON network_cable\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('cable');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_cable ON network_cable;\n        ",
+        ),
+        migrate_sql.operations.AlterSQL(
+            name="tile_cache_station_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_station\n            AFTER INSERT OR UPDATE OF geom, label, deleted_at OR DELETE ON network_station\n            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('station');\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_station ON network_station;\n        ",
+        ),
+    ]
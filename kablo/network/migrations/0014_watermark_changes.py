@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:40
+
+import migrate_sql.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0013_tile_cache_trigger_columns"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="watermark",
+            name="changes",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrate_sql.operations.AlterSQL(
+            name="update_watermark",
+            sql="\n        CREATE OR REPLACE FUNCTION update_watermark()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            INSERT INTO network_watermark (table_name, shard, updated_at, deletions, changes)\n            VALUES (\n                TG_TABLE_NAME,\n                pg_backend_pid() % 16,\n                clock_timestamp(),\n                CASE WHEN TG_OP IN ('DELETE', 'TRUNCATE') THEN 1 ELSE 0 END,\n                1\n            )\n            ON CONFLICT (table_name, shard) DO UPDATE SET\n                updated_at = EXCLUDED.updated_at,\n                deletions = network_watermark.deletions + EXCLUDED.deletions,\n                changes = network_watermark.changes + 1;\n            return NULL;\n        end;\n        $$;\n        ",
+            reverse_sql="\n        CREATE OR REPLACE FUNCTION update_watermark()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            INSERT INTO network_watermark (table_name, shard, updated_at, deletions)\n            VALUES (\n                TG_TABLE_NAME,\n                pg_backend_pid() % 16,\n                clock_timestamp(),\n                CASE WHEN TG_OP IN ('DELETE', 'TRUNCATE') THEN 1 ELSE 0 END\n            )\n            ON CONFLICT (table_name, shard) DO UPDATE SET\n                updated_at = EXCLUDED.updated_at,\n                deletions = network_watermark.deletions + EXCLUDED.deletions;\n            return NULL;\n        end;\n        $$;\n        ",
+            state_reverse_sql="\n            DROP FUNCTION update_watermark();\n        ",
+        ),
+    ]
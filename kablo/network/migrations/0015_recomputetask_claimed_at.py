@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0014_watermark_changes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recomputetask",
+            name="claimed_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
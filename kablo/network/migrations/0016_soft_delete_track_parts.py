@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-19 10:03
+
+import migrate_sql.operations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0015_recomputetask_claimed_at"),
+    ]
+
+    operations = [
+        migrate_sql.operations.CreateSQL(
+            name="soft_delete_track_parts",
+            sql="\n        CREATE OR REPLACE FUNCTION soft_delete_track_parts()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            -- the sections of a track soft-deleted or restored by the import synchronization\n            -- are hidden or shown with it: they (and their tube sections) are recorded\n            -- as changed, and their tiles are invalidated\n            UPDATE network_section SET updated_at = clock_timestamp() WHERE track_id = NEW.id;\n            UPDATE network_tubesection SET updated_at = clock_timestamp()\n            WHERE section_id IN (SELECT id FROM network_section WHERE track_id = NEW.id);\n            DELETE FROM network_tilecache\n            WHERE layer = 'section' AND bbox && (\n                SELECT ST_SetSRID(ST_Extent(geom), 2056) FROM network_section WHERE track_id = NEW.id\n            );\n            return NULL;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION soft_delete_track_parts();\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="soft_delete_track_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER soft_delete_track\n            AFTER UPDATE OF deleted_at ON network_track\n            FOR EACH ROW WHEN (OLD.deleted_at IS DISTINCT FROM NEW.deleted_at)\n            EXECUTE FUNCTION soft_delete_track_parts();\n        ",
+            reverse_sql="\n            DROP TRIGGER soft_delete_track ON network_track;\n        ",
+            dependencies=[("network", "soft_delete_track_parts")],
+        ),
+    ]
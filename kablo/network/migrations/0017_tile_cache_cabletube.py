@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-19 14:20
+
+import migrate_sql.operations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0016_soft_delete_track_parts"),
+    ]
+
+    operations = [
+        migrate_sql.operations.CreateSQL(
+            name="invalidate_cabletube_tiles",
+            sql="\n        CREATE OR REPLACE FUNCTION invalidate_cabletube_tiles()\n           RETURNS trigger\n           LANGUAGE plpgsql\n          AS\n        $$\n        begin\n            -- the cables of the tubes are drawn in the tube tiles, over the tube geometry\n            IF TG_OP IN ('UPDATE', 'DELETE') THEN\n                DELETE FROM network_tilecache WHERE layer = 'tube'\n                AND bbox && (SELECT geom FROM network_tube WHERE id = OLD.tube_id);\n            END IF;\n            IF TG_OP IN ('INSERT', 'UPDATE') THEN\n                DELETE FROM network_tilecache WHERE layer = 'tube'\n                AND bbox && (SELECT geom FROM network_tube WHERE id = NEW.tube_id);\n            END IF;\n            return NULL;\n        end;\n        $$;\n        ",
+            reverse_sql="\n            DROP FUNCTION invalidate_cabletube_tiles();\n        ",
+        ),
+        migrate_sql.operations.CreateSQL(
+            name="tile_cache_cabletube_trigger",
+            sql="\n        CREATE OR REPLACE TRIGGER tile_cache_cabletube\n            AFTER INSERT OR UPDATE OF cable_id, tube_id OR DELETE ON network_cabletube\n            FOR EACH ROW EXECUTE FUNCTION invalidate_cabletube_tiles();\n        ",
+            reverse_sql="\n            DROP TRIGGER tile_cache_cabletube ON network_cabletube;\n        ",
+            dependencies=[("network", "invalidate_cabletube_tiles")],
+        ),
+    ]
@@ -2,32 +2,90 @@ import logging
 import uuid
 
 from computedfields.models import ComputedFieldsModel, computed
+from django.conf import settings
 from django.contrib.gis.db import models
-from django.contrib.gis.db.models.aggregates import Union
 from django.contrib.gis.geos import LineString as GeosLineString
-from django.contrib.postgres.aggregates import ArrayAgg
 from django.db import transaction
-from django.db.models import Max
+from django.db.models import Max, Q
 from django.db.models.functions import Coalesce
 from django_oapif.decorators import register_oapif_viewset
-from shapely import (
-    LineString,
-    MultiLineString,
-    Point,
-    distance,
-    force_2d,
-    get_srid,
-    line_merge,
-    offset_curve,
-    set_srid,
+from shapely import MultiLineString, line_merge, set_srid
+
+from kablo.core.utils import shapely2geodjango
+from kablo.network.functions import CableGeom, TubeGeom
+from kablo.network.geometry import (
+    cable_offset,
+    cached_offset_cable_part,
+    cached_offset_tube_part,
 )
-
-from kablo.core.functions import Intersects, SplitLine
-from kablo.core.utils import geodjango2shapely, shapely2geodjango
+from kablo.network.recompute import count_recompute, defer_recompute
 from kablo.valuelist.models import CableTensionType, StatusType, TubeCableProtectionType
 
 logger = logging.getLogger(__name__)
 
+# sections are numbered with gaps, so split parts can be inserted without
+# renumbering the following sections (see kablo.network.split)
+SECTION_ORDER_INDEX_STEP = 1024
+
+
+class ImportedManager(models.Manager):
+    """
+    Features of the imported models, without the ones soft-deleted by the
+    synchronization of the imports (see kablo.network.importer.sync_features)
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+# imported features whose soft deletion hides the features of the model with them
+SOFT_DELETED_PARENTS = {
+    "section": ["track"],
+    "tubesection": ["tube", "section__track"],
+    "cabletube": ["cable", "tube"],
+}
+
+
+def not_soft_deleted(model) -> Q:
+    """
+    Filter of the features which are not part of a feature soft-deleted by the
+    synchronization of the imports (the soft-deleted ones are hidden by ImportedManager)
+    """
+    return Q(
+        **{
+            f"{parent}__deleted_at__isnull": True
+            for parent in SOFT_DELETED_PARENTS.get(model._meta.model_name, [])
+        }
+    )
+
+
+# bookkeeping columns of the imports and of the recomputation, not published
+UNPUBLISHED_FIELDS = ("fake_id", "stale", "source_hash", "deleted_at")
+
+
+def published_fields(model) -> list:
+    """
+    Concrete fields of the model published by its OAPIF collection, the streamed
+    items and the change feed (see kablo.api.views and kablo.network.changes)
+    """
+    return [
+        field
+        for field in model._meta.concrete_fields
+        if field.name not in UNPUBLISHED_FIELDS
+    ]
+
+
+def register_published_viewset(**kwargs):
+    """register_oapif_viewset, serializing the published fields only"""
+
+    def inner(model):
+        fields = [field.name for field in published_fields(model)]
+        return register_oapif_viewset(
+            custom_serializer_attrs={"fields": fields}, **kwargs
+        )(model)
+
+    return inner
+
 
 class NetworkNode(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -36,80 +94,47 @@ class NetworkNode(models.Model):
     geom = models.PointField(srid=2056, dim=3)
 
 
-@register_oapif_viewset(crs=2056)
+@register_published_viewset(crs=2056)
 class Track(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True, editable=False)
-    original_id = models.TextField(null=True, editable=True)
+    original_id = models.TextField(null=True, editable=True, db_index=True)
+    # hash of the source feature, and removal from the source (soft-deleted)
+    source_hash = models.CharField(max_length=32, null=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, editable=False)
     geom = models.MultiLineStringField(srid=2056, dim=3)
 
+    objects = ImportedManager()
+    all_objects = models.Manager()
+
     @transaction.atomic
     def save(self, **kwargs):
         # calling the super method causes the state flags to change, so save the original value in advance
         is_adding = self._state.adding
         super().save(**kwargs)
         if is_adding:
-            order_index = 0
-            sections = []
-
-            for part_geom in self.geom:
-                section = Section(
-                    geom=part_geom,
-                    track=self,
-                    order_index=order_index,
-                )
-                order_index += 1
-                sections.append(section)
-
-            Section.objects.bulk_create(sections)
+            Section.objects.bulk_create(self.build_sections())
+
+    def build_sections(self) -> list:
+        """
+        Sections of a new track, one per part of its geometry (not saved)
+        """
+        return [
+            Section(
+                geom=part_geom,
+                track=self,
+                order_index=index * SECTION_ORDER_INDEX_STEP,
+            )
+            for index, part_geom in enumerate(self.geom)
+        ]
 
-    @transaction.atomic
     def split(self, split_line: GeosLineString):
-        has_split = False
-        order_index = 0
-        sections_qs = (
-            Section.objects.filter(track=self)
-            .annotate(
-                splitted_geom=models.Case(
-                    models.When(
-                        models.Q(Intersects("geom", split_line)),
-                        then=SplitLine("geom", split_line),
-                    ),
-                    output_field=models.GeometryCollectionField(),
-                ),
-            )
-            .order_by("order_index")
-        )
+        from kablo.network.split import split_tracks
 
-        for section in sections_qs:
-            if section.splitted_geom:
-                has_split = True
-                for split_part_idx, split_part in enumerate(section.splitted_geom):
-                    if split_part_idx == 0:
-                        section.geom = split_part
-                    else:
-                        order_index += 1
-                        section = section.clone()
-                        section.geom = split_part
-
-                    section.order_index = order_index
-                    section.save()
-            elif has_split:
-                # update the ordering indexes on following sections
-                section.order_index = order_index
-                section.save()
-            else:
-                # no need to update index if no intersection occurred
-                pass
-
-            order_index += 1
-
-        if has_split:
-            self.geom = Section.objects.filter(track=self).aggregate(
-                union=Union("geom")
-            )["union"]
-            self.save()
+        result = split_tracks(split_line, tracks=[self])
+        self.refresh_from_db(fields=["geom", "updated_at"])
+        return result
 
 
 @register_oapif_viewset(crs=2056)
@@ -148,14 +173,22 @@ class Section(models.Model):
         return Section(**new_kwargs)
 
 
-@register_oapif_viewset(crs=2056)
+@register_published_viewset(crs=2056)
 class Cable(ComputedFieldsModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     fake_id = models.UUIDField(default=uuid.uuid4)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True, editable=False)
     identifier = models.TextField(null=True, blank=True)
-    original_id = models.TextField(null=True, editable=True)
+    original_id = models.TextField(null=True, editable=True, db_index=True)
+    # hash of the source feature, and removal from the source (soft-deleted)
+    source_hash = models.CharField(max_length=32, null=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, editable=False)
+    stale = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="The geometry is waiting for the recompute worker",
+    )
     tension = models.ForeignKey(
         CableTensionType,
         null=True,
@@ -167,82 +200,54 @@ class Cable(ComputedFieldsModel):
         on_delete=models.SET_NULL,
     )
 
+    objects = ImportedManager()
+    all_objects = models.Manager()
+
     @computed(
         models.LineStringField(srid=2056, null=True),
         depends=[
             ("cabletube_set", ["order_index", "display_offset"]),
-            ("cabletube_set.tube", ["geom"]),
-            (
-                "cabletube_set.tube.cabletube_set",
-                ["order_index", "display_offset"],
-            ),  # this will recalculate all the cables in the same tube
+            # the offset of the cable is centered on the number of cables in the tube,
+            # the other cables of the tube are recomputed only if their count changes
+            ("cabletube_set.tube", ["geom", "cable_count"]),
         ],
     )
     def geom(self):
         # TODO: check geometry exists + is coherent
         # TODO: check order_index is continuous
-        cable_spacing = 0.1
         planar_offset = 1.1
 
+        if defer_recompute(self):
+            return self.geom
+        count_recompute(self)
+
         logger.debug(f"cable.geom compute for {self.id}")
 
-        agg = self.cabletube_set.order_by("order_index").aggregate(
-            geom=Union("tube__geom"),
-            display_offset=ArrayAgg("display_offset"),
-            cable_count=ArrayAgg("tube__cable_count"),
-            tube_id=ArrayAgg("tube__id"),
+        if settings.GEOMETRY_ENGINE == "sql":
+            return (
+                Cable.objects.filter(pk=self.pk)
+                .values_list(CableGeom("id"), flat=True)
+                .first()
+            )
+
+        rows = (
+            self.cabletube_set.filter(tube__geom__isnull=False)
+            .order_by("order_index")
+            .values_list("tube_id", "tube__geom", "display_offset", "tube__cable_count")
         )
-        geom = agg["geom"]
-        if geom:
-            geom = geodjango2shapely(geom)
-            parts = []
-            if geom.geom_type == "MultiLineString":
-                geoms = geom.geoms
-            else:
-                geoms = [geom]
-
-            for part, display_offset, cable_count, tube_id in zip(
-                geoms, agg["display_offset"], agg["cable_count"], agg["tube_id"]
-            ):
-                offset_x = (display_offset - (cable_count - 1) / 2) * cable_spacing
-                logger.debug(
-                    f"  :: in tube {tube_id} cable_count: {cable_count} display_offset: {display_offset}"
-                )
-                coords = list(part.coords)
-                original_start_point = coords[0][0:2]
-                original_end_point = coords[-1][0:2]
-
-                first_vertex_distance = distance(Point(coords[0]), Point(coords[-1]))
-                if first_vertex_distance > 1:
-                    coords[0] = part.line_interpolate_point(0.5).coords[0]
-                else:
-                    coords.pop(0)
-
-                last_vertex_distance = distance(Point(coords[-1]), Point(coords[-2]))
-                if last_vertex_distance > 1:
-                    coords[-1] = part.line_interpolate_point(-0.5).coords[0]
-                else:
-                    coords.pop(-1)
-
-                # forcing 2d: otherwise if offset=0, the original geometry
-                # is returned as is i.e. with z-dimension
-                offset_part = force_2d(
-                    offset_curve(
-                        LineString(coords), distance=offset_x, join_style="bevel"
-                    )
-                )
-                complete_offset_part = LineString(
-                    [original_start_point]
-                    + list(offset_part.coords)
-                    + [original_end_point]
-                )
-                parts.append(complete_offset_part)
-            geom = line_merge(MultiLineString(parts))
-            geom = shapely2geodjango(geom)
-        return geom
+        parts = []
+        for tube_id, tube_geom, display_offset, cable_count in rows:
+            logger.debug(
+                f"  :: in tube {tube_id} cable_count: {cable_count} display_offset: {display_offset}"
+            )
+            offset_x = cable_offset(display_offset, cable_count)
+            parts.append(cached_offset_cable_part(tube_id, tube_geom, offset_x))
+        if not parts:
+            return None
+        return shapely2geodjango(line_merge(MultiLineString(parts)))
 
 
-@register_oapif_viewset(crs=2056)
+@register_published_viewset(crs=2056)
 class Tube(ComputedFieldsModel):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, blank=True
@@ -250,7 +255,15 @@ class Tube(ComputedFieldsModel):
     fake_id = models.UUIDField(default=uuid.uuid4)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True, editable=False)
-    original_id = models.TextField(null=True, blank=True, editable=True)
+    original_id = models.TextField(null=True, blank=True, editable=True, db_index=True)
+    # hash of the source feature, and removal from the source (soft-deleted)
+    source_hash = models.CharField(max_length=32, null=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, editable=False)
+    stale = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="The geometry is waiting for the recompute worker",
+    )
     status = models.ForeignKey(
         StatusType,
         null=True,
@@ -267,6 +280,9 @@ class Tube(ComputedFieldsModel):
         on_delete=models.SET_NULL,
     )
 
+    objects = ImportedManager()
+    all_objects = models.Manager()
+
     @computed(
         models.IntegerField(default=0, null=False, blank=False),
         depends=[("cabletube_set", [])],
@@ -290,66 +306,32 @@ class Tube(ComputedFieldsModel):
 
         # TODO recalculate cables on change
 
-        agg = self.tubesection_set.order_by("order_index").aggregate(
-            geom=Union("section__geom"),
-            order_index=ArrayAgg("order_index"),
-            offset_x=ArrayAgg("offset_x"),
-            offset_z=ArrayAgg("offset_z"),
+        if defer_recompute(self):
+            return self.geom
+        count_recompute(self)
+
+        if settings.GEOMETRY_ENGINE == "sql":
+            return (
+                Tube.objects.filter(pk=self.pk)
+                .values_list(TubeGeom("id"), flat=True)
+                .first()
+            )
+
+        rows = self.tubesection_set.order_by("order_index").values_list(
+            "section_id", "section__geom", "offset_x", "offset_z"
+        )
+        parts = []
+        srid = None
+        for section_id, section_geom, offset_x, offset_z in rows:
+            srid = section_geom.srid
+            parts.append(
+                cached_offset_tube_part(section_id, section_geom, offset_x, offset_z)
+            )
+        if not parts:
+            return None
+        return shapely2geodjango(
+            set_srid(line_merge(MultiLineString(parts)), srid=srid)
         )
-        geom = agg["geom"]
-        if geom:
-            geom = geodjango2shapely(geom)
-            srid = get_srid(geom)
-            parts = []
-            if geom.geom_type == "MultiLineString":
-                geoms = geom.geoms
-            else:
-                geoms = [geom]
-            for part, offset_x, offset_z in zip(
-                geoms, agg["offset_x"], agg["offset_z"]
-            ):
-                coords = list(part.coords)
-                original_start_point = (
-                    coords[0][0],
-                    coords[0][1],
-                    coords[0][2] + offset_z / 1000,
-                )
-                original_end_point = (
-                    coords[-1][0],
-                    coords[-1][1],
-                    coords[-1][2] + offset_z / 1000,
-                )
-
-                first_vertex_distance = distance(Point(coords[0]), Point(coords[-1]))
-                if first_vertex_distance > 1:
-                    coords[0] = part.interpolate(0.5).coords[0]
-                else:
-                    coords.pop(0)
-
-                last_vertex_distance = distance(Point(coords[-1]), Point(coords[-2]))
-                if last_vertex_distance > 1:
-                    coords[-1] = part.interpolate(-0.5).coords[0]
-                else:
-                    coords.pop(-1)
-
-                # forcing 2d: otherwise if offset=0, the original geometry
-                # is returned as is i.e. with z-dimension
-                part = force_2d(
-                    offset_curve(
-                        LineString(coords), distance=offset_x / 1000, join_style="mitre"
-                    )
-                )
-
-                new_coords = []
-                for point_offset, point_z in zip(part.coords, coords):
-                    new_coords.append(point_offset + (point_z[2] + offset_z / 1000,))
-                part = LineString(
-                    [original_start_point] + new_coords + [original_end_point]
-                )
-                parts.append(part)
-            geom = set_srid(line_merge(MultiLineString(parts)), srid=srid)
-            geom = shapely2geodjango(geom)
-        return geom
 
 
 @register_oapif_viewset(geom_field=None)
@@ -393,15 +375,130 @@ class CableTube(ComputedFieldsModel):
         super().save(**kwargs)
 
 
-@register_oapif_viewset(crs=2056)
+class RecomputeTask(models.Model):
+    """
+    A tube or a cable whose geometry waits for the recompute worker,
+    when RECOMPUTE_MODE is "async" (see kablo.network.recompute)
+    """
+
+    # reset when the object is queued again, the task is only done for the
+    # created_at read by the worker
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    model = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    # processed by a worker since then
+    claimed_at = models.DateTimeField(null=True, editable=False)
+
+    class Meta:
+        unique_together = ("model", "object_id")
+
+
+class TileCache(models.Model):
+    """
+    Rendered vector tiles (see kablo.network.tiles), deleted by triggers
+    when a feature changes within their bounds, and evicted beyond
+    TILE_CACHE_MAX_TILES
+    """
+
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    layer = models.CharField(max_length=20)
+    z = models.IntegerField()
+    x = models.IntegerField()
+    y = models.IntegerField()
+    tile = models.BinaryField()
+    bbox = models.PolygonField(srid=2056)
+
+    class Meta:
+        unique_together = ("layer", "z", "x", "y")
+
+
+class Watermark(models.Model):
+    """
+    Last change, deletion and change counts of the tables of the OAPIF collections,
+    kept by statement triggers (see kablo.api.middleware).
+    Each database backend writes its own shard, so that concurrent transactions
+    do not wait on the same row.
+    The sum of the change counters grows with every committed change, whereas
+    the latest `updated_at` misses the transactions committing after a later one.
+    """
+
+    table_name = models.CharField(max_length=63)
+    shard = models.IntegerField()
+    updated_at = models.DateTimeField()
+    deletions = models.BigIntegerField(default=0)
+    changes = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("table_name", "shard")
+
+
+class SimplifiedGeometry(models.Model):
+    """
+    Geometries of the tracks, tubes and cables simplified per level of detail
+    (see kablo.network.lod), kept by triggers when their geometry changes
+    """
+
+    model = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    level = models.SmallIntegerField()
+    geom = models.GeometryField(srid=2056, dim=3)
+
+    class Meta:
+        unique_together = ("model", "object_id", "level")
+
+
+class Change(models.Model):
+    """
+    Inserted, updated and deleted network features, logged by triggers
+    with the id of their transaction (see kablo.network.changes)
+    """
+
+    xid = models.BigIntegerField()
+    model = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    # I(nsert), U(pdate) or D(elete)
+    operation = models.CharField(max_length=1)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["xid", "id"])]
+
+
+class ExportJob(models.Model):
+    """
+    Export of the network to a file, written by the `export_worker` command
+    (see kablo.network.export)
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, editable=False)
+    format = models.CharField(max_length=10)
+    # pending, running, done or failed
+    status = models.CharField(max_length=10, default="pending")
+    progress = models.IntegerField(default=0, help_text="Exported features in %")
+    # state of the data when the export was requested
+    watermark = models.CharField(max_length=32)
+    file = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField(null=True)
+    error = models.TextField(blank=True)
+
+
+@register_published_viewset(crs=2056)
 class Station(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True, editable=False)
-    original_id = models.TextField(null=True, editable=True)
+    original_id = models.TextField(null=True, editable=True, db_index=True)
+    # hash of the source feature, and removal from the source (soft-deleted)
+    source_hash = models.CharField(max_length=32, null=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, editable=False)
     label = models.CharField(max_length=64, blank=True, null=True)
     geom = models.PointField(srid=2056, dim=3)
 
+    objects = ImportedManager()
+    all_objects = models.Manager()
+
 
 class Node(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
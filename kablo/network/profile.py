@@ -0,0 +1,192 @@
+from typing import NamedTuple
+
+import numpy as np
+import plotly.graph_objects as go
+from shapely import (
+    Geometry,
+    Point,
+    get_coordinates,
+    line_interpolate_point,
+    line_locate_point,
+)
+
+
+def chainages_of(coords: np.ndarray) -> np.ndarray:
+    """
+    Planar chainage of each vertex of a line
+    """
+    steps = np.hypot(*np.diff(coords[:, :2], axis=0).T)
+    return np.concatenate([[0], np.cumsum(steps)])
+
+
+def sampling_chainages(length: float, step: float) -> np.ndarray:
+    """
+    Chainages every `step` along a line of `length`, the end of the line included
+    """
+    chainages = np.arange(0, length, step, dtype=float)
+    return np.append(chainages, length)
+
+
+def sample_line(line: Geometry, chainages) -> np.ndarray:
+    """
+    3D points of `line` at the given planar `chainages` (clipped to the line),
+    interpolated in one pass over the vertices.
+    """
+    coords = get_coordinates(line, include_z=True)
+    vertex_chainages = chainages_of(coords)
+    chainages = np.clip(np.asarray(chainages, dtype=float), 0, vertex_chainages[-1])
+    return np.column_stack(
+        [np.interp(chainages, vertex_chainages, coords[:, i]) for i in range(3)]
+    )
+
+
+def cross_section_offsets(section: Geometry, distance: float, lines) -> np.ndarray:
+    """
+    Actual offsets (in mm, like `TubeSection.offset_x` and `offset_z`) of the 3D `lines`
+    relative to `section` at the chainage `distance` along it:
+    planar offset to the left of the section, and height above it.
+    Offsets of missing lines (None) are NaN.
+    """
+    length = chainages_of(get_coordinates(section))[-1]
+    distance = min(max(distance, 0), length)
+    point, before, after = sample_line(
+        section, [distance, max(distance - 0.01, 0), min(distance + 0.01, length)]
+    )
+    direction = (after - before)[:2]
+    direction /= np.linalg.norm(direction)
+    left = np.array([-direction[1], direction[0]])
+
+    lines = np.asarray(lines, dtype=object)
+    located = line_locate_point(lines, Point(point[:2]))
+    positions = get_coordinates(line_interpolate_point(lines, located), include_z=True)
+    offsets = np.full((len(lines), 2), np.nan)
+    present = np.array([line is not None for line in lines], dtype=bool)
+    delta = positions - point
+    offsets[present, 0] = delta[:, :2] @ left * 1000
+    offsets[present, 1] = delta[:, 2] * 1000
+    return offsets
+
+
+def _min(current, offset, diameter):
+    if not current:
+        return offset - diameter / 2
+    return min(current, offset - diameter / 2)
+
+
+def _max(current, offset, diameter):
+    if not current:
+        return offset + diameter / 2
+    return max(current, offset + diameter / 2)
+
+
+class ProfilePos(NamedTuple):
+    x: int
+    z: int
+
+
+class ProfileCable(NamedTuple):
+    id: str
+    identifier: str
+    pos: ProfilePos
+
+
+class ProfileTube(NamedTuple):
+    id: str
+    diameter: int
+    pos: ProfilePos
+    offset_x: int
+    offset_z: int
+    cables: list[ProfileCable]
+
+
+def _bounds(tubes: list[ProfileTube]):
+    x_min = None
+    x_max = None
+    z_min = None
+    z_max = None
+    for _tube in tubes:
+        x_min = _min(x_min, _tube.pos.x, _tube.diameter)
+        x_max = _max(x_max, _tube.pos.x, _tube.diameter)
+        z_min = _min(z_min, _tube.pos.z, _tube.diameter)
+        z_max = _max(z_max, _tube.pos.z, _tube.diameter)
+    return x_min, x_max, z_min, z_max
+
+
+def profile_figure(_tubes: list[ProfileTube]) -> go.Figure:
+    """
+    Plotly figure of the tubes and cables of a section profile
+    """
+    x_min, x_max, z_min, z_max = _bounds(_tubes)
+    fig = go.Figure()
+
+    fig.update_layout(
+        plot_bgcolor="white",
+        showlegend=False,
+        autosize=True,
+        width=600,
+        height=600,
+    )
+
+    fig.update_xaxes(
+        range=[x_min, x_max],
+        showgrid=False,
+    )
+    fig.update_yaxes(
+        range=[z_min, z_max],
+        showgrid=False,
+    )
+
+    tubes_x = []
+    tubes_y = []
+    tubes_customdata = []
+    tubes_size = []
+    for _tube in _tubes:
+        tubes_x.append(_tube.pos.x)
+        tubes_y.append(_tube.pos.z)
+        tubes_customdata.append([f"<b>{_tube.id}</b><br>Diameter: {_tube.diameter}"])
+        tubes_size.append(_tube.diameter / 2)
+    fig.add_trace(
+        go.Scatter(
+            x=tubes_x,
+            y=tubes_y,
+            marker=dict(color="aquamarine", size=tubes_size),
+            mode="markers",
+            customdata=tubes_customdata,
+            hovertemplate="<b>%{customdata[0]}</b><br>",
+        )
+    )
+
+    for _tube in _tubes:
+        cables_x = []
+        cables_y = []
+        cables_customdata = []
+        for _cable in _tube.cables:
+            cables_x.append(_cable.pos.x)
+            cables_y.append(_cable.pos.z)
+            cables_customdata.append([f"<b>{_cable.identifier or _cable.id}</b>"])
+
+        fig.add_trace(
+            go.Scatter(
+                x=cables_x,
+                y=cables_y,
+                marker=dict(color="red", size=8),
+                mode="markers",
+                customdata=cables_customdata,
+                hovertemplate="<b>%{customdata[0]}</b><br>",
+            )
+        )
+
+    fig.update_yaxes(
+        scaleanchor="x",
+        scaleratio=1,
+    )
+
+    return fig
+
+
+def render_profile(_tubes: list[ProfileTube]) -> str:
+    """
+    HTML fragment of the profile, plotly.js is loaded from its CDN
+    instead of being inlined (several MB) in every response
+    """
+    return profile_figure(_tubes).to_html(full_html=False, include_plotlyjs="cdn")
@@ -0,0 +1,239 @@
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from computedfields.resolver import active_resolver
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# the tasks claimed by a worker which stopped are claimed again after CLAIM_TIMEOUT
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+_local = threading.local()
+
+
+def defer_recompute(instance) -> bool:
+    """
+    To be called at the top of an expensive computed field method.
+    Within a `deferred_recompute` block, records the instance as dirty and returns True:
+    the method should then return the current value and leave the computation
+    for the end of the block.
+    """
+    dirty = getattr(_local, "dirty", None)
+    if dirty is None:
+        return False
+    dirty.setdefault(type(instance), set()).add(instance.pk)
+    return True
+
+
+def mark_dirty(dirty: dict):
+    """
+    Record the tubes and cables (mapping of model to ids) as dirty in the current
+    `deferred_recompute` block, e.g. the ones inserted by bulk_create,
+    which does not compute their fields.
+    """
+    current = getattr(_local, "dirty", None)
+    if current is None:
+        raise RuntimeError("mark_dirty is called outside of a deferred_recompute block")
+    for model, pks in dirty.items():
+        current.setdefault(model, set()).update(pks)
+
+
+def count_recompute(instance):
+    """
+    To be called by computed field methods when they actually compute,
+    for the `counting_recomputes` blocks.
+    """
+    for counter in getattr(_local, "counters", ()):
+        counter[type(instance).__name__] += 1
+
+
+@contextmanager
+def counting_recomputes():
+    """
+    Count the computations per model name during the block.
+    """
+    counter = Counter()
+    counters = _local.__dict__.setdefault("counters", [])
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+
+def recompute(dirty: dict):
+    """
+    Recompute the geometries of the dirty tubes and cables (mapping of model to ids),
+    each object being computed once.
+    """
+    from kablo.network.models import Cable, Tube
+
+    tube_ids = dirty.get(Tube, set())
+    cable_ids = set(dirty.get(Cable, set()))
+    logger.debug(f"recompute {len(tube_ids)} tubes and {len(cable_ids)} cables")
+
+    if settings.GEOMETRY_ENGINE == "sql":
+        # set-based: all the geometries are computed by one statement per model
+        from kablo.network.geometry import update_cable_geoms_sql, update_tube_geoms_sql
+
+        if tube_ids:
+            update_tube_geoms_sql(tube_ids)
+            cable_ids |= set(
+                Cable.objects.filter(cabletube__tube__in=tube_ids).values_list(
+                    "pk", flat=True
+                )
+            )
+        if cable_ids:
+            update_cable_geoms_sql(cable_ids)
+        return
+
+    if tube_ids:
+        # cables are updated below, together with the dirty ones
+        changed_tube_ids = active_resolver.bulk_updater(
+            Tube.objects.filter(pk__in=tube_ids),
+            {"geom"},
+            return_pks=True,
+            local_only=True,
+        )
+        if changed_tube_ids:
+            cable_ids |= set(
+                Cable.objects.filter(cabletube__tube__in=changed_tube_ids).values_list(
+                    "pk", flat=True
+                )
+            )
+
+    if cable_ids:
+        active_resolver.bulk_updater(Cable.objects.filter(pk__in=cable_ids), {"geom"})
+
+
+def enqueue(dirty: dict):
+    """
+    Queue the dirty tubes and cables (mapping of model to ids) for the recompute worker
+    and flag them as stale, as well as the cables going through the dirty tubes.
+    The tasks already queued are renewed: a worker processing them meanwhile
+    does not delete them (see `process_queue`).
+    """
+    from kablo.network.models import Cable, RecomputeTask, Tube
+
+    RecomputeTask.objects.bulk_create(
+        [
+            RecomputeTask(model=model._meta.model_name, object_id=pk)
+            for model, pks in dirty.items()
+            for pk in pks
+        ],
+        update_conflicts=True,
+        unique_fields=["model", "object_id"],
+        update_fields=["created_at", "claimed_at"],
+    )
+    tube_ids = dirty.get(Tube, set())
+    Tube.objects.filter(pk__in=tube_ids).update(stale=True)
+    Cable.objects.filter(
+        Q(pk__in=dirty.get(Cable, set())) | Q(cabletube__tube__in=tube_ids)
+    ).update(stale=True)
+    logger.debug(
+        f"enqueued {len(tube_ids)} tubes and {len(dirty.get(Cable, ()))} cables"
+    )
+
+
+def claim_tasks(batch_size: int = 500) -> list:
+    """
+    Claim a batch of queued tasks, concurrent workers claim distinct batches.
+    The claim is committed at once: the requests queuing the same objects
+    meanwhile do not wait for the batch.
+    """
+    from kablo.network.models import RecomputeTask
+
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            RecomputeTask.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+            .order_by("id")[:batch_size]
+        )
+        RecomputeTask.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            claimed_at=now
+        )
+    return tasks
+
+
+def process_tasks(tasks: list):
+    """
+    Recompute the tubes and cables of claimed tasks, each of them once,
+    and delete the tasks unless their object was queued again meanwhile.
+    """
+    from kablo.network.models import Cable, RecomputeTask, Tube
+
+    models = {model._meta.model_name: model for model in (Tube, Cable)}
+    with transaction.atomic():
+        dirty = {}
+        for task in tasks:
+            dirty.setdefault(models[task.model], set()).add(task.object_id)
+        recompute(dirty)
+
+        done = Q()
+        for task in tasks:
+            done |= Q(pk=task.pk, created_at=task.created_at)
+        RecomputeTask.objects.filter(done).delete()
+
+        # the objects queued again, or in another batch, stay stale
+        pending_tube_ids = RecomputeTask.objects.filter(model="tube").values(
+            "object_id"
+        )
+        pending_cable_ids = RecomputeTask.objects.filter(model="cable").values(
+            "object_id"
+        )
+        tube_ids = dirty.get(Tube, set())
+        Tube.objects.filter(pk__in=tube_ids).exclude(pk__in=pending_tube_ids).update(
+            stale=False
+        )
+        Cable.objects.filter(
+            Q(pk__in=dirty.get(Cable, set())) | Q(cabletube__tube__in=tube_ids)
+        ).exclude(
+            Q(pk__in=pending_cable_ids) | Q(cabletube__tube__in=pending_tube_ids)
+        ).update(
+            stale=False
+        )
+
+
+def process_queue(batch_size: int = 500) -> int:
+    """
+    Recompute a batch of queued tubes and cables (see `claim_tasks`).
+    Returns the number of processed tasks.
+    """
+    tasks = claim_tasks(batch_size)
+    if tasks:
+        process_tasks(tasks)
+    return len(tasks)
+
+
+@contextmanager
+def deferred_recompute():
+    """
+    Collect the tubes and cables whose geometry must be recomputed during the block
+    and recompute each of them once, at the end of the block.
+    With RECOMPUTE_MODE = "async", they are queued for the recompute worker instead.
+    The block runs in a transaction. Can be used as a decorator as well.
+    """
+    if getattr(_local, "dirty", None) is not None:
+        # nested block: the outermost one recomputes
+        yield
+        return
+
+    _local.dirty = {}
+    try:
+        with transaction.atomic():
+            yield
+            dirty, _local.dirty = _local.dirty, None
+            if settings.RECOMPUTE_MODE == "async":
+                enqueue(dirty)
+            else:
+                recompute(dirty)
+    finally:
+        _local.dirty = None
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from kablo.network.cache import offset_part_cache
+from kablo.network.models import Section
+
+
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+def invalidate_section_offset_parts(sender, instance, **kwargs):
+    offset_part_cache.invalidate(instance.pk)
+
+
+@receiver(connection_created)
+def set_geometry_grid(sender, connection, **kwargs):
+    # read by the snap_geom_to_grid triggers
+    if settings.GEOMETRY_GRID_SIZE and connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('kablo.geometry_grid', %s, false)",
+                [str(settings.GEOMETRY_GRID_SIZE)],
+            )
@@ -0,0 +1,169 @@
+import logging
+from typing import NamedTuple
+
+from computedfields.models import update_dependent
+from django.contrib.gis.geos import LineString as GeosLineString
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from kablo.core.functions import SplitLine
+from kablo.network.cache import offset_part_cache
+from kablo.network.models import SECTION_ORDER_INDEX_STEP, Section, Track
+
+logger = logging.getLogger(__name__)
+
+
+class SplitResult(NamedTuple):
+    tracks: int
+    sections: int
+
+
+def compact_order_index(tracks=None) -> set:
+    """
+    Renumber the sections of `tracks` (all tracks if None) with evenly spaced
+    order indexes, restoring the gaps used by splits.
+    Returns the ids of the renumbered sections.
+    """
+    table = Section._meta.db_table
+    track_filter = ""
+    params = [SECTION_ORDER_INDEX_STEP]
+    if tracks is not None:
+        track_filter = "WHERE track_id = ANY(%s::uuid[])"
+        params.append([getattr(track, "pk", track) for track in tracks])
+
+    with connection.cursor() as cursor:
+        # renumber in two passes through negative values,
+        # so the (track, order_index) unique constraint holds after each statement
+        cursor.execute(
+            f"""
+            UPDATE {table} AS section
+            SET order_index = -1 - numbered.order_index
+            FROM (
+                SELECT
+                    id,
+                    (ROW_NUMBER() OVER (PARTITION BY track_id ORDER BY order_index) - 1) * %s AS order_index
+                FROM {table}
+                {track_filter}
+            ) AS numbered
+            WHERE section.id = numbered.id AND section.order_index != numbered.order_index
+            RETURNING section.id
+            """,
+            params,
+        )
+        renumbered_ids = {row[0] for row in cursor.fetchall()}
+        if renumbered_ids:
+            # only the sections renumbered by the first pass, not the whole table
+            cursor.execute(
+                f"UPDATE {table} SET order_index = -1 - order_index "
+                "WHERE id = ANY(%s::uuid[])",
+                [list(renumbered_ids)],
+            )
+    return renumbered_ids
+
+
+def _split_sections_qs(split_line: GeosLineString, tracks=None):
+    sections_qs = Section.objects.filter(geom__intersects=split_line)
+    if tracks is not None:
+        sections_qs = sections_qs.filter(track__in=tracks)
+    return sections_qs.annotate(
+        splitted_geom=SplitLine("geom", split_line),
+        next_order_index=Subquery(
+            Section.objects.filter(
+                track=OuterRef("track"), order_index__gt=OuterRef("order_index")
+            )
+            .order_by("order_index")
+            .values("order_index")[:1]
+        ),
+    ).order_by("track_id", "order_index")
+
+
+@transaction.atomic
+def split_tracks(split_line: GeosLineString, tracks=None) -> SplitResult:
+    """
+    Split all the sections crossed by `split_line` in a few set-based statements.
+
+    The first part of a split section keeps the existing row (and its tube sections),
+    the other parts are inserted in the order index gap following it, so other
+    sections are left untouched. Tracks without enough room are compacted first.
+    The geometry of the affected tracks is rebuilt from their sections.
+    `tracks` optionally restricts the split to the given tracks (instances or ids).
+    """
+    split_sections = []
+    for section in _split_sections_qs(split_line, tracks):
+        if section.splitted_geom and len(section.splitted_geom) > 1:
+            split_sections.append(section)
+
+    if not split_sections:
+        return SplitResult(tracks=0, sections=0)
+
+    def _gap(section):
+        if section.next_order_index is None:
+            return SECTION_ORDER_INDEX_STEP * len(section.splitted_geom)
+        return section.next_order_index - section.order_index
+
+    crowded_tracks = {
+        section.track_id
+        for section in split_sections
+        if _gap(section) < len(section.splitted_geom)
+    }
+    compacted = set()
+    if crowded_tracks:
+        compacted = compact_order_index(crowded_tracks)
+        split_sections = [
+            section
+            for section in _split_sections_qs(split_line, tracks)
+            if section.splitted_geom and len(section.splitted_geom) > 1
+        ]
+
+    now = timezone.now()
+    new_sections = []
+    for section in split_sections:
+        parts = list(section.splitted_geom)
+        step = _gap(section) // len(parts)
+        for part_index, part in enumerate(parts[1:], start=1):
+            new_section = section.clone()
+            new_section.geom = part
+            new_section.order_index = section.order_index + part_index * step
+            new_sections.append(new_section)
+        section.geom = parts[0]
+        section.updated_at = now
+
+    Section.objects.bulk_update(split_sections, ["geom", "updated_at"])
+    # bulk updates send no signal
+    for section in split_sections:
+        offset_part_cache.invalidate(section.pk)
+    Section.objects.bulk_create(new_sections)
+
+    track_ids = list({section.track_id for section in split_sections})
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {Track._meta.db_table} AS track
+            SET geom = (
+                SELECT ST_Multi(ST_Collect(section.geom ORDER BY section.order_index))
+                FROM {Section._meta.db_table} AS section
+                WHERE section.track_id = track.id
+            ),
+            updated_at = %s
+            WHERE track.id = ANY(%s::uuid[])
+            """,
+            [now, track_ids],
+        )
+
+    # update the tubes going through the split sections
+    update_dependent(
+        Section.objects.filter(pk__in=[s.pk for s in split_sections]),
+        update_fields=["geom"],
+    )
+
+    result = SplitResult(
+        tracks=len(track_ids),
+        sections=len(
+            compacted
+            | {section.pk for section in split_sections}
+            | {section.pk for section in new_sections}
+        ),
+    )
+    logger.debug(f"split {result.tracks} tracks, {result.sections} sections touched")
+    return result
@@ -0,0 +1,661 @@
+from migrate_sql.config import SQLItem
+
+from kablo.network.lod import LOD_TOLERANCES
+
+LOD_VALUES = ", ".join(
+    f"({level}, {tolerance})" for level, tolerance in LOD_TOLERANCES.items()
+)
+
+sql_items = [
+    SQLItem(
+        "trim_line_ends",
+        r"""
+        CREATE OR REPLACE FUNCTION trim_line_ends(line geometry)
+           RETURNS geometry
+           LANGUAGE plpgsql
+           IMMUTABLE
+          AS
+        $$
+        declare
+           trimmed geometry;
+           line_length float;
+        begin
+            line_length := ST_Length(line);
+            -- first vertex: moved along the line if far enough from the last one, removed otherwise
+            IF ST_Distance(ST_StartPoint(line), ST_EndPoint(line)) > 1 THEN
+                trimmed := ST_SetPoint(line, 0, ST_LineInterpolatePoint(line, LEAST(0.5 / line_length, 1)));
+            ELSE
+                trimmed := ST_RemovePoint(line, 0);
+            END IF;
+            -- last vertex: moved along the line if far enough from the previous one, removed otherwise
+            IF ST_Distance(ST_EndPoint(trimmed), ST_PointN(trimmed, -2)) > 1 THEN
+                trimmed := ST_SetPoint(trimmed, -1, ST_LineInterpolatePoint(line, GREATEST(1 - 0.5 / line_length, 0)));
+            ELSE
+                trimmed := ST_RemovePoint(trimmed, ST_NPoints(trimmed) - 1);
+            END IF;
+            return trimmed;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION trim_line_ends(line geometry);
+        """,
+    ),
+    SQLItem(
+        "tube_geom",
+        r"""
+        CREATE OR REPLACE FUNCTION tube_geom(tube_id uuid)
+           RETURNS geometry
+           LANGUAGE sql
+           STABLE
+          AS
+        $$
+            SELECT ST_LineMerge(ST_Collect(parts.geom ORDER BY parts.order_index))
+            FROM (
+                SELECT
+                    tube_section.order_index,
+                    ST_AddPoint(
+                        ST_AddPoint(
+                            project_z_on_line(
+                                ST_Force2D(ST_OffsetCurve(trimmed.geom, tube_section.offset_x / 1000.0, 'join=mitre')),
+                                trimmed.geom,
+                                tube_section.offset_z / 1000.0
+                            ),
+                            ST_Translate(ST_StartPoint(section.geom), 0, 0, tube_section.offset_z / 1000.0),
+                            0
+                        ),
+                        ST_Translate(ST_EndPoint(section.geom), 0, 0, tube_section.offset_z / 1000.0)
+                    ) AS geom
+                FROM network_tubesection tube_section
+                    INNER JOIN network_section section ON section.id = tube_section.section_id
+                    CROSS JOIN LATERAL (SELECT trim_line_ends(section.geom) AS geom) trimmed
+                WHERE tube_section.tube_id = $1
+            ) parts;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION tube_geom(tube_id uuid);
+        """,
+        dependencies=[("core", "project_z_on_line"), ("network", "trim_line_ends")],
+    ),
+    SQLItem(
+        "cable_geom",
+        r"""
+        CREATE OR REPLACE FUNCTION cable_geom(cable_id uuid)
+           RETURNS geometry
+           LANGUAGE sql
+           STABLE
+          AS
+        $$
+            SELECT ST_LineMerge(ST_Collect(parts.geom ORDER BY parts.order_index))
+            FROM (
+                SELECT
+                    cable_tube.order_index,
+                    ST_AddPoint(
+                        ST_AddPoint(
+                            ST_Force2D(ST_OffsetCurve(
+                                trim_line_ends(tube.geom),
+                                (cable_tube.display_offset - (tube.cable_count - 1) / 2.0) * 0.1,
+                                'join=bevel'
+                            )),
+                            ST_Force2D(ST_StartPoint(tube.geom)),
+                            0
+                        ),
+                        ST_Force2D(ST_EndPoint(tube.geom))
+                    ) AS geom
+                FROM network_cabletube cable_tube
+                    INNER JOIN network_tube tube ON tube.id = cable_tube.tube_id
+                WHERE cable_tube.cable_id = $1 AND tube.geom IS NOT NULL
+            ) parts;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION cable_geom(cable_id uuid);
+        """,
+        dependencies=[("network", "trim_line_ends")],
+    ),
+    SQLItem(
+        "invalidate_tile_cache",
+        r"""
+        CREATE OR REPLACE FUNCTION invalidate_tile_cache()
+           RETURNS trigger
+           LANGUAGE plpgsql
+          AS
+        $$
+        begin
+            -- TG_ARGV[0] is the tile layer of the table
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.geom IS NOT NULL THEN
+                DELETE FROM network_tilecache WHERE layer = TG_ARGV[0] AND bbox && OLD.geom;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.geom IS NOT NULL THEN
+                DELETE FROM network_tilecache WHERE layer = TG_ARGV[0] AND bbox && NEW.geom;
+            END IF;
+            return NULL;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION invalidate_tile_cache();
+        """,
+    ),
+    # the tile cache triggers only fire on updates of the columns drawn in the tiles,
+    # not e.g. on the updated_at or stale updates of the recompute queue
+    SQLItem(
+        "tile_cache_track_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER tile_cache_track
+            AFTER INSERT OR UPDATE OF geom, deleted_at OR DELETE ON network_track
+            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('track');
+        """,
+        r"""
+            DROP TRIGGER tile_cache_track ON network_track;
+        """,
+        dependencies=[("network", "invalidate_tile_cache")],
+    ),
+    SQLItem(
+        "tile_cache_section_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER tile_cache_section
+            AFTER INSERT OR UPDATE OF geom, track_id, order_index OR DELETE ON network_section
+            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('section');
+        """,
+        r"""
+            DROP TRIGGER tile_cache_section ON network_section;
+        """,
+        dependencies=[("network", "invalidate_tile_cache")],
+    ),
+    SQLItem(
+        "tile_cache_tube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER tile_cache_tube
+            AFTER INSERT OR UPDATE OF geom, diameter, cable_count, deleted_at OR DELETE ON network_tube
+            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('tube');
+        """,
+        r"""
+            DROP TRIGGER tile_cache_tube ON network_tube;
+        """,
+        dependencies=[("network", "invalidate_tile_cache")],
+    ),
+    SQLItem(
+        "tile_cache_cable_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER tile_cache_cable
+            AFTER INSERT OR UPDATE OF geom, identifier, deleted_at OR DELETE ON network_cable
+            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('cable');
+        """,
+        r"""
+            DROP TRIGGER tile_cache_cable ON network_cable;
+        """,
+        dependencies=[("network", "invalidate_tile_cache")],
+    ),
+    SQLItem(
+        "tile_cache_station_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER tile_cache_station
+            AFTER INSERT OR UPDATE OF geom, label, deleted_at OR DELETE ON network_station
+            FOR EACH ROW EXECUTE FUNCTION invalidate_tile_cache('station');
+        """,
+        r"""
+            DROP TRIGGER tile_cache_station ON network_station;
+        """,
+        dependencies=[("network", "invalidate_tile_cache")],
+    ),
+    SQLItem(
+        "invalidate_cabletube_tiles",
+        r"""
+        CREATE OR REPLACE FUNCTION invalidate_cabletube_tiles()
+           RETURNS trigger
+           LANGUAGE plpgsql
+          AS
+        $$
+        begin
+            -- the cables of the tubes are drawn in the tube tiles, over the tube geometry
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM network_tilecache WHERE layer = 'tube'
+                AND bbox && (SELECT geom FROM network_tube WHERE id = OLD.tube_id);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                DELETE FROM network_tilecache WHERE layer = 'tube'
+                AND bbox && (SELECT geom FROM network_tube WHERE id = NEW.tube_id);
+            END IF;
+            return NULL;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION invalidate_cabletube_tiles();
+        """,
+    ),
+    SQLItem(
+        "tile_cache_cabletube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER tile_cache_cabletube
+            AFTER INSERT OR UPDATE OF cable_id, tube_id OR DELETE ON network_cabletube
+            FOR EACH ROW EXECUTE FUNCTION invalidate_cabletube_tiles();
+        """,
+        r"""
+            DROP TRIGGER tile_cache_cabletube ON network_cabletube;
+        """,
+        dependencies=[("network", "invalidate_cabletube_tiles")],
+    ),
+    SQLItem(
+        "soft_delete_track_parts",
+        r"""
+        CREATE OR REPLACE FUNCTION soft_delete_track_parts()
+           RETURNS trigger
+           LANGUAGE plpgsql
+          AS
+        $$
+        begin
+            -- the sections of a track soft-deleted or restored by the import synchronization
+            -- are hidden or shown with it: they (and their tube sections) are recorded
+            -- as changed, and their tiles are invalidated
+            UPDATE network_section SET updated_at = clock_timestamp() WHERE track_id = NEW.id;
+            UPDATE network_tubesection SET updated_at = clock_timestamp()
+            WHERE section_id IN (SELECT id FROM network_section WHERE track_id = NEW.id);
+            DELETE FROM network_tilecache
+            WHERE layer = 'section' AND bbox && (
+                SELECT ST_SetSRID(ST_Extent(geom), 2056) FROM network_section WHERE track_id = NEW.id
+            );
+            return NULL;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION soft_delete_track_parts();
+        """,
+    ),
+    SQLItem(
+        "soft_delete_track_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER soft_delete_track
+            AFTER UPDATE OF deleted_at ON network_track
+            FOR EACH ROW WHEN (OLD.deleted_at IS DISTINCT FROM NEW.deleted_at)
+            EXECUTE FUNCTION soft_delete_track_parts();
+        """,
+        r"""
+            DROP TRIGGER soft_delete_track ON network_track;
+        """,
+        dependencies=[("network", "soft_delete_track_parts")],
+    ),
+    SQLItem(
+        "update_watermark",
+        r"""
+        CREATE OR REPLACE FUNCTION update_watermark()
+           RETURNS trigger
+           LANGUAGE plpgsql
+          AS
+        $$
+        begin
+            INSERT INTO network_watermark (table_name, shard, updated_at, deletions, changes)
+            VALUES (
+                TG_TABLE_NAME,
+                pg_backend_pid() % 16,
+                clock_timestamp(),
+                CASE WHEN TG_OP IN ('DELETE', 'TRUNCATE') THEN 1 ELSE 0 END,
+                1
+            )
+            ON CONFLICT (table_name, shard) DO UPDATE SET
+                updated_at = EXCLUDED.updated_at,
+                deletions = network_watermark.deletions + EXCLUDED.deletions,
+                changes = network_watermark.changes + 1;
+            return NULL;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION update_watermark();
+        """,
+        # replaced in place: the watermark triggers depend on it
+        replace=True,
+    ),
+    SQLItem(
+        "watermark_track_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER watermark_track
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_track
+            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();
+        """,
+        r"""
+            DROP TRIGGER watermark_track ON network_track;
+        """,
+        dependencies=[("network", "update_watermark")],
+    ),
+    SQLItem(
+        "watermark_section_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER watermark_section
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_section
+            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();
+        """,
+        r"""
+            DROP TRIGGER watermark_section ON network_section;
+        """,
+        dependencies=[("network", "update_watermark")],
+    ),
+    SQLItem(
+        "watermark_tube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER watermark_tube
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_tube
+            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();
+        """,
+        r"""
+            DROP TRIGGER watermark_tube ON network_tube;
+        """,
+        dependencies=[("network", "update_watermark")],
+    ),
+    SQLItem(
+        "watermark_cable_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER watermark_cable
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_cable
+            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();
+        """,
+        r"""
+            DROP TRIGGER watermark_cable ON network_cable;
+        """,
+        dependencies=[("network", "update_watermark")],
+    ),
+    SQLItem(
+        "watermark_tubesection_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER watermark_tubesection
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_tubesection
+            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();
+        """,
+        r"""
+            DROP TRIGGER watermark_tubesection ON network_tubesection;
+        """,
+        dependencies=[("network", "update_watermark")],
+    ),
+    SQLItem(
+        "watermark_cabletube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER watermark_cabletube
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_cabletube
+            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();
+        """,
+        r"""
+            DROP TRIGGER watermark_cabletube ON network_cabletube;
+        """,
+        dependencies=[("network", "update_watermark")],
+    ),
+    SQLItem(
+        "watermark_station_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER watermark_station
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON network_station
+            FOR EACH STATEMENT EXECUTE FUNCTION update_watermark();
+        """,
+        r"""
+            DROP TRIGGER watermark_station ON network_station;
+        """,
+        dependencies=[("network", "update_watermark")],
+    ),
+    SQLItem(
+        "update_simplified_geometries",
+        rf"""
+        CREATE OR REPLACE FUNCTION update_simplified_geometries()
+           RETURNS trigger
+           LANGUAGE plpgsql
+          AS
+        $$
+        begin
+            -- TG_ARGV[0] is the model of the table
+            IF TG_OP = 'UPDATE' AND NEW.geom IS NOT DISTINCT FROM OLD.geom THEN
+                return NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM network_simplifiedgeometry WHERE model = TG_ARGV[0] AND object_id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.geom IS NOT NULL THEN
+                INSERT INTO network_simplifiedgeometry (model, object_id, level, geom)
+                SELECT TG_ARGV[0], NEW.id, lod.level, ST_SimplifyPreserveTopology(NEW.geom, lod.tolerance)
+                FROM (VALUES {LOD_VALUES}) AS lod(level, tolerance);
+            END IF;
+            return NULL;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION update_simplified_geometries();
+        """,
+    ),
+    SQLItem(
+        "simplified_geometries_track_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER simplified_geometries_track
+            AFTER INSERT OR UPDATE OF geom OR DELETE ON network_track
+            FOR EACH ROW EXECUTE FUNCTION update_simplified_geometries('Track');
+        """,
+        r"""
+            DROP TRIGGER simplified_geometries_track ON network_track;
+        """,
+        dependencies=[("network", "update_simplified_geometries")],
+    ),
+    SQLItem(
+        "simplified_geometries_tube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER simplified_geometries_tube
+            AFTER INSERT OR UPDATE OF geom OR DELETE ON network_tube
+            FOR EACH ROW EXECUTE FUNCTION update_simplified_geometries('Tube');
+        """,
+        r"""
+            DROP TRIGGER simplified_geometries_tube ON network_tube;
+        """,
+        dependencies=[("network", "update_simplified_geometries")],
+    ),
+    SQLItem(
+        "simplified_geometries_cable_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER simplified_geometries_cable
+            AFTER INSERT OR UPDATE OF geom OR DELETE ON network_cable
+            FOR EACH ROW EXECUTE FUNCTION update_simplified_geometries('Cable');
+        """,
+        r"""
+            DROP TRIGGER simplified_geometries_cable ON network_cable;
+        """,
+        dependencies=[("network", "update_simplified_geometries")],
+    ),
+    SQLItem(
+        "record_change",
+        r"""
+        CREATE OR REPLACE FUNCTION record_change()
+           RETURNS trigger
+           LANGUAGE plpgsql
+          AS
+        $$
+        begin
+            -- TG_ARGV[0] is the model of the table
+            INSERT INTO network_change (xid, model, object_id, operation, changed_at)
+            VALUES (
+                pg_current_xact_id()::text::bigint,
+                TG_ARGV[0],
+                CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+                left(TG_OP, 1),
+                clock_timestamp()
+            );
+            return NULL;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION record_change();
+        """,
+    ),
+    SQLItem(
+        "change_track_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER change_track
+            AFTER INSERT OR UPDATE OR DELETE ON network_track
+            FOR EACH ROW EXECUTE FUNCTION record_change('Track');
+        """,
+        r"""
+            DROP TRIGGER change_track ON network_track;
+        """,
+        dependencies=[("network", "record_change")],
+    ),
+    SQLItem(
+        "change_section_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER change_section
+            AFTER INSERT OR UPDATE OR DELETE ON network_section
+            FOR EACH ROW EXECUTE FUNCTION record_change('Section');
+        """,
+        r"""
+            DROP TRIGGER change_section ON network_section;
+        """,
+        dependencies=[("network", "record_change")],
+    ),
+    SQLItem(
+        "change_tube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER change_tube
+            AFTER INSERT OR UPDATE OR DELETE ON network_tube
+            FOR EACH ROW EXECUTE FUNCTION record_change('Tube');
+        """,
+        r"""
+            DROP TRIGGER change_tube ON network_tube;
+        """,
+        dependencies=[("network", "record_change")],
+    ),
+    SQLItem(
+        "change_tubesection_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER change_tubesection
+            AFTER INSERT OR UPDATE OR DELETE ON network_tubesection
+            FOR EACH ROW EXECUTE FUNCTION record_change('TubeSection');
+        """,
+        r"""
+            DROP TRIGGER change_tubesection ON network_tubesection;
+        """,
+        dependencies=[("network", "record_change")],
+    ),
+    SQLItem(
+        "change_cable_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER change_cable
+            AFTER INSERT OR UPDATE OR DELETE ON network_cable
+            FOR EACH ROW EXECUTE FUNCTION record_change('Cable');
+        """,
+        r"""
+            DROP TRIGGER change_cable ON network_cable;
+        """,
+        dependencies=[("network", "record_change")],
+    ),
+    SQLItem(
+        "change_cabletube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER change_cabletube
+            AFTER INSERT OR UPDATE OR DELETE ON network_cabletube
+            FOR EACH ROW EXECUTE FUNCTION record_change('CableTube');
+        """,
+        r"""
+            DROP TRIGGER change_cabletube ON network_cabletube;
+        """,
+        dependencies=[("network", "record_change")],
+    ),
+    SQLItem(
+        "change_station_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER change_station
+            AFTER INSERT OR UPDATE OR DELETE ON network_station
+            FOR EACH ROW EXECUTE FUNCTION record_change('Station');
+        """,
+        r"""
+            DROP TRIGGER change_station ON network_station;
+        """,
+        dependencies=[("network", "record_change")],
+    ),
+    SQLItem(
+        "snap_geom_to_grid",
+        r"""
+        CREATE OR REPLACE FUNCTION snap_geom_to_grid()
+           RETURNS trigger
+           LANGUAGE plpgsql
+          AS
+        $$
+        declare
+           grid_size float;
+           snapped geometry;
+        begin
+            -- set on the connections of kablo when GEOMETRY_GRID_SIZE is configured
+            grid_size := NULLIF(current_setting('kablo.geometry_grid', true), '')::float;
+            IF grid_size IS NULL OR NEW.geom IS NULL THEN
+                return NEW;
+            END IF;
+            snapped := ST_SnapToGrid(NEW.geom, ST_MakePoint(0, 0, 0), grid_size, grid_size, grid_size, 0);
+            -- geometries collapsing on the grid are kept as is
+            IF snapped IS NOT NULL AND NOT ST_IsEmpty(snapped) THEN
+                NEW.geom := snapped;
+            END IF;
+            return NEW;
+        end;
+        $$;
+        """,
+        r"""
+            DROP FUNCTION snap_geom_to_grid();
+        """,
+    ),
+    SQLItem(
+        "snap_geom_track_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER snap_geom_track
+            BEFORE INSERT OR UPDATE OF geom ON network_track
+            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();
+        """,
+        r"""
+            DROP TRIGGER snap_geom_track ON network_track;
+        """,
+        dependencies=[("network", "snap_geom_to_grid")],
+    ),
+    SQLItem(
+        "snap_geom_section_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER snap_geom_section
+            BEFORE INSERT OR UPDATE OF geom ON network_section
+            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();
+        """,
+        r"""
+            DROP TRIGGER snap_geom_section ON network_section;
+        """,
+        dependencies=[("network", "snap_geom_to_grid")],
+    ),
+    SQLItem(
+        "snap_geom_tube_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER snap_geom_tube
+            BEFORE INSERT OR UPDATE OF geom ON network_tube
+            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();
+        """,
+        r"""
+            DROP TRIGGER snap_geom_tube ON network_tube;
+        """,
+        dependencies=[("network", "snap_geom_to_grid")],
+    ),
+    SQLItem(
+        "snap_geom_cable_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER snap_geom_cable
+            BEFORE INSERT OR UPDATE OF geom ON network_cable
+            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();
+        """,
+        r"""
+            DROP TRIGGER snap_geom_cable ON network_cable;
+        """,
+        dependencies=[("network", "snap_geom_to_grid")],
+    ),
+    SQLItem(
+        "snap_geom_station_trigger",
+        r"""
+        CREATE OR REPLACE TRIGGER snap_geom_station
+            BEFORE INSERT OR UPDATE OF geom ON network_station
+            FOR EACH ROW EXECUTE FUNCTION snap_geom_to_grid();
+        """,
+        r"""
+            DROP TRIGGER snap_geom_station ON network_station;
+        """,
+        dependencies=[("network", "snap_geom_to_grid")],
+    ),
+]
@@ -1,17 +1,67 @@
+import json
 import random
+import shutil
+import tempfile
 from math import cos, radians, sin
+from unittest import skipUnless
 
+import numpy as np
 from django.contrib.gis.geos import LineString, MultiLineString
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.utils import timezone
+from shapely import get_coordinates, normalize
 
-from kablo.core.utils import wkt_from_multiline
-from kablo.network.models import Cable, CableTube, Section, Track, Tube, TubeSection
+from kablo.core.utils import geodjango2shapely, wkt_from_multiline
+from kablo.network.cache import CacheInfo, LRUCache, offset_part_cache
+from kablo.network.export import STALE_AFTER, process_next_export, request_export
+from kablo.network.functions import CableGeom, TubeGeom
+from kablo.network.generator import NetworkGenerator
+from kablo.network.geometry import (
+    tube_geoms,
+    update_cable_geoms_sql,
+    update_tube_geoms_sql,
+)
+from kablo.network.importer import CodeMap, import_features, iter_features
+from kablo.network.lod import lod_level, scale_resolution
+from kablo.network.models import (
+    SECTION_ORDER_INDEX_STEP,
+    Cable,
+    CableTube,
+    ExportJob,
+    RecomputeTask,
+    Section,
+    SimplifiedGeometry,
+    TileCache,
+    Track,
+    Tube,
+    TubeSection,
+)
+from kablo.network.recompute import (
+    claim_tasks,
+    counting_recomputes,
+    deferred_recompute,
+    enqueue,
+    process_queue,
+    process_tasks,
+)
+from kablo.network.signals import set_geometry_grid
+from kablo.network.split import split_tracks
+from kablo.network.tiles import TILE_ORIGIN, prune_tile_cache, tile_size
+from kablo.valuelist.models import StatusType
 
 
 class TrackSectionTestCase(TestCase):
     def setUp(self):
         pass
 
+    def assertGeomAlmostEqual(self, geom1, geom2, tolerance=1e-6):
+        coords1 = get_coordinates(normalize(geodjango2shapely(geom1)), include_z=True)
+        coords2 = get_coordinates(normalize(geodjango2shapely(geom2)), include_z=True)
+        self.assertEqual(coords1.shape, coords2.shape)
+        self.assertTrue(np.allclose(coords1, coords2, atol=tolerance))
+
     # see https://stackoverflow.com/a/56773783/1548052
     @override_settings(DEBUG=True)
     def test_track_section_create_update(self):
@@ -43,6 +93,64 @@ class TrackSectionTestCase(TestCase):
             self.assertEqual(qs.count(), n_sections)
             # self.assertEqual(sections[0].geom, track.geom)
 
+    @override_settings(DEBUG=True)
+    def test_split_several_tracks(self):
+        x = 2508500
+        y = 1152000
+
+        tracks = []
+        for t in range(2):
+            lines = [
+                [(x + 10 * i, y + 20 * t + i) for i in range(3)],
+                [(x + 20 + 10 * i, y + 20 * t + 2 + i) for i in range(3)],
+            ]
+            tracks.append(Track.objects.create(geom=wkt_from_multiline(lines)))
+
+        # crosses the first section of both tracks
+        split_line = LineString([(x + 5, y - 10), (x + 5, y + 40)], srid=2056)
+        result = split_tracks(split_line)
+
+        # per track: the split section and the added part
+        self.assertEqual(result.tracks, 2)
+        self.assertEqual(result.sections, 4)
+
+        for track in tracks:
+            track.refresh_from_db()
+            sections = Section.objects.filter(track=track)
+            # the added part fits in the gap, the following section is left as is
+            self.assertEqual(
+                list(sections.values_list("order_index", flat=True)),
+                [0, SECTION_ORDER_INDEX_STEP // 2, SECTION_ORDER_INDEX_STEP],
+            )
+            self.assertEqual(len(track.geom), 3)
+            for section, part in zip(sections, track.geom):
+                self.assertTrue(section.geom.equals(part))
+
+    @override_settings(DEBUG=True)
+    def test_split_compacts_crowded_track(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=wkt_from_multiline([[(x + 10 * i, y) for i in range(20)]])
+        )
+        # each split cuts the first section, halving the gap that follows it,
+        # until there is no room left and the track gets compacted
+        for i in range(12):
+            split_x = x + 190 / 2 ** (i + 1)
+            split_line = LineString(
+                [(split_x, y - 10), (split_x, y + 10)],
+                srid=2056,
+            )
+            track.split(split_line)
+
+        order_indexes = list(
+            Section.objects.filter(track=track).values_list("order_index", flat=True)
+        )
+        self.assertEqual(len(order_indexes), 13)
+        self.assertEqual(order_indexes, sorted(set(order_indexes)))
+        self.assertEqual(len(track.geom), 13)
+
     @override_settings(DEBUG=True)
     def test_tube_geom(self):
         x = 2508500
@@ -137,6 +245,12 @@ class TrackSectionTestCase(TestCase):
                 offset_z=66,
             )
 
+            # the batch engine gives the same geometries as the computed field
+            batch_geoms = tube_geoms([tube12, tube1, tube2])
+            for tube in (tube12, tube1, tube2):
+                tube.refresh_from_db()
+                self.assertGeomAlmostEqual(batch_geoms[tube.id], tube.geom)
+
             for display_offset in (0, 1):
                 cable12 = Cable.objects.create()
                 for i, tube in enumerate((tube1, tube2)):
@@ -146,3 +260,671 @@ class TrackSectionTestCase(TestCase):
                         order_index=i,
                         display_offset=display_offset,
                     )
+
+    @override_settings(DEBUG=True)
+    def test_deferred_recompute(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 0), srid=2056),
+                LineString((x + 10, y, 0), (x + 20, y, 5), srid=2056),
+                srid=2056,
+            )
+        )
+
+        with deferred_recompute():
+            tube = Tube.objects.create()
+            for i, section in enumerate(track.section_set.all()):
+                TubeSection.objects.create(
+                    tube=tube, section=section, order_index=i, offset_x=100
+                )
+            cable = Cable.objects.create()
+            CableTube.objects.create(tube=tube, cable=cable)
+
+            # nothing is computed within the block
+            self.assertIsNone(Tube.objects.get(pk=tube.pk).geom)
+            self.assertIsNone(Cable.objects.get(pk=cable.pk).geom)
+
+        tube.refresh_from_db()
+        cable.refresh_from_db()
+        self.assertIsNotNone(tube.geom)
+        self.assertIsNotNone(cable.geom)
+
+    @override_settings(DEBUG=True)
+    def test_cable_recompute_count(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 0), srid=2056), srid=2056
+            )
+        )
+        tube = Tube.objects.create()
+        TubeSection.objects.create(tube=tube, section=track.section_set.first())
+        cable_tubes = []
+        for _ in range(3):
+            cable_tubes.append(
+                CableTube.objects.create(tube=tube, cable=Cable.objects.create())
+            )
+
+        # changing the offset of a cable only recomputes this cable
+        with counting_recomputes() as recomputes:
+            cable_tubes[0].display_offset = 5
+            cable_tubes[0].save()
+        self.assertEqual(recomputes["Cable"], 1)
+
+        # adding a cable shifts all the cables in the tube, each is computed once
+        with counting_recomputes() as recomputes, deferred_recompute():
+            CableTube.objects.create(tube=tube, cable=Cable.objects.create())
+        self.assertEqual(recomputes["Cable"], 4)
+        self.assertEqual(recomputes["Tube"], 0)
+
+    def test_sql_geometry_engine(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y + 5, 2), (x + 20, y, 4), srid=2056),
+                LineString((x + 20, y, 4), (x + 30, y - 10, 1), srid=2056),
+                srid=2056,
+            )
+        )
+        tube = Tube.objects.create()
+        for i, section in enumerate(track.section_set.all()):
+            TubeSection.objects.create(
+                tube=tube, section=section, order_index=i, offset_x=-150, offset_z=80
+            )
+        cables = []
+        for display_offset in range(3):
+            cable = Cable.objects.create()
+            CableTube.objects.create(
+                tube=tube, cable=cable, display_offset=display_offset
+            )
+            cables.append(cable)
+
+        # the database functions give the same geometries as the python engine
+        tube.refresh_from_db()
+        sql_geom = Tube.objects.values_list(TubeGeom("id"), flat=True).get(pk=tube.pk)
+        self.assertGeomAlmostEqual(sql_geom, tube.geom)
+        for cable in cables:
+            cable.refresh_from_db()
+            sql_geom = Cable.objects.values_list(CableGeom("id"), flat=True).get(
+                pk=cable.pk
+            )
+            self.assertGeomAlmostEqual(sql_geom, cable.geom)
+
+        # the set-based update stores them
+        python_geoms = {cable.pk: cable.geom for cable in cables}
+        Cable.objects.update(geom=None)
+        self.assertEqual(update_tube_geoms_sql([tube.pk]), 1)
+        self.assertEqual(update_cable_geoms_sql(Cable.objects.all()), 3)
+        for cable in Cable.objects.all():
+            self.assertGeomAlmostEqual(cable.geom, python_geoms[cable.pk])
+
+        # and the computed fields use them when the engine is selected
+        with self.settings(GEOMETRY_ENGINE="sql"):
+            CableTube.objects.filter(cable=cables[0]).update(display_offset=2)
+            cables[0].cabletube_set.first().save()
+        cables[0].refresh_from_db()
+        self.assertGeomAlmostEqual(cables[0].geom, python_geoms[cables[2].pk])
+
+    def test_offset_part_cache(self):
+        x = 2508500
+        y = 1152000
+
+        offset_part_cache.clear()
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 0), srid=2056), srid=2056
+            )
+        )
+        section = track.section_set.first()
+
+        # tubes sharing a section with the same offsets share the offset part
+        tubes = []
+        for _ in range(3):
+            tube = Tube.objects.create()
+            TubeSection.objects.create(tube=tube, section=section, offset_x=200)
+            tubes.append(tube)
+        self.assertEqual(offset_part_cache.info().misses, 1)
+        self.assertEqual(offset_part_cache.info().hits, 2)
+
+        # changing the section geometry invalidates its parts
+        section.geom = LineString((x, y, 0), (x + 20, y, 0), srid=2056)
+        section.save()
+        for tube in tubes:
+            tube.refresh_from_db()
+            self.assertAlmostEqual(tube.geom.coords[-1][0], x + 20)
+            self.assertAlmostEqual(tube.geom.coords[1][1], y + 0.2)
+
+        # least recently used values are evicted
+        cache = LRUCache(maxsize=2)
+        cache.get_or_compute("a", lambda: 1, owner="x")
+        cache.get_or_compute("b", lambda: 2, owner="y")
+        cache.get_or_compute("a", lambda: 1, owner="x")
+        cache.get_or_compute("c", lambda: 3, owner="y")
+        self.assertEqual(cache.get_or_compute("a", lambda: 0), 1)
+        self.assertEqual(cache.get_or_compute("b", lambda: 0), 0)
+        cache.invalidate("x")
+        self.assertEqual(cache.get_or_compute("a", lambda: 0), 0)
+        self.assertEqual(cache.info(), CacheInfo(hits=2, misses=5, size=2, maxsize=2))
+
+    @override_settings(RECOMPUTE_MODE="async")
+    def test_async_recompute(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 0), srid=2056), srid=2056
+            )
+        )
+        tube = Tube.objects.create()
+        tube_section = TubeSection.objects.create(
+            tube=tube, section=track.section_set.first()
+        )
+        cable = Cable.objects.create()
+        CableTube.objects.create(tube=tube, cable=cable)
+        tube.refresh_from_db()
+        cable.refresh_from_db()
+        tube_geom, cable_geom = tube.geom, cable.geom
+
+        # the edit only queues the tube, which is flagged as stale with its cables
+        with deferred_recompute():
+            tube_section.offset_x = 300
+            tube_section.save()
+        tube.refresh_from_db()
+        cable.refresh_from_db()
+        self.assertTrue(tube.stale)
+        self.assertTrue(cable.stale)
+        self.assertEqual(tube.geom, tube_geom)
+        self.assertEqual(RecomputeTask.objects.count(), 1)
+
+        response = self.client.get("/network/recompute/status/")
+        self.assertEqual(response.json()["pending"], {"tube": 1, "cable": 0})
+
+        # the worker recomputes the tube and its cables
+        self.assertEqual(process_queue(), 1)
+        self.assertEqual(process_queue(), 0)
+        tube.refresh_from_db()
+        cable.refresh_from_db()
+        self.assertFalse(tube.stale)
+        self.assertFalse(cable.stale)
+        self.assertAlmostEqual(tube.geom.coords[1][1], y + 0.3)
+        self.assertNotEqual(cable.geom, cable_geom)
+
+    def test_queue_during_batch(self):
+        tube = Tube.objects.create()
+        enqueue({Tube: {tube.pk}})
+        tasks = claim_tasks()
+        self.assertEqual(len(tasks), 1)
+        # claimed by a worker
+        self.assertEqual(claim_tasks(), [])
+
+        # the tube is edited while the batch is processed
+        enqueue({Tube: {tube.pk}})
+        process_tasks(tasks)
+        tube.refresh_from_db()
+        self.assertTrue(tube.stale)
+        self.assertEqual(process_queue(), 1)
+        tube.refresh_from_db()
+        self.assertFalse(tube.stale)
+        self.assertFalse(RecomputeTask.objects.exists())
+
+    def test_recompute_network(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 1), srid=2056),
+                LineString((x + 10, y, 1), (x + 10, y + 10, 2), srid=2056),
+                srid=2056,
+            )
+        )
+        for offset_x in (-200, 200):
+            tube = Tube.objects.create()
+            for i, section in enumerate(track.section_set.all()):
+                TubeSection.objects.create(
+                    tube=tube, section=section, order_index=i, offset_x=offset_x
+                )
+            for display_offset in range(2):
+                CableTube.objects.create(
+                    tube=tube,
+                    cable=Cable.objects.create(),
+                    display_offset=display_offset,
+                )
+
+        tubes = {tube.id: tube for tube in Tube.objects.all()}
+        cables = {cable.id: cable for cable in Cable.objects.all()}
+        Tube.objects.update(geom=None, cable_count=0)
+        Cable.objects.update(geom=None)
+
+        call_command("recompute_network", processes=1, chunk_size=1)
+
+        for tube in Tube.objects.all():
+            self.assertEqual(tube.cable_count, 2)
+            self.assertGeomAlmostEqual(tube.geom, tubes[tube.id].geom)
+        for cable in Cable.objects.all():
+            self.assertGeomAlmostEqual(cable.geom, cables[cable.id].geom)
+
+    def test_section_profile(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 0), srid=2056),
+                LineString((x + 10, y, 0), (x + 20, y, 0), srid=2056),
+                srid=2056,
+            )
+        )
+        sections = list(track.section_set.all())
+        with deferred_recompute():
+            for offset_x in (-200, 0, 200):
+                tube = Tube.objects.create(diameter=120)
+                for i, section in enumerate(sections):
+                    TubeSection.objects.create(
+                        tube=tube, section=section, order_index=i, offset_x=offset_x
+                    )
+                for display_offset in range(3):
+                    CableTube.objects.create(
+                        tube=tube,
+                        cable=Cable.objects.create(identifier=f"c{display_offset}"),
+                        display_offset=display_offset,
+                    )
+
+        # the section, its tube sections with their tubes, and the cables
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/network/profile/json/{sections[0].id}/")
+        profile = response.json()
+        self.assertEqual(len(profile["tubes"]), 3)
+        tube = profile["tubes"][0]
+        self.assertEqual(tube["diameter"], 120)
+        self.assertEqual(set(tube["pos"]), {"x", "z"})
+        self.assertEqual(
+            [cable["identifier"] for cable in tube["cables"]], ["c0", "c1", "c2"]
+        )
+
+        # batch endpoint: by sections or by tube route
+        response = self.client.get(
+            f"/network/profiles/?sections={sections[0].id},{sections[1].id}"
+        )
+        profiles = response.json()["profiles"]
+        self.assertEqual(
+            [profile["section"] for profile in profiles],
+            [str(sections[0].id), str(sections[1].id)],
+        )
+        self.assertEqual(profiles[0]["tubes"], profile["tubes"])
+
+        response = self.client.get(f"/network/profiles/?tube={tube['id']}")
+        self.assertEqual(len(response.json()["profiles"]), 2)
+
+        response = self.client.get("/network/profiles/?sections=foo")
+        self.assertEqual(response.status_code, 400)
+
+    def test_profile_at_distance(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 1), (x + 20, y, 2), srid=2056),
+                srid=2056,
+            )
+        )
+        section = track.section_set.first()
+        tube = Tube.objects.create()
+        TubeSection.objects.create(
+            tube=tube, section=section, offset_x=300, offset_z=-500
+        )
+
+        # the actual position matches the nominal offsets along the section
+        response = self.client.get(f"/network/profile/json/{section.id}/10/")
+        pos = response.json()["tubes"][0]["pos"]
+        self.assertAlmostEqual(pos["x"], 300, places=3)
+        self.assertAlmostEqual(pos["z"], -500, places=3)
+
+        # no distance: the nominal offsets
+        response = self.client.get(f"/network/profile/json/{section.id}/0/")
+        self.assertEqual(response.json()["tubes"][0]["pos"], {"x": 300, "z": -500})
+
+        response = self.client.get(
+            f"/network/longitudinal-profile/section/{section.id}/?step=0.5"
+        )
+        profile = response.json()
+        self.assertEqual(len(profile["chainage"]), 41)
+        self.assertEqual(profile["chainage"][-1], 20)
+        self.assertAlmostEqual(profile["z"][15], 0.75)
+        self.assertAlmostEqual(profile["y"][15], y)
+
+        response = self.client.get(
+            f"/network/longitudinal-profile/tube/{tube.id}/?step=0"
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            f"/network/longitudinal-profile/section/{section.id}/?step=1e-6"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_section_profile_html_cache(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 10, y, 0), srid=2056), srid=2056
+            )
+        )
+        section = track.section_set.first()
+        tube = Tube.objects.create()
+        tube_section = TubeSection.objects.create(tube=tube, section=section)
+        CableTube.objects.create(tube=tube, cable=Cable.objects.create())
+
+        url = f"/network/profile/html/{section.id}/"
+        response = self.client.get(url)
+        # plotly.js is not inlined
+        self.assertLess(len(response.content), 100_000)
+
+        # cached: only the section and the cache key are queried
+        with self.assertNumQueries(3):
+            cached_response = self.client.get(url)
+        self.assertEqual(cached_response.content, response.content)
+
+        tube_section.offset_x = 500
+        tube_section.save()
+        self.assertNotEqual(self.client.get(url).content, response.content)
+
+    def test_vector_tiles(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 100, y + 100, 0), srid=2056), srid=2056
+            )
+        )
+        # tile containing the track at zoom 12 (125 m tiles)
+        z = 12
+        tile_x = int((x - TILE_ORIGIN[0]) // tile_size(z))
+        tile_y = int((TILE_ORIGIN[1] - y) // tile_size(z))
+        url = f"/tiles/track/{z}/{tile_x}/{tile_y}.mvt"
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+        self.assertGreater(len(response.content), 0)
+        self.assertEqual(TileCache.objects.count(), 1)
+
+        # served from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).content, response.content)
+
+        # updates of columns which are not drawn keep the tile
+        Track.objects.filter(pk=track.pk).update(original_id="foo")
+        self.assertEqual(TileCache.objects.count(), 1)
+
+        # a change within the tile bounds invalidates it, not the tiles of other layers
+        self.client.get(f"/tiles/station/{z}/{tile_x}/{tile_y}.mvt")
+        track.geom = MultiLineString(
+            LineString((x, y, 0), (x + 50, y + 100, 0), srid=2056), srid=2056
+        )
+        track.save()
+        self.assertEqual(
+            list(TileCache.objects.values_list("layer", flat=True)), ["station"]
+        )
+
+        # the oldest tiles are evicted
+        self.client.get(url)
+        self.assertEqual(prune_tile_cache(1), 1)
+        self.assertEqual(
+            list(TileCache.objects.values_list("layer", flat=True)), ["track"]
+        )
+
+        # the cables drawn in the tube tiles, swapped without changing the cable count
+        tube = Tube.objects.create()
+        TubeSection.objects.create(tube=tube, section=track.section_set.first())
+        cable_tube = CableTube.objects.create(tube=tube, cable=Cable.objects.create())
+        tube_url = f"/tiles/tube/{z}/{tile_x}/{tile_y}.mvt"
+        self.assertGreater(len(self.client.get(tube_url).content), 0)
+        self.assertTrue(TileCache.objects.filter(layer="tube").exists())
+        CableTube.objects.filter(pk=cable_tube.pk).update(cable=Cable.objects.create())
+        self.assertFalse(TileCache.objects.filter(layer="tube").exists())
+
+        # the sections of a soft-deleted track are hidden, and their tiles invalidated
+        section_url = f"/tiles/section/{z}/{tile_x}/{tile_y}.mvt"
+        self.assertGreater(len(self.client.get(section_url).content), 0)
+        Track.all_objects.filter(pk=track.pk).update(deleted_at=timezone.now())
+        self.assertFalse(TileCache.objects.filter(layer="section").exists())
+        self.assertEqual(self.client.get(section_url).content, b"")
+
+        # empty tile far away, and below the minimum zoom of the layer
+        self.assertEqual(self.client.get("/tiles/track/12/0/0.mvt").content, b"")
+        self.assertEqual(self.client.get("/tiles/cable/2/0/0.mvt").content, b"")
+        self.assertEqual(self.client.get("/tiles/foo/2/0/0.mvt").status_code, 404)
+
+    def test_simplified_geometries(self):
+        x = 2508500
+        y = 1152000
+
+        # a straight track, 1 km long, with a vertex every meter wiggling by 0.2 m
+        line = LineString(
+            [(x + i, y + 0.2 * (i % 2), 0) for i in range(1000)], srid=2056
+        )
+        track = Track.objects.create(geom=MultiLineString(line, srid=2056))
+        simplified = SimplifiedGeometry.objects.filter(object_id=track.id)
+        self.assertEqual(
+            list(simplified.order_by("level").values_list("level", flat=True)),
+            [1, 2, 3],
+        )
+        self.assertEqual(simplified.get(level=1).geom.num_coords, 2)
+
+        # recomputed when the geometry changes only
+        track.geom = MultiLineString(
+            LineString((x, y, 0), (x, y + 100, 0), (x + 100, y + 100, 0), srid=2056),
+            srid=2056,
+        )
+        track.save()
+        self.assertEqual(simplified.get(level=3).geom.num_coords, 3)
+        simplified_id = simplified.get(level=3).id
+        track.save()
+        self.assertEqual(simplified.get(level=3).id, simplified_id)
+
+        track.delete()
+        self.assertFalse(simplified.exists())
+
+        self.assertEqual(lod_level(0.1), 0)
+        self.assertEqual(lod_level(3), 2)
+        self.assertEqual(lod_level(scale_resolution(1000000)), 3)
+
+    @skipUnless(shutil.which("ogr2ogr"), "ogr2ogr is not installed")
+    def test_export(self):
+        x = 2508500
+        y = 1152000
+
+        track = Track.objects.create(
+            geom=MultiLineString(
+                LineString((x, y, 0), (x + 100, y + 100, 0), srid=2056), srid=2056
+            )
+        )
+        with tempfile.TemporaryDirectory() as export_dir, override_settings(
+            EXPORT_DIR=export_dir
+        ):
+            response = self.client.post("/network/exports/?format=gpkg")
+            self.assertEqual(response.status_code, 202)
+            job_id = response.json()["id"]
+            self.assertEqual(process_next_export().status, "done")
+            status = self.client.get(f"/network/exports/{job_id}/").json()
+            self.assertEqual(status["progress"], 100)
+
+            # kept until the data changes
+            response = self.client.post("/network/exports/?format=gpkg")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["id"], job_id)
+
+            url = f"/network/exports/{job_id}/download"
+            response = self.client.get(url, headers={"range": "bytes=0-15"})
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response["Content-Range"], f"bytes 0-15/{status['size']}")
+            self.assertEqual(
+                b"".join(response.streaming_content), b"SQLite format 3\x00"
+            )
+            response = self.client.get(
+                url, headers={"range": f"bytes={status['size']}-"}
+            )
+            self.assertEqual(response.status_code, 416)
+
+            track.save()
+            response = self.client.post("/network/exports/?format=gpkg")
+            self.assertEqual(response.status_code, 202)
+            self.assertNotEqual(response.json()["id"], job_id)
+
+    def test_export_failures(self):
+        job = request_export("gpkg")
+        self.assertEqual(request_export("gpkg"), job)
+
+        # left running by a stopped worker
+        ExportJob.objects.filter(pk=job.pk).update(
+            status="running", updated_at=timezone.now() - STALE_AFTER
+        )
+        queued = request_export("gpkg")
+        self.assertNotEqual(queued, job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+
+        # any error fails the job
+        ExportJob.objects.filter(pk=queued.pk).update(format="foo")
+        self.assertEqual(process_next_export().status, "failed")
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, "failed")
+        self.assertIn("foo", queued.error)
+        self.assertIsNone(process_next_export())
+
+    def test_snap_geometries_to_grid(self):
+        line = LineString((2508500.12345, 1152000.6789, 0.5555), (2508510, 1152010, 0))
+        geom = MultiLineString(line, srid=2056)
+
+        with override_settings(GEOMETRY_GRID_SIZE=0.01):
+            set_geometry_grid(None, connection)
+        try:
+            track = Track.objects.create(geom=geom)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('kablo.geometry_grid', '', false)")
+        track.refresh_from_db()
+        snapped = (2508500.12, 1152000.68, 0.56)
+        self.assertTrue(np.allclose(track.geom.coords[0][0], snapped))
+        # the sections are snapped as well
+        self.assertTrue(np.allclose(track.section_set.get().geom.coords[0], snapped))
+
+        # not snapped without grid
+        track = Track.objects.create(geom=geom)
+        track.refresh_from_db()
+        self.assertEqual(track.geom.coords[0][0], line.coords[0])
+
+    def test_import_features(self):
+        x = 2508500
+        y = 1152000
+
+        StatusType.objects.create(code=1, name_fr="inconnu")
+        in_service = StatusType.objects.create(code=2, name_fr="en service")
+        statuses = CodeMap(StatusType)
+        self.assertEqual(statuses[2], in_service.pk)
+        self.assertEqual(statuses[42], statuses[1])
+
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "MultiLineString",
+                    "coordinates": [
+                        [[x + i, y, 0], [x + i, y + 10, 0]],
+                        [[x + i, y + 10, 0], [x + i + 10, y + 10, 0]],
+                    ],
+                },
+                "properties": {"globalid": f"track-{i}"},
+            }
+            for i in range(5)
+        ]
+        features.append({"type": "Feature", "geometry": None, "properties": {}})
+        with tempfile.NamedTemporaryFile("w", suffix=".geojson") as file:
+            json.dump({"type": "FeatureCollection", "features": features}, file)
+            file.flush()
+
+            def build(chunk):
+                return [
+                    Track(
+                        geom=MultiLineString(
+                            *(
+                                LineString(part, srid=2056)
+                                for part in feature["geometry"]["coordinates"]
+                            ),
+                            srid=2056,
+                        ),
+                        original_id=feature["properties"]["globalid"],
+                    )
+                    for feature in chunk
+                    if feature["geometry"]
+                ]
+
+            def create_sections(tracks):
+                Section.objects.bulk_create(
+                    [section for track in tracks for section in track.build_sections()]
+                )
+
+            report = import_features(
+                "tracks",
+                Track,
+                iter_features(file.name),
+                build,
+                after_chunk=create_sections,
+                chunk_size=2,
+            )
+
+        self.assertEqual((report.rows, report.skipped), (5, 1))
+        self.assertIn("5 tracks imported", str(report))
+        self.assertEqual(Track.objects.count(), 5)
+        self.assertEqual(Section.objects.count(), 10)
+        self.assertEqual(
+            list(
+                Section.objects.filter(track__original_id="track-0").values_list(
+                    "order_index", flat=True
+                )
+            ),
+            [0, SECTION_ORDER_INDEX_STEP],
+        )
+
+    def test_generate_network(self):
+        def network():
+            return (
+                set(Track.objects.values_list("id", "geom")),
+                set(TubeSection.objects.values_list("id", "tube", "section")),
+                set(CableTube.objects.values_list("id", "cable", "tube")),
+            )
+
+        result = NetworkGenerator(40, seed=1).generate()
+        self.assertEqual(result.sections, 40)
+        self.assertEqual(Section.objects.count(), 40)
+        self.assertEqual(Tube.objects.count(), result.tubes)
+        self.assertEqual(CableTube.objects.count(), result.cable_tubes)
+        # tubes spanning several sections, computed geometries and cable counts
+        self.assertGreater(TubeSection.objects.count(), result.tubes)
+        self.assertFalse(Tube.objects.filter(geom__isnull=True).exists())
+        self.assertFalse(Cable.objects.filter(geom__isnull=True).exists())
+        for tube in Tube.objects.all():
+            self.assertEqual(tube.cable_count, tube.cabletube_set.count())
+        # cables through several tubes, which are chained
+        self.assertTrue(CableTube.objects.filter(order_index__gt=0).exists())
+        for cable in Cable.objects.all():
+            self.assertEqual(cable.geom.geom_type, "LineString")
+
+        # the same network is generated again from the same seed
+        generated = network()
+        Track.objects.all().delete()
+        Tube.objects.all().delete()
+        Cable.objects.all().delete()
+        NetworkGenerator(40, seed=1).generate()
+        self.assertEqual(network(), generated)
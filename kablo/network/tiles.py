@@ -0,0 +1,218 @@
+import logging
+from itertools import count
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+
+from kablo.network.lod import SIMPLIFIED_MODELS, lod_level
+from kablo.network.models import Cable, Section, Station, TileCache, Track, Tube
+
+logger = logging.getLogger(__name__)
+
+# tile grid in EPSG:2056: the zoom 0 tile covers Switzerland,
+# each zoom level splits the tiles in 4 (y goes down from the origin)
+TILE_ORIGIN = (2420000, 1350000)
+TILE_SIZE_Z0 = 512000
+TILE_MAX_ZOOM = 16
+# MVT coordinates per tile side, and buffer around the tiles (in the same unit)
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+# tiles rendered between two evictions from the tile cache, per process
+PRUNE_INTERVAL = 100
+
+_misses = count(1)
+
+
+class TileLayer(NamedTuple):
+    model: type
+    # the layer is empty below this zoom
+    min_zoom: int
+    # SQL expressions of the attributes, by name ("t" is the feature row)
+    attributes: dict[str, str]
+    # additional attributes from this zoom
+    detail_zoom: int = 0
+    detail_attributes: dict[str, str] = {}
+    # the geometries are simplified to the tile resolution below this zoom,
+    # the simplified geometries of the level of detail are used when there are some
+    simplify_below: int = 0
+    # SQL condition of the drawn features
+    where: str = ""
+
+
+TILE_LAYERS = {
+    "track": TileLayer(
+        Track,
+        min_zoom=0,
+        attributes={"id": "t.id"},
+        simplify_below=10,
+    ),
+    "section": TileLayer(
+        Section,
+        min_zoom=10,
+        attributes={"id": "t.id", "track_id": "t.track_id"},
+        detail_zoom=13,
+        detail_attributes={"order_index": "t.order_index"},
+        # not the sections of the soft-deleted tracks
+        where=(
+            "EXISTS (SELECT FROM network_track track "
+            "WHERE track.id = t.track_id AND track.deleted_at IS NULL)"
+        ),
+    ),
+    "tube": TileLayer(
+        Tube,
+        min_zoom=8,
+        attributes={"id": "t.id"},
+        detail_zoom=12,
+        detail_attributes={
+            "diameter": "t.diameter",
+            "cable_count": "t.cable_count",
+            "cables": (
+                "(SELECT string_agg(cable_tube.cable_id::text, ',') "
+                "FROM network_cabletube cable_tube WHERE cable_tube.tube_id = t.id)"
+            ),
+        },
+        simplify_below=12,
+    ),
+    "cable": TileLayer(
+        Cable,
+        min_zoom=10,
+        attributes={"id": "t.id"},
+        detail_zoom=13,
+        detail_attributes={"identifier": "t.identifier"},
+    ),
+    "station": TileLayer(
+        Station,
+        min_zoom=6,
+        attributes={"id": "t.id"},
+        detail_zoom=10,
+        detail_attributes={"label": "t.label"},
+    ),
+}
+
+
+def tile_size(z: int) -> float:
+    return TILE_SIZE_Z0 / 2**z
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    size = tile_size(z)
+    xmin = TILE_ORIGIN[0] + x * size
+    ymax = TILE_ORIGIN[1] - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def render_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    """
+    Mapbox vector tile of the layer, the geometries stay in EPSG:2056
+    """
+    tile_layer = TILE_LAYERS[layer]
+    if z < tile_layer.min_zoom:
+        return b""
+
+    attributes = dict(tile_layer.attributes)
+    if z >= tile_layer.detail_zoom:
+        attributes.update(tile_layer.detail_attributes)
+    columns = ", ".join(f'{sql} AS "{name}"' for name, sql in attributes.items())
+
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+    params = {
+        "layer": layer,
+        "xmin": xmin,
+        "ymin": ymin,
+        "xmax": xmax,
+        "ymax": ymax,
+        "buffer": tile_size(z) * MVT_BUFFER / MVT_EXTENT,
+        "tolerance": tile_size(z) / MVT_EXTENT,
+    }
+    # precomputed simplified geometries, when they are not visible at this zoom
+    model_name = tile_layer.model.__name__
+    level = lod_level(params["tolerance"]) if model_name in SIMPLIFIED_MODELS else 0
+    join = ""
+    geom = "ST_Force2D(t.geom)"
+    if level:
+        params.update(model=model_name, level=level)
+        join = (
+            "LEFT JOIN network_simplifiedgeometry lod "
+            "ON lod.model = %(model)s AND lod.object_id = t.id AND lod.level = %(level)s"
+        )
+        geom = "ST_Force2D(COALESCE(lod.geom, t.geom))"
+    if z < tile_layer.simplify_below:
+        geom = f"ST_Simplify({geom}, %(tolerance)s)"
+    # the features soft-deleted by the import synchronization are hidden
+    where = f"AND {tile_layer.where}" if tile_layer.where else ""
+    if any(field.name == "deleted_at" for field in tile_layer.model._meta.fields):
+        where += " AND t.deleted_at IS NULL"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH bounds AS (
+                SELECT ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 2056) AS geom
+            )
+            SELECT ST_AsMVT(tile, %(layer)s, {MVT_EXTENT}, 'geom')
+            FROM (
+                SELECT
+                    ST_AsMVTGeom(
+                        {geom}, bounds.geom::box2d, {MVT_EXTENT}, {MVT_BUFFER}, true
+                    ) AS geom,
+                    {columns}
+                FROM {tile_layer.model._meta.db_table} AS t
+                CROSS JOIN bounds
+                {join}
+                WHERE t.geom && ST_Expand(bounds.geom, %(buffer)s) {where}
+            ) AS tile
+            WHERE tile.geom IS NOT NULL
+            """,
+            params,
+        )
+        data = cursor.fetchone()[0]
+    return bytes(data or b"")
+
+
+def get_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    """
+    Vector tile from the cache, rendered and cached on a miss.
+    The cached tiles are deleted by triggers when features in their bounds change.
+    """
+    cached = (
+        TileCache.objects.filter(layer=layer, z=z, x=x, y=y)
+        .values_list("tile", flat=True)
+        .first()
+    )
+    if cached is not None:
+        return bytes(cached)
+
+    data = render_tile(layer, z, x, y)
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+    # the bounds include the buffer: features drawn in it invalidate the tile too
+    buffer = tile_size(z) * MVT_BUFFER / MVT_EXTENT
+    bbox = Polygon.from_bbox(
+        (xmin - buffer, ymin - buffer, xmax + buffer, ymax + buffer)
+    )
+    bbox.srid = 2056
+    TileCache.objects.bulk_create(
+        [TileCache(layer=layer, z=z, x=x, y=y, tile=data, bbox=bbox)],
+        ignore_conflicts=True,
+    )
+    logger.debug(f"tile {layer}/{z}/{x}/{y} rendered: {len(data)} bytes")
+    if next(_misses) % PRUNE_INTERVAL == 0:
+        prune_tile_cache(settings.TILE_CACHE_MAX_TILES)
+    return data
+
+
+def prune_tile_cache(max_tiles: int) -> int:
+    """
+    Evict the oldest rendered tiles beyond `max_tiles`, returns the number of evicted tiles
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM network_tilecache WHERE id <= (
+                SELECT id FROM network_tilecache ORDER BY id DESC OFFSET %s LIMIT 1
+            )
+            """,
+            [max_tiles],
+        )
+        return cursor.rowcount
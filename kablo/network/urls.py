@@ -8,4 +8,13 @@ urlpatterns = [
         "profile/<slug:_format>/<slug:section_id>/<int:distance>/",
         views.section_profile,
     ),
+    path("profiles/", views.section_profiles_batch),
+    path(
+        "longitudinal-profile/<slug:_type>/<uuid:object_id>/",
+        views.longitudinal_profile,
+    ),
+    path("recompute/status/", views.recompute_status),
+    path("exports/", views.exports),
+    path("exports/<uuid:job_id>/", views.export_status),
+    path("exports/<uuid:job_id>/download", views.export_download),
 ]
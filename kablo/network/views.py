@@ -1,196 +1,387 @@
-import json
+import hashlib
 import math
-from typing import NamedTuple
-
-import plotly.graph_objects as go
-from django.http import JsonResponse
+import os
+import re
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Prefetch
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, render
-
-from kablo.network.models import Section
-
-
-def _min(current, offset, diameter):
-    if not current:
-        return offset - diameter / 2
-    return min(current, offset - diameter / 2)
-
-
-def _max(current, offset, diameter):
-    if not current:
-        return offset + diameter / 2
-    return max(current, offset + diameter / 2)
-
-
-class _Pos(NamedTuple):
-    x: int
-    z: int
-
-
-class _Cable(NamedTuple):
-    id: str
-    identifier: str
-    pos: _Pos
-
-
-class _Tube(NamedTuple):
-    id: str
-    diameter: int
-    pos: _Pos
-    offset_x: int
-    offset_z: int
-    cables: list[_Cable]
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+
+from kablo.core.utils import geodjango2shapely, geodjango2shapely_many
+from kablo.network.export import EXPORT_FORMATS, network_watermark, request_export
+from kablo.network.models import (
+    CableTube,
+    ExportJob,
+    RecomputeTask,
+    Section,
+    Tube,
+    TubeSection,
+)
+from kablo.network.profile import (
+    ProfileCable,
+    ProfilePos,
+    ProfileTube,
+    cross_section_offsets,
+    render_profile,
+    sample_line,
+    sampling_chainages,
+)
+from kablo.network.tiles import TILE_LAYERS, TILE_MAX_ZOOM, get_tile
+
+# the cache key changes with the profile content
+PROFILE_CACHE_TIMEOUT = 60 * 60 * 24
+# points of a longitudinal profile
+MAX_PROFILE_SAMPLES = 100000
+# single byte range of the downloads
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _as_json(value):
+    # named tuples as objects, recursively
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {key: _as_json(item) for key, item in value._asdict().items()}
+    if isinstance(value, list):
+        return [_as_json(item) for item in value]
+    return value
+
+
+def _profile_tube(tube_section: TubeSection, pos: ProfilePos = None) -> ProfileTube:
+    """
+    The tube is drawn at its nominal offsets, unless its actual position `pos` is given
+    """
+    tube_pos_x = tube_section.offset_x if pos is None else pos.x
+    tube_pos_z = tube_section.offset_z if pos is None else pos.z
+
+    _diameter = tube_section.tube.diameter or 100
+
+    cables_data = []
+    _cables: list[ProfileCable] = []
+    for cable_tube in tube_section.tube.cabletube_set.all():
+        cables_data.append((str(cable_tube.cable.id), cable_tube.cable.identifier))
+
+    # display the cables in a grid within the tube
+    n_cables = len(cables_data)
+    if n_cables > 0:
+        # we prefer more cols than rows (cols is max rows+1)
+        cols = math.ceil(math.sqrt(n_cables))
+        # potentially, if we have more cols than rows, we could have a rectangle grid instead of a squared one
+        grid_max_size = _diameter * math.sqrt(2) / 2
+        cell_max_size = grid_max_size / cols
+        start_x = tube_pos_x - grid_max_size / 2
+        start_z = tube_pos_z + grid_max_size / 2
+        for i, cable in enumerate(cables_data):
+            row = math.floor(i / cols)
+            col = i - row * cols
+            cable_pos_x = start_x + (col + 0.5) * cell_max_size
+            cable_pos_z = start_z - (row + 0.5) * cell_max_size
+            _cable = ProfileCable(
+                id=cable[0],
+                identifier=cable[1],
+                pos=ProfilePos(cable_pos_x, cable_pos_z),
+            )
+            _cables.append(_cable)
+
+    return ProfileTube(
+        id=tube_section.tube.id,
+        diameter=_diameter,
+        pos=ProfilePos(
+            x=tube_pos_x,
+            z=tube_pos_z,
+        ),
+        offset_x=tube_section.offset_x,
+        offset_z=tube_section.offset_z,
+        cables=_cables,
+    )
+
+
+def _profile_tube_sections(section_ids: list):
+    # tube sections, their tubes, then the cables of the tubes: 2 queries
+    return (
+        TubeSection.objects.filter(section_id__in=section_ids)
+        .select_related("tube")
+        .order_by("order_index", "id")
+        .prefetch_related(
+            Prefetch(
+                "tube__cabletube_set",
+                queryset=CableTube.objects.select_related("cable").order_by(
+                    "order_index"
+                ),
+            )
+        )
+    )
+
+
+def section_profiles(section_ids: list) -> dict[uuid.UUID, list[ProfileTube]]:
+    """
+    Profiles (tubes and their cables) of many sections, by section id.
+    The number of queries does not depend on the number of tubes and cables.
+    """
+    profiles = {section_id: [] for section_id in section_ids}
+    for tube_section in _profile_tube_sections(section_ids):
+        profiles[tube_section.section_id].append(_profile_tube(tube_section))
+    return profiles
+
+
+def section_profiles_batch(request):
+    """
+    Profiles of many sections, given by `?sections=<id>,<id>,...`,
+    or of every section of a tube route, given by `?tube=<id>`.
+    """
+    try:
+        if "tube" in request.GET:
+            tube = get_object_or_404(Tube, id=uuid.UUID(request.GET["tube"]))
+            section_ids = tube.tubesection_set.order_by("order_index").values_list(
+                "section_id", flat=True
+            )
+        else:
+            section_ids = [
+                uuid.UUID(section_id)
+                for section_id in request.GET.get("sections", "").split(",")
+                if section_id
+            ]
+    except ValueError:
+        return HttpResponseBadRequest("Invalid id")
+
+    profiles = section_profiles(list(dict.fromkeys(section_ids)))
+    return JsonResponse(
+        {
+            "profiles": [
+                {"section": section_id, "tubes": _as_json(tubes)}
+                for section_id, tubes in profiles.items()
+            ]
+        }
+    )
+
+
+def _section_profile_tubes(section: Section, distance: int = 0) -> list[ProfileTube]:
+    tube_sections = list(_profile_tube_sections([section.id]))
+    if not distance:
+        return [_profile_tube(tube_section) for tube_section in tube_sections]
+
+    # cross-section at the given chainage (m), from the actual tube geometries
+    offsets = cross_section_offsets(
+        geodjango2shapely(section.geom),
+        distance,
+        geodjango2shapely_many(ts.tube.geom for ts in tube_sections),
+    )
+    return [
+        _profile_tube(tube_section, None if np.isnan(x) else ProfilePos(x=x, z=z))
+        for tube_section, (x, z) in zip(tube_sections, offsets.tolist())
+    ]
+
+
+def _profile_cache_key(section: Section, distance: int) -> str:
+    # any change of the tubes or cables going through the section changes the key
+    tube_sections = TubeSection.objects.filter(section=section).aggregate(
+        count=Count("id"),
+        updated_at=Max("updated_at"),
+        tube_updated_at=Max("tube__updated_at"),
+    )
+    cable_tubes = CableTube.objects.filter(
+        tube__tubesection__section=section
+    ).aggregate(
+        count=Count("id"),
+        updated_at=Max("updated_at"),
+        cable_updated_at=Max("cable__updated_at"),
+    )
+    version = hashlib.md5(
+        repr((section.updated_at, tube_sections, cable_tubes)).encode()
+    ).hexdigest()
+    return f"section-profile:{section.id}:{distance}:{version}"
 
 
 def section_profile(request, section_id, distance: int = 0, _format="json"):
 
     section = get_object_or_404(Section, id=section_id)
-    qs = section.tubesection_set.all()
-
-    x_min = None
-    x_max = None
-    z_min = None
-    z_max = None
-
-    _tubes: list[_Tube] = []
-
-    for tube_section in qs:
-
-        tube_pos_x = tube_section.offset_x
-        tube_pos_z = tube_section.offset_z
-
-        _diameter = tube_section.tube.diameter or 100
-
-        cables_data = []
-        _cables: list[_Cable] = []
-        cable_tube_qs = tube_section.tube.cabletube_set.all()
-        for cable_tube in cable_tube_qs:
-            cables_data.append((str(cable_tube.cable.id), cable_tube.cable.identifier))
-
-        # display the cables in a grid within the tube
-        n_cables = len(cables_data)
-        if n_cables > 0:
-            # we prefer more cols than rows (cols is max rows+1)
-            cols = math.ceil(math.sqrt(n_cables))
-            rows = math.ceil(n_cables / cols)
-            # potentially, if we have more cols than rows, we could have a rectangle grid instead of a squared one
-            grid_max_size = _diameter * math.sqrt(2) / 2
-            cell_max_size = grid_max_size / cols
-            start_x = tube_pos_x - grid_max_size / 2
-            start_z = tube_pos_z + grid_max_size / 2
-            for i, cable in enumerate(cables_data):
-                row = math.floor(i / cols)
-                col = i - row * cols
-                cable_pos_x = start_x + (col + 0.5) * cell_max_size
-                cable_pos_z = start_z - (row + 0.5) * cell_max_size
-                _cable = _Cable(
-                    id=cable[0], identifier=cable[1], pos=_Pos(cable_pos_x, cable_pos_z)
-                )
-                _cables.append(_cable)
-
-        _tube = _Tube(
-            id=tube_section.tube.id,
-            diameter=_diameter,
-            pos=_Pos(
-                x=tube_pos_x,
-                z=tube_pos_z,
-            ),
-            offset_x=tube_section.offset_x,
-            offset_z=tube_section.offset_z,
-            cables=_cables,
-        )
-        _tubes.append(_tube)
-
-        x_min = _min(
-            x_min,
-            tube_section.offset_x,
-            _diameter,
-        )
-        x_max = _max(
-            x_max,
-            tube_section.offset_x,
-            _diameter,
-        )
-        z_min = _min(
-            z_min,
-            tube_section.offset_z,
-            _diameter,
-        )
-        z_max = _max(
-            z_max,
-            tube_section.offset_z,
-            _diameter,
-        )
 
     if _format == "json":
-        return JsonResponse({"section": section_id, "tubes": json.dumps(_tubes)})
+        _tubes = _section_profile_tubes(section, distance)
+        return JsonResponse(
+            {"section": section_id, "distance": distance, "tubes": _as_json(_tubes)}
+        )
 
     else:
-        fig = go.Figure()
-
-        fig.update_layout(
-            plot_bgcolor="white",
-            showlegend=False,
-            autosize=True,
-            width=600,
-            height=600,
-        )
+        cache_key = _profile_cache_key(section, distance)
+        profile = cache.get(cache_key)
+        if profile is None:
+            profile = render_profile(_section_profile_tubes(section, distance))
+            cache.set(cache_key, profile, PROFILE_CACHE_TIMEOUT)
+        context = {"profile": profile}
+        return render(request, "profile.html", context)
 
-        fig.update_xaxes(
-            range=[x_min, x_max],
-            showgrid=False,
-        )
-        fig.update_yaxes(
-            range=[z_min, z_max],
-            showgrid=False,
-        )
 
-        tubes_x = []
-        tubes_y = []
-        tubes_customdata = []
-        tubes_size = []
-        for _tube in _tubes:
-            tubes_x.append(_tube.pos.x)
-            tubes_y.append(_tube.pos.z)
-            tubes_customdata.append(
-                [f"<b>{_tube.id}</b><br>Diameter: {_tube.diameter}"]
-            )
-            tubes_size.append(_tube.diameter / 2)
-        fig.add_trace(
-            go.Scatter(
-                x=tubes_x,
-                y=tubes_y,
-                marker=dict(color="aquamarine", size=tubes_size),
-                mode="markers",
-                customdata=tubes_customdata,
-                hovertemplate="<b>%{customdata[0]}</b><br>",
-            )
+def recompute_status(request):
+    """
+    Number of tubes and cables waiting for the recompute worker
+    """
+    pending = {"tube": 0, "cable": 0}
+    for row in RecomputeTask.objects.values("model").annotate(count=Count("id")):
+        pending[row["model"]] = row["count"]
+    oldest = RecomputeTask.objects.aggregate(oldest=Min("created_at"))["oldest"]
+    return JsonResponse(
+        {
+            "mode": settings.RECOMPUTE_MODE,
+            "pending": pending,
+            "oldest": oldest.isoformat() if oldest else None,
+        }
+    )
+
+
+def longitudinal_profile(request, _type, object_id):
+    """
+    Profile along a tube or a section, sampled every `?step=` meters (1 by default)
+    """
+    model = {"tube": Tube, "section": Section}.get(_type)
+    if model is None:
+        raise Http404
+    try:
+        step = float(request.GET.get("step", 1))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid step")
+    if step <= 0:
+        return HttpResponseBadRequest("Invalid step")
+
+    geom = get_object_or_404(model, id=object_id).geom
+    if geom is None:
+        raise Http404
+    line = geodjango2shapely(geom)
+    if line.length / step > MAX_PROFILE_SAMPLES:
+        return HttpResponseBadRequest("Too many samples, increase the step")
+    chainages = sampling_chainages(line.length, step)
+    points = sample_line(line, chainages)
+    return JsonResponse(
+        {
+            _type: object_id,
+            "step": step,
+            "length": line.length,
+            "chainage": chainages.round(3).tolist(),
+            "x": points[:, 0].round(3).tolist(),
+            "y": points[:, 1].round(3).tolist(),
+            "z": points[:, 2].round(3).tolist(),
+        }
+    )
+
+
+def vector_tile(request, layer, z: int, x: int, y: int):
+    """
+    Mapbox vector tile of a layer, in the EPSG:2056 tile grid of kablo.network.tiles
+    """
+    if layer not in TILE_LAYERS or z > TILE_MAX_ZOOM:
+        raise Http404
+    return HttpResponse(
+        get_tile(layer, z, x, y), content_type="application/vnd.mapbox-vector-tile"
+    )
+
+
+def _export_status(request, job: ExportJob) -> dict:
+    status = {
+        "id": job.id,
+        "format": job.format,
+        "status": job.status,
+        "progress": job.progress,
+        "created_at": job.created_at.isoformat(),
+        "size": job.size,
+        "error": job.error or None,
+        "status_url": request.build_absolute_uri(f"/network/exports/{job.id}/"),
+    }
+    if job.status == "done":
+        status["download_url"] = request.build_absolute_uri(
+            f"/network/exports/{job.id}/download"
         )
-
-        for _tube in _tubes:
-            cables_x = []
-            cables_y = []
-            cables_customdata = []
-            for _cable in _tube.cables:
-                cables_x.append(_cable.pos.x)
-                cables_y.append(_cable.pos.z)
-                cables_customdata.append([f"<b>{_cable.identifier or _cable.id}</b>"])
-
-            fig.add_trace(
-                go.Scatter(
-                    x=cables_x,
-                    y=cables_y,
-                    marker=dict(color="red", size=8),
-                    mode="markers",
-                    customdata=cables_customdata,
-                    hovertemplate="<b>%{customdata[0]}</b><br>",
-                )
-            )
-
-        fig.update_yaxes(
-            scaleanchor="x",
-            scaleratio=1,
+    return status
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def exports(request):
+    """
+    POST `?format=gpkg|fgb` requests an export of the network: the current one if the
+    data has not changed since, a new one for the `export_worker` command otherwise.
+    GET lists the exports.
+    """
+    if request.method == "POST":
+        export_format = request.GET.get("format", request.POST.get("format", "gpkg"))
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest("Invalid format")
+        job = request_export(export_format)
+        return JsonResponse(
+            _export_status(request, job), status=200 if job.status == "done" else 202
         )
-
-        profile = fig.to_html()
-        context = {"profile": profile}
-        return render(request, "profile.html", context)
+    watermark = network_watermark()
+    jobs = [
+        {**_export_status(request, job), "outdated": job.watermark != watermark}
+        for job in ExportJob.objects.order_by("-created_at")
+    ]
+    return JsonResponse({"exports": jobs})
+
+
+@require_GET
+def export_status(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id)
+    return JsonResponse(_export_status(request, job))
+
+
+def _file_chunks(path: str, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+@require_GET
+def export_download(request, job_id):
+    """
+    File of a finished export, streamed with support of a single byte range
+    to resume the downloads
+    """
+    job = get_object_or_404(ExportJob, id=job_id, status="done")
+    if not os.path.exists(job.file):
+        raise Http404
+    size = os.path.getsize(job.file)
+    start, end, status = 0, size - 1, 200
+
+    # the file of a job never changes: the range applies to any former download
+    match = BYTE_RANGE.match(request.headers.get("Range", ""))
+    if match and match[1] + match[2]:
+        if match[1]:
+            start = int(match[1])
+            end = min(int(match[2]), size - 1) if match[2] else size - 1
+        else:
+            start = max(size - int(match[2]), 0)
+        if start > end:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        status = 206
+
+    response = StreamingHttpResponse(
+        _file_chunks(job.file, start, end - start + 1),
+        status=status,
+        content_type="application/octet-stream",
+    )
+    response["Content-Length"] = end - start + 1
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = f'"{job.id}"'
+    response[
+        "Content-Disposition"
+    ] = f'attachment; filename="{os.path.basename(job.file)}"'
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
@@ -97,6 +97,33 @@ DEFAULT_SITE = os.getenv("DEFAULT_SITE")
 # 2FA activation
 ENABLE_2FA = os.getenv("ENABLE_2FA", "false").lower() == "true"
 
+# Engine computing the tube and cable geometries: "python" (shapely) or "sql" (PostGIS)
+GEOMETRY_ENGINE = os.getenv("GEOMETRY_ENGINE", "python").lower()
+# "sync": geometries are recomputed within the edit request
+# "async": they are queued and recomputed by the `recompute_worker` command
+RECOMPUTE_MODE = os.getenv("RECOMPUTE_MODE", "sync").lower()
+# Number of offset parts of sections kept in memory by the python engine (0 disables the cache)
+OFFSET_PART_CACHE_SIZE = int(os.getenv("OFFSET_PART_CACHE_SIZE", 10000))
+# Decimals of the coordinates in the OAPIF responses, `?precision=` overrides it per request
+OAPIF_PRECISION = int(os.getenv("OAPIF_PRECISION", 3))
+# Per collection, as "network.track=2,network.station=1"
+OAPIF_COLLECTION_PRECISION = {
+    collection: int(precision)
+    for collection, precision in (
+        item.split("=")
+        for item in os.getenv("OAPIF_COLLECTION_PRECISION", "").split(",")
+        if item
+    )
+}
+# Grid size (in m) the geometries are snapped to when they are written, empty to keep them as is
+GEOMETRY_GRID_SIZE = float(os.getenv("GEOMETRY_GRID_SIZE") or 0) or None
+# Directory of the network exports written by the `export_worker` command
+EXPORT_DIR = os.getenv("EXPORT_DIR", "/exports")
+# Days the change feed is kept for the offline synchronization, see the `prune_changes` command
+CHANGE_RETENTION_DAYS = int(os.getenv("CHANGE_RETENTION_DAYS", 30))
+# Number of rendered vector tiles kept in the tile cache, the oldest ones are evicted
+TILE_CACHE_MAX_TILES = int(os.getenv("TILE_CACHE_MAX_TILES", 100000))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -161,6 +188,8 @@ MIDDLEWARE += [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "simple_history.middleware.HistoryRequestMiddleware",
+    "kablo.network.middleware.DeferredRecomputeMiddleware",
+    "kablo.api.middleware.ConditionalCollectionMiddleware",
 ]
 
 if ENV == "DEV":
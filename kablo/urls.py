@@ -19,8 +19,10 @@ from django.contrib import admin
 from django.urls import include, path
 from django_oapif.urls import oapif_router
 
+from kablo.api import views as api_views
 from kablo.core import views as core_views
 from kablo.network import urls as network_urls
+from kablo.network import views as network_views
 from kablo.webviewer import views as webviewer_views
 
 urlpatterns = [
@@ -29,6 +31,18 @@ urlpatterns = [
     path("viewer", webviewer_views.viewer, name="viewer"),
     path("admin/", admin.site.urls, {"extra_context": {"DEBUG": settings.DEBUG}}),
     path("network/", include(network_urls)),
+    path(
+        "tiles/<slug:layer>/<int:z>/<int:x>/<int:y>.mvt",
+        network_views.vector_tile,
+        name="vector_tile",
+    ),
+    path("changes", api_views.changes, name="changes"),
+    # streamed items of the big collections, delegates the rest to django-oapif
+    path(
+        "oapif/collections/<str:collection_id>/items",
+        api_views.collection_items,
+        name="collection_items",
+    ),
     path("oapif/", include(oapif_router.urls)),
     path("users/", include("allauth.urls")),
 ]
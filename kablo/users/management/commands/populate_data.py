@@ -4,18 +4,34 @@ from math import cos, radians, sin
 
 from django.contrib.gis.geos import LineString, MultiLineString
 from django.core.management.base import BaseCommand
-from django.db import transaction
 
 from kablo.core.utils import wkt_from_line, wkt_from_multiline
 from kablo.editing.models import TrackSplit
+from kablo.network.generator import NetworkGenerator
 from kablo.network.models import Cable, CableTube, Section, Track, Tube, TubeSection
+from kablo.network.recompute import deferred_recompute
 
 
 class Command(BaseCommand):
     help = "Populate db with testdata"
 
     def add_arguments(self, parser):
-        parser.add_argument("-s", "--size", type=int, default=1000)
+        parser.add_argument(
+            "-s",
+            "--size",
+            type=int,
+            help="Generate a synthetic network of this number of sections "
+            "instead of the test data",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the synthetic network"
+        )
+        parser.add_argument(
+            "--max-cables",
+            type=int,
+            default=8,
+            help="Maximum number of cables starting in each tube",
+        )
 
     @staticmethod
     def create_track(
@@ -88,9 +104,18 @@ class Command(BaseCommand):
         cable.save()
         return cable
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        """Populate db with testdata"""
+        """Populate db with testdata, or a synthetic network of the given size"""
+        if options["size"] is None:
+            self.populate_testdata()
+            return
+        generator = NetworkGenerator(
+            options["size"], seed=options["seed"], max_cables=options["max_cables"]
+        )
+        print(f"🤖 {generator.generate()}")
+
+    @deferred_recompute()
+    def populate_testdata(self):
         # list of tracks (track = list of sections => list of list of sections)
         azimuth_track_sections = []
         tubes = []
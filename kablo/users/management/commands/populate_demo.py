@@ -1,153 +1,390 @@
-import json
+import logging
+import time
+from collections import Counter
 
 from django.contrib.gis.geos import Point
 from django.core.management.base import BaseCommand
 from django.db import transaction
-
-from kablo.core.utils import import_arcsde_linestrings_to_geos
-from kablo.network.models import Cable, Station, Track, Tube
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from kablo.core.utils import import_arcsde_linestrings_many
+from kablo.network.importer import (
+    CodeMap,
+    ImportReport,
+    SyncReport,
+    import_features,
+    iter_features,
+    sync_features,
+)
+from kablo.network.models import (
+    Cable,
+    CableTube,
+    Section,
+    Station,
+    Track,
+    Tube,
+    TubeSection,
+)
+from kablo.network.recompute import recompute
 from kablo.valuelist.models import CableTensionType, StatusType, TubeCableProtectionType
 
-
-def import_stations(file):
-    Station.objects.all().delete()
-    with open(file) as fd:
-        data = json.load(fd)
-        for feature in data["features"]:
+logger = logging.getLogger(__name__)
+
+
+def original_id(feature) -> str:
+    return feature["properties"]["globalid"]
+
+
+def convert_geometries(name, features, output_type="MultiLineString") -> list:
+    """
+    Geometries of a chunk of features, None for the rejected ones (logged)
+    """
+    result = import_arcsde_linestrings_many(
+        [feature["geometry"] for feature in features], output_type
+    )
+    for rejected in result.rejected:
+        feature = features[rejected.index]
+        logger.warning(
+            f"{name} {feature['properties'].get('globalid')} rejected: {rejected.reason}"
+        )
+    return result.geometries
+
+
+def import_layer(
+    name,
+    model,
+    file,
+    build,
+    update_fields,
+    sync,
+    after_insert=None,
+    after_update=None,
+    conflicts=None,
+) -> ImportReport | SyncReport:
+    """
+    Replace the objects of the model by the ones of the file,
+    or synchronize them with the file (see kablo.network.importer.sync_features)
+    """
+    if sync:
+        return sync_features(
+            name,
+            model,
+            iter_features(file),
+            build,
+            original_id,
+            update_fields,
+            after_insert=after_insert,
+            after_update=after_update,
+            conflicts=conflicts,
+        )
+    model.all_objects.all().delete()
+    return import_features(
+        name, model, iter_features(file), build, after_chunk=after_insert
+    )
+
+
+def import_stations(file, sync: bool = False) -> ImportReport | SyncReport:
+    def build(features):
+        stations = []
+        for feature in features:
             coordinates = feature["geometry"]["coordinates"]
             coordinates.append(999)
-            fields = {
-                "geom": Point(coordinates),
-                "original_id": feature["properties"]["globalid"],
-                "label": feature["properties"]["nummer"],
-            }
-            Station.objects.create(**fields)
-
-
-def import_tracks(file):
-    Track.objects.all().delete()
-    with open(file) as fd:
-        data = json.load(fd)
-        for feature in data["features"]:
-
-            geom = import_arcsde_linestrings_to_geos(feature["geometry"])
-
-            if geom:
-                fields = {
-                    "geom": geom,
-                    "original_id": feature["properties"]["globalid"],
-                }
-                Track.objects.create(**fields)
-
-
-def import_tubes(file):
-
-    Tube.objects.all().delete()
-    unknown_status = StatusType.objects.get(code=1)
-    unknown_cable_protection_type = TubeCableProtectionType.objects.get(code=1)
-    # TODO: log missing data as quality control
-    with open(file) as fd:
-        data = json.load(fd)
-        for feature in data["features"]:
-
-            geom = import_arcsde_linestrings_to_geos(
-                feature["geometry"], output_type="LineString"
+            stations.append(
+                Station(
+                    geom=Point(coordinates),
+                    original_id=feature["properties"]["globalid"],
+                    label=feature["properties"]["nummer"],
+                )
             )
-            status = StatusType.objects.filter(
-                code=feature["properties"]["status"]
-            ).first()
-
-            if not status:
-                status = unknown_status
-
-            cable_protection_type = TubeCableProtectionType.objects.filter(
-                code=feature["properties"]["kabelschutz"]
-            ).first()
-
-            if not cable_protection_type:
-                cable_protection_type = unknown_cable_protection_type
+        return stations
+
+    return import_layer("stations", Station, file, build, ["geom", "label"], sync)
+
+
+def import_tracks(file, sync: bool = False) -> ImportReport | SyncReport:
+    """
+    The sections of the updated tracks are rebuilt. The tracks whose sections
+    route tubes are not updated: they are reported as conflicts, to be edited
+    """
+
+    def build(features):
+        return [
+            Track(geom=geom, original_id=original_id(feature))
+            for feature, geom in zip(features, convert_geometries("track", features))
+            if geom
+        ]
+
+    def create_sections(tracks):
+        # as Track.save does for each track
+        Section.objects.bulk_create(
+            [section for track in tracks for section in track.build_sections()]
+        )
+
+    def update_sections(tracks):
+        Section.objects.filter(track__in=tracks).delete()
+        create_sections(tracks)
+
+    def routed_tracks(tracks) -> set:
+        # their sections can not be rebuilt without losing the tube routes
+        routed = set(
+            TubeSection.objects.filter(section__track__in=tracks).values_list(
+                "section__track", flat=True
+            )
+        )
+        for track in tracks:
+            if track.pk in routed:
+                logger.warning(f"track {track.original_id} routes tubes, not updated")
+        return routed
+
+    return import_layer(
+        "tracks",
+        Track,
+        file,
+        build,
+        ["geom"],
+        sync,
+        after_insert=create_sections,
+        after_update=update_sections,
+        conflicts=routed_tracks,
+    )
+
+
+def import_tubes(file, sync: bool = False) -> ImportReport | SyncReport:
+    # TODO: log missing data as quality control
+    statuses = CodeMap(StatusType)
+    cable_protection_types = CodeMap(TubeCableProtectionType)
 
+    def build(features):
+        tubes = []
+        geoms = convert_geometries("tube", features, output_type="LineString")
+        for feature, geom in zip(features, geoms):
             if geom:
-                fields = {
-                    "status": status,
-                    "cable_protection_type": cable_protection_type,
-                    "geom": geom,
-                    "original_id": feature["properties"]["globalid"],
-                }
-
-                Tube.objects.create(**fields)
-
-
-def import_cables(file):
-    Cable.objects.all().delete()
-    unknown_tension_type = CableTensionType.objects.get(code=1)
-    unknown_status = StatusType.objects.get(code=1)
+                properties = feature["properties"]
+                tubes.append(
+                    Tube(
+                        status_id=statuses[properties["status"]],
+                        cable_protection_type_id=cable_protection_types[
+                            properties["kabelschutz"]
+                        ],
+                        geom=geom,
+                        original_id=properties["globalid"],
+                    )
+                )
+        return tubes
+
+    return import_layer(
+        "tubes",
+        Tube,
+        file,
+        build,
+        ["status", "cable_protection_type", "geom"],
+        sync,
+    )
+
+
+def import_cables(file, sync: bool = False) -> ImportReport | SyncReport:
     # TODO: log missing data as quality control
-    with open(file) as fd:
-        data = json.load(fd)
-        for feature in data["features"]:
-
-            geom = import_arcsde_linestrings_to_geos(
-                feature["geometry"], output_type="LineString"
-            )
-
-            status = StatusType.objects.filter(
-                code=feature["properties"]["status"]
-            ).first()
-
-            if not status:
-                status = unknown_status
-
-            tension_type = CableTensionType.objects.filter(
-                code=feature["properties"]["status"]
-            ).first()
-
-            if not tension_type:
-                tension_type = unknown_tension_type
+    statuses = CodeMap(StatusType)
+    tension_types = CodeMap(CableTensionType)
 
+    def build(features):
+        cables = []
+        geoms = convert_geometries("cable", features, output_type="LineString")
+        for feature, geom in zip(features, geoms):
             if geom:
-                fields = {
-                    "tension": tension_type,
-                    "status": status,
-                    "geom": geom,
-                    "original_id": feature["properties"]["globalid"],
-                }
-                Cable.objects.create(**fields)
-
-
-def import_tube_cable_relations(file):
-    # Set cable-tube m2m relation
-    print(f"🤖 ...Setting tube_cable m2m relations...this might take some time...")
-    with open(file) as fd:
-        data = json.load(fd)
+                properties = feature["properties"]
+                cables.append(
+                    Cable(
+                        tension_id=tension_types[properties["status"]],
+                        status_id=statuses[properties["status"]],
+                        geom=geom,
+                        original_id=properties["globalid"],
+                    )
+                )
+        return cables
+
+    return import_layer(
+        "cables", Cable, file, build, ["tension", "status", "geom"], sync
+    )
+
+
+def import_tube_cable_relations(file, sync: bool = False) -> ImportReport | SyncReport:
+    """
+    Replace the tube-cable relations by the ones of the file. With `sync`, only the
+    relations between imported cables and tubes which are new or gone are written,
+    the relations of the soft-deleted cables and tubes are gone.
+    """
+    if not sync:
+        CableTube.objects.all().delete()
+    # original ids of the imported cables and tubes, read once
+    cables = dict(
+        Cable.all_objects.filter(original_id__isnull=False).values_list(
+            "original_id", "pk"
+        )
+    )
+    tubes = dict(
+        Tube.all_objects.filter(original_id__isnull=False).values_list(
+            "original_id", "pk"
+        )
+    )
+    soft_deleted = set(
+        Cable.all_objects.filter(deleted_at__isnull=False).values_list("pk", flat=True)
+    ) | set(
+        Tube.all_objects.filter(deleted_at__isnull=False).values_list("pk", flat=True)
+    )
+    # relations already built, tubes of each cable and cables of each tube so far
+    relations = set()
+    cable_tube_counts = Counter()
+    tube_cable_counts = Counter()
+    # relations in the database, the new ones are added after them
+    existing = {}
+    if sync:
+        for (
+            pk,
+            cable_id,
+            tube_id,
+            order_index,
+            display_offset,
+        ) in CableTube.objects.values_list(
+            "pk", "cable", "tube", "order_index", "display_offset"
+        ):
+            existing[(cable_id, tube_id)] = pk
+            cable_tube_counts[cable_id] = max(
+                cable_tube_counts[cable_id], order_index + 1
+            )
+            tube_cable_counts[tube_id] = max(
+                tube_cable_counts[tube_id], display_offset + 1
+            )
 
-        for feature in data:
-            cable = Cable.objects.filter(original_id=feature["kabel_ref"]).first()
-            tube = Tube.objects.filter(original_id=feature["rohr_ref"]).first()
-            if cable and tube:
-                tube.cables.add(cable)
+    def build(rows):
+        cable_tubes = []
+        for row in rows:
+            cable_id = cables.get(row["kabel_ref"])
+            tube_id = tubes.get(row["rohr_ref"])
+            if (
+                cable_id is None
+                or tube_id is None
+                or cable_id in soft_deleted
+                or tube_id in soft_deleted
+                or (cable_id, tube_id) in relations
+            ):
+                continue
+            relations.add((cable_id, tube_id))
+            if (cable_id, tube_id) in existing:
+                continue
+            # the tubes of a cable in the order of the file,
+            # each cable next to the former ones in the tube (as CableTube.save does)
+            cable_tubes.append(
+                CableTube(
+                    cable_id=cable_id,
+                    tube_id=tube_id,
+                    order_index=cable_tube_counts[cable_id],
+                    display_offset=tube_cable_counts[tube_id],
+                )
+            )
+            cable_tube_counts[cable_id] += 1
+            tube_cable_counts[tube_id] += 1
+        return cable_tubes
+
+    report = import_features(
+        "tube-cable relations",
+        CableTube,
+        iter_features(file, prefix="item"),
+        build,
+    )
+    counted_tubes = Tube.all_objects.all()
+    if sync:
+        # the relations between imported cables and tubes which are not in the file
+        imported_cables = set(cables.values())
+        imported_tubes = set(tubes.values())
+        gone = {
+            relation: pk
+            for relation, pk in existing.items()
+            if relation not in relations
+            and relation[0] in imported_cables
+            and relation[1] in imported_tubes
+        }
+        CableTube.objects.filter(pk__in=gone.values()).delete()
+        unchanged = len(relations & existing.keys())
+        changed = (relations - existing.keys()) | gone.keys()
+        report = SyncReport(
+            report.name,
+            inserted=report.rows,
+            updated=0,
+            deleted=len(gone),
+            unchanged=unchanged,
+            skipped=report.skipped - unchanged,
+            seconds=report.seconds,
+            changed_ids=changed,
+        )
+        counted_tubes = Tube.all_objects.filter(
+            pk__in={tube_id for _, tube_id in changed}
+        )
+    counted_tubes.update(
+        cable_count=Coalesce(
+            Subquery(
+                CableTube.objects.filter(tube=OuterRef("pk"))
+                .values("tube")
+                .annotate(count=Count("id"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+    return report
 
 
 class Command(BaseCommand):
     help = "Populate db with demo data"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Only insert, update and soft-delete the features which changed "
+            "instead of replacing all the data",
+        )
+
     @transaction.atomic
     def handle(self, *args, **options):
         """Populate db with testdata"""
+        sync = options["sync"]
+        data = "/kablo/demo/data"
 
-        import_tracks("/kablo/demo/data/dbo.ele_trasse.geojson")
-        print(f"🤖 demo tracks added!")
+        tracks = import_tracks(f"{data}/dbo.ele_trasse.geojson", sync)
+        print(f"🤖 demo {tracks}")
         # Tubes must be imported before cables as the relation is set
         # after cable creation
-        import_tubes("/kablo/demo/data/dbo.ele_rohr.geojson")
-        print(f"🤖 demo tubes added!")
-
-        import_cables("/kablo/demo/data/dbo.ele_kabel.geojson")
-        print(f"🤖 demo cables added!")
-
-        import_stations("/kablo/demo/data/dbo.ele_station.geojson")
-        print(f"🤖 demo stations added!")
+        tubes = import_tubes(f"{data}/dbo.ele_rohr.geojson", sync)
+        print(f"🤖 demo {tubes}")
+        cables = import_cables(f"{data}/dbo.ele_kabel.geojson", sync)
+        print(f"🤖 demo {cables}")
+        print(f"🤖 demo {import_stations(f'{data}/dbo.ele_station.geojson', sync)}")
 
         # Must be executed after tubes and cables import
-        import_tube_cable_relations("/kablo/demo/data/dbo.eler_rohr_kabel.json")
-        print(f"🤖 tubes-cables relations added!")
+        relations = import_tube_cable_relations(
+            f"{data}/dbo.eler_rohr_kabel.json", sync
+        )
+        print(f"🤖 demo {relations}")
+
+        # the computed fields are rebuilt once, after all the imports
+        start = time.perf_counter()
+        if sync:
+            # only the changed tubes and cables, and the ones of the changed relations
+            recompute(
+                {
+                    Tube: tubes.changed_ids
+                    | {tube_id for _, tube_id in relations.changed_ids},
+                    Cable: cables.changed_ids
+                    | {cable_id for cable_id, _ in relations.changed_ids},
+                }
+            )
+        else:
+            recompute(
+                {
+                    Tube: set(Tube.objects.values_list("id", flat=True)),
+                    Cable: set(Cable.objects.values_list("id", flat=True)),
+                }
+            )
+        print(f"🤖 geometries recomputed in {time.perf_counter() - start:.1f}s!")
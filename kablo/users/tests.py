@@ -1 +1,194 @@
-# Create your tests here.
+import json
+import tempfile
+
+from django.test import TestCase
+from django.utils import timezone
+
+from kablo.network.models import Cable, CableTube, Station, Track, Tube, TubeSection
+from kablo.users.management.commands.populate_demo import (
+    import_stations,
+    import_tracks,
+    import_tube_cable_relations,
+)
+
+
+def write_features(file, features):
+    json.dump({"type": "FeatureCollection", "features": features}, file)
+    file.flush()
+
+
+class PopulateDemoTestCase(TestCase):
+    def test_import_tube_cable_relations(self):
+        tubes = [Tube.objects.create(original_id=f"tube-{i}") for i in range(2)]
+        cables = [Cable.objects.create(original_id=f"cable-{i}") for i in range(2)]
+        rows = [
+            {"kabel_ref": "cable-0", "rohr_ref": "tube-0"},
+            {"kabel_ref": "cable-0", "rohr_ref": "tube-1"},
+            {"kabel_ref": "cable-1", "rohr_ref": "tube-0"},
+            # duplicated, and unknown cable
+            {"kabel_ref": "cable-1", "rohr_ref": "tube-0"},
+            {"kabel_ref": "cable-9", "rohr_ref": "tube-0"},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump(rows, file)
+            file.flush()
+            report = import_tube_cable_relations(file.name)
+
+        self.assertEqual((report.rows, report.skipped), (3, 2))
+        self.assertEqual(
+            set(
+                CableTube.objects.values_list(
+                    "cable__original_id",
+                    "tube__original_id",
+                    "order_index",
+                    "display_offset",
+                )
+            ),
+            {
+                ("cable-0", "tube-0", 0, 0),
+                ("cable-0", "tube-1", 1, 0),
+                ("cable-1", "tube-0", 0, 1),
+            },
+        )
+        tubes[0].refresh_from_db()
+        self.assertEqual(tubes[0].cable_count, 2)
+        self.assertEqual(cables[1].cabletube_set.count(), 1)
+
+    def test_sync_stations(self):
+        def station(number, x):
+            return {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [2508500 + x, 1152000]},
+                "properties": {"globalid": f"station-{number}", "nummer": number},
+            }
+
+        def sync(features):
+            with tempfile.NamedTemporaryFile("w", suffix=".geojson") as file:
+                write_features(file, features)
+                return import_stations(file.name, sync=True)
+
+        def counts(report):
+            return (report.inserted, report.updated, report.deleted, report.unchanged)
+
+        features = [station("1", 0), station("2", 10), station("3", 20)]
+        self.assertEqual(counts(sync(features)), (3, 0, 0, 0))
+        updated_at = dict(Station.objects.values_list("original_id", "updated_at"))
+
+        # unchanged: only the existing stations are read
+        with self.assertNumQueries(1):
+            self.assertEqual(counts(sync(features)), (0, 0, 0, 3))
+        self.assertEqual(
+            dict(Station.objects.values_list("original_id", "updated_at")), updated_at
+        )
+
+        # moved, and removed from the source
+        report = sync([station("1", 5), station("2", 10)])
+        self.assertEqual(counts(report), (0, 1, 1, 1))
+        self.assertEqual(
+            report.changed_ids, {Station.objects.get(original_id="station-1").pk}
+        )
+        self.assertEqual(Station.objects.get(original_id="station-1").geom.x, 2508505)
+        self.assertEqual(Station.objects.count(), 2)
+        self.assertIsNotNone(
+            Station.all_objects.get(original_id="station-3").deleted_at
+        )
+
+        # back in the source
+        self.assertEqual(counts(sync(features)), (0, 2, 0, 1))
+        self.assertEqual(Station.objects.count(), 3)
+
+    def test_sync_tracks(self):
+        def track(number, *parts):
+            return {
+                "type": "Feature",
+                "geometry": {"type": "MultiLineString", "coordinates": parts},
+                "properties": {"globalid": f"track-{number}"},
+            }
+
+        def sync(features):
+            with tempfile.NamedTemporaryFile("w", suffix=".geojson") as file:
+                write_features(file, features)
+                return import_tracks(file.name, sync=True)
+
+        part = [[2508500, 1152000], [2508510, 1152000]]
+        moved = [[2508500, 1152010], [2508510, 1152010]]
+        report = sync([track(1, part), track(2, part)])
+        self.assertEqual((report.inserted, report.conflicts), (2, 0))
+        routed = Track.objects.get(original_id="track-1")
+        section = routed.section_set.get()
+        TubeSection.objects.create(tube=Tube.objects.create(), section=section)
+
+        # the sections of the unrouted track are rebuilt,
+        # the routed track is left as it is and retried by the next sync
+        features = [track(1, part, moved), track(2, part, moved)]
+        report = sync(features)
+        self.assertEqual((report.updated, report.conflicts), (1, 1))
+        self.assertIn("1 conflicts", str(report))
+        self.assertNotIn(routed.pk, report.changed_ids)
+        self.assertEqual(Track.objects.get(pk=routed.pk).geom, routed.geom)
+        self.assertEqual(list(routed.section_set.all()), [section])
+        report = sync(features)
+        self.assertEqual((report.unchanged, report.conflicts), (1, 1))
+        unrouted = Track.objects.get(original_id="track-2")
+        self.assertEqual(
+            [s.geom.coords[0][1] for s in unrouted.section_set.order_by("order_index")],
+            [1152000, 1152010],
+        )
+
+    def test_sync_tube_cable_relations(self):
+        tubes = [Tube.objects.create(original_id=f"tube-{i}") for i in range(3)]
+        cables = [Cable.objects.create(original_id=f"cable-{i}") for i in range(2)]
+
+        def sync(*pairs):
+            rows = [
+                {"kabel_ref": f"cable-{cable}", "rohr_ref": f"tube-{tube}"}
+                for cable, tube in pairs
+            ]
+            with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+                json.dump(rows, file)
+                file.flush()
+                report = import_tube_cable_relations(file.name, sync=True)
+            return (report.inserted, report.deleted, report.unchanged), report
+
+        def relations():
+            return set(
+                CableTube.objects.values_list(
+                    "cable__original_id",
+                    "tube__original_id",
+                    "order_index",
+                    "display_offset",
+                )
+            )
+
+        def cable_counts():
+            return [Tube.all_objects.get(pk=tube.pk).cable_count for tube in tubes]
+
+        self.assertEqual(sync((0, 0), (0, 1), (1, 0))[0], (3, 0, 0))
+
+        # kept, removed and inserted
+        counts, report = sync((0, 0), (1, 0), (1, 2))
+        self.assertEqual(counts, (1, 1, 2))
+        self.assertEqual(
+            report.changed_ids,
+            {(cables[0].pk, tubes[1].pk), (cables[1].pk, tubes[2].pk)},
+        )
+        self.assertEqual(
+            relations(),
+            {
+                ("cable-0", "tube-0", 0, 0),
+                ("cable-1", "tube-0", 0, 1),
+                ("cable-1", "tube-2", 1, 0),
+            },
+        )
+        self.assertEqual(cable_counts(), [2, 0, 1])
+
+        # unchanged: nothing to recompute
+        counts, report = sync((0, 0), (1, 0), (1, 2))
+        self.assertEqual((counts, report.changed_ids), ((0, 0, 3), set()))
+
+        # the relations of a soft-deleted tube are gone, even if still in the file
+        Tube.all_objects.filter(pk=tubes[0].pk).update(deleted_at=timezone.now())
+        counts, report = sync((0, 0), (1, 0), (1, 2))
+        self.assertEqual(counts, (0, 2, 1))
+        self.assertEqual(relations(), {("cable-1", "tube-2", 1, 0)})
+        self.assertEqual(cable_counts(), [0, 0, 1])